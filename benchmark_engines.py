@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Compares the step times of the nodenet engines on the same random nodenet.
+The theano engine is left out where theano is not installed.
+"""
+
+import argparse
+import random
+import time
+
+from micropsi_core.nodenet.dict_engine.dict_nodenet import DictNodenet
+from micropsi_core.nodenet.numpy_engine.numpy_nodenet import NumpyNodenet
+from micropsi_core.nodenet.theano_engine import theano_nodenet
+
+
+def get_engines():
+    engines = [("dict_engine", DictNodenet), ("numpy_engine", NumpyNodenet)]
+    if theano_nodenet.theano is not None:
+        engines.append(("theano_engine", theano_nodenet.TheanoNodenet))
+    return engines
+
+
+def build_nodenet(nodenet_class, nodes, links, nodespaces, seed=42):
+    nodenet = nodenet_class(name="Benchmark", uid="benchmark_nodenet")
+    netapi = nodenet.netapi
+    rand = random.Random(seed)
+    root = netapi.get_nodespace(None).uid
+    spaces = [root] + [netapi.create_node("Nodespace", root, "space%d" % i).uid for i in range(nodespaces - 1)]
+    created = [netapi.create_node(rand.choice(["Register", "Register", "Pipe"]), spaces[i % len(spaces)], "n%d" % i)
+               for i in range(nodes)]
+    for i in range(links):
+        source, target = rand.choice(created), rand.choice(created)
+        netapi.link(source, rand.choice(source.get_gate_types()), target, rand.choice(target.get_slot_types()),
+                    rand.uniform(-1, 1))
+    for node in created[:nodes // 10]:
+        node.activation = 1
+    return nodenet
+
+
+def measure(nodenet, steps):
+    """Returns the time of the first step, which includes compiling, and the mean time of the following steps"""
+    start = time.time()
+    nodenet.step()
+    first = time.time() - start
+    start = time.time()
+    for i in range(steps):
+        nodenet.step()
+    return first, (time.time() - start) / steps
+
+
+def main(nodes, links, nodespaces, steps):
+    print("%d nodes, %d links in %d nodespaces, %d steps" % (nodes, links, nodespaces, steps))
+    for name, nodenet_class in get_engines():
+        start = time.time()
+        nodenet = build_nodenet(nodenet_class, nodes, links, nodespaces)
+        built = time.time() - start
+        first, per_step = measure(nodenet, steps)
+        print("%-14s build %8.1f ms   first step %8.1f ms   per step %8.3f ms" % (
+            name, built * 1000, first * 1000, per_step * 1000))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the step times of the nodenet engines.")
+    parser.add_argument('-n', '--nodes', type=int, default=1000)
+    parser.add_argument('-l', '--links', type=int, default=5000)
+    parser.add_argument('-s', '--nodespaces', type=int, default=10)
+    parser.add_argument('--steps', type=int, default=100)
+    args = parser.parse_args()
+    main(args.nodes, args.links, args.nodespaces, args.steps)
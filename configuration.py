@@ -38,3 +38,9 @@ LOGGING = config['logging']
 DEFAULT_PORT = config['micropsi2']['port']
 
 DEFAULT_HOST = config['micropsi2']['host']
+
+SERVER_THREADS = int(config['micropsi2'].get('threads', 10))
+
+QUEUED_REQUESTS_PER_NODENET = int(config['micropsi2'].get('queued_requests_per_nodenet', 8))
+
+PUSH_STREAMS = int(config['micropsi2'].get('push_streams', SERVER_THREADS // 2))
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+"""
+Runtime API functionality for pushing the state of nodenets to subscribed clients
+
+Instead of every client polling the state of a nodenet, clients subscribe to a nodespace of a nodenet, and wait
+for the updates of that nodenet. Stepping a nodenet only notes that a new update exists. The update is put
+together once per step, nodespace and monitor setting, by the first subscriber that asks for it, and shared with all
+other subscribers. Subscribers that fall behind are not sent the steps they missed, but the newest update, with the
+number of steps they skipped.
+"""
+
+import threading
+
+import micropsi_core
+
+
+class Subscription(object):
+    """A client waiting for the updates of a nodespace of a nodenet.
+
+    Attributes:
+        nodenet_uid: the uid of the nodenet
+        key: the nodespace, whether links are included, and whether monitor data is included
+        sequence: the number of the last update sent to the client
+        skipped: the number of updates the client missed before the last one
+        closed: True if the nodenet was unloaded, and no further updates will be sent
+    """
+
+    def __init__(self, nodenet_uid, nodespace, include_links, monitors):
+        self.nodenet_uid = nodenet_uid
+        self.key = (nodespace, include_links, monitors)
+        self.sequence = 0
+        self.skipped = 0
+        self.closed = False
+
+
+class PushChannel(object):
+    """The updates of one nodenet, and its subscribers"""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.build_lock = threading.Lock()
+        self.sequence = 0
+        self.updates = {}
+        self.subscriptions = set()
+
+
+push_channels = {}
+push_channels_lock = threading.Lock()
+
+
+def get_push_channel(nodenet_uid):
+    with push_channels_lock:
+        if nodenet_uid not in push_channels:
+            push_channels[nodenet_uid] = PushChannel()
+        return push_channels[nodenet_uid]
+
+
+def subscribe(nodenet_uid, nodespace=None, include_links=True, monitors=False):
+    """Subscribes to the updates of the given nodespace of the given nodenet, and the monitor data if monitors
+    is True. The first update is the current state of the nodenet.
+    Returns the subscription to wait for updates with."""
+    channel = get_push_channel(nodenet_uid)
+    subscription = Subscription(nodenet_uid, nodespace, include_links, monitors)
+    with channel.condition:
+        channel.subscriptions.add(subscription)
+        subscription.sequence = channel.sequence - 1
+    return subscription
+
+
+def unsubscribe(subscription):
+    """Ends the given subscription"""
+    with push_channels_lock:
+        channel = push_channels.get(subscription.nodenet_uid)
+    if channel is not None:
+        with channel.condition:
+            channel.subscriptions.discard(subscription)
+
+
+def publish_step(nodenet_uid):
+    """Notifies the subscribers of the given nodenet that it advanced. Called after every step of the nodenet"""
+    channel = push_channels.get(nodenet_uid)
+    if channel is not None:
+        with channel.condition:
+            channel.sequence += 1
+            channel.updates = {}
+            channel.condition.notify_all()
+
+
+def close_push_channel(nodenet_uid):
+    """Ends all subscriptions to the given nodenet. Called when the nodenet is unloaded"""
+    with push_channels_lock:
+        channel = push_channels.pop(nodenet_uid, None)
+    if channel is not None:
+        with channel.condition:
+            for subscription in channel.subscriptions:
+                subscription.closed = True
+            channel.subscriptions = set()
+            channel.condition.notify_all()
+
+
+def get_update(subscription, timeout=None):
+    """Waits at most timeout seconds for an update the given subscriber has not been sent yet.
+    Returns the newest update, or None if the nodenet did not advance in time or the subscription was closed"""
+    channel = get_push_channel(subscription.nodenet_uid) if not subscription.closed else None
+    if channel is None:
+        return None
+    with channel.condition:
+        if channel.sequence == subscription.sequence and not subscription.closed:
+            channel.condition.wait(timeout)
+        if channel.sequence == subscription.sequence or subscription.closed:
+            return None
+        sequence = channel.sequence
+
+    with channel.build_lock:
+        update = channel.updates.get(subscription.key)
+        if update is None or update[0] != sequence:
+            update = (sequence, _build_update(subscription.nodenet_uid, *subscription.key))
+            with channel.condition:
+                if channel.sequence == sequence:
+                    channel.updates[subscription.key] = update
+
+    subscription.skipped = max(0, sequence - subscription.sequence - 1)
+    subscription.sequence = sequence
+    return update[1]
+
+
+def _build_update(nodenet_uid, nodespace, include_links, monitors):
+    nodenet = micropsi_core.runtime.get_nodenet(nodenet_uid)
+    data = {
+        'simulation_running': nodenet.is_active,
+        'current_nodenet_step': nodenet.current_step,
+        'current_world_step': nodenet.world.current_step if nodenet.world else 0,
+        'nodenet': micropsi_core.runtime.get_nodenet_data(nodenet_uid, nodespace, include_links=include_links)
+    }
+    if monitors:
+        data['monitors'] = micropsi_core.runtime.get_monitor_data(nodenet_uid)
+    return data
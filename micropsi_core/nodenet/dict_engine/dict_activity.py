@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+
+"""
+Activity-driven stepping of a dict node net
+
+In typical script execution only a small frontier of a node net is active, while a full step resets every slot,
+walks every link and runs every node function. In activity-driven mode, DictPropagate only pushes activation from
+the gates that carry activation, and DictCalculate only runs the node functions of the nodes whose slots received
+activation in this or the last step.
+
+Register, Concept and Pipe nodes with their standard node functions only depend on their slots, their gate
+parameters and the activators of their nodespace. Once they were calculated with all slots at zero, calculating
+them again with all slots at zero changes nothing, so they are left alone until their slots receive activation.
+All other nodes ( sensors, actors, activators, scripts, triggers, native modules ), and all nodes in nodespaces
+with activators, are calculated in every step. Nodes whose activation is set through the node outside of their
+node functions are pushed and calculated in the next step as well.
+
+Links are pushed in the order DictPropagate visits them, so that the slot activations are exactly the same.
+Whenever nodes, links, gate parameters or gate functions change, or gates carry sheaves other than the default
+sheaf, the node net is stepped as a whole, and the frontier is rebuilt from the result.
+"""
+
+from micropsi_core.nodenet import nodefunctions
+
+QUIESCENT_NODEFUNCTIONS = {
+    'Register': nodefunctions.register,
+    'Concept': nodefunctions.concept,
+    'Pipe': nodefunctions.pipe
+}
+
+# the partitions of the node net that hold quiescent nodes, all other partitions are calculated every step
+QUIESCENT_PARTITIONS = ("pipes", "plain")
+
+
+def is_quiescent(node):
+    return QUIESCENT_NODEFUNCTIONS.get(node.type) is node.nodetype.nodefunction
+
+
+def is_source(node):
+    """Returns True if any of the gates of the given node carries activation or sheaves"""
+    for gate_type in node.get_gate_types():
+        if node.get_gate(gate_type).get_default_activation() != 0:
+            return True
+    return False
+
+
+class DictActivity(object):
+    """The frontier of activity of a dict node net.
+
+    Attributes:
+        valid: False if the frontier has to be rebuilt from a full step
+        propagated: True if the last propagation only pushed activation from the sources
+        order: the position of every node in the node net, the order in which DictPropagate visits them
+        sources: the nodes whose gates carry activation, by uid
+        fed_slots: the slots that received activation in the last propagation
+        frontier: the nodes whose slots received activation in this or the last propagation, by uid
+        touched: the nodes whose activation was set since the last calculation, by uid
+        restless: the nodes of the quiescent partitions that are calculated every step, by partition and uid
+    """
+
+    def __init__(self):
+        self.valid = False
+        self.propagated = False
+        self.order = {}
+        self.sources = {}
+        self.fed_slots = []
+        self.frontier = {}
+        self.touched = {}
+        self.restless = {}
+        self.calculated = ()
+
+    def invalidate(self):
+        """Called whenever nodes, links, gate parameters or gate functions change"""
+        self.valid = False
+
+    def touch(self, node):
+        self.touched[node.uid] = node
+
+    def propagate(self, nodenet):
+        """Propagates activation from the sources to the slots they link to, and resets the slots that received
+        activation in the last propagation only. Returns False without changing anything if the frontier has to be
+        rebuilt from a full step, or if a gate carries sheaves other than the default sheaf."""
+        self.propagated = False
+        if not self.valid:
+            return False
+
+        sources = self.sources.copy()
+        sources.update(self.touched)
+        totals = {}
+        for uid in sorted(sources, key=self.order.__getitem__):
+            node = sources[uid]
+            for gate_type in node.get_gate_types():
+                gate = node.get_gate(gate_type)
+                activation = gate.get_default_activation()
+                if activation is None:
+                    self.valid = False
+                    return False
+                if activation == 0:
+                    continue
+                activation = float(activation)
+                for link in gate.get_links():
+                    slot = link.target_slot
+                    totals[slot] = totals.get(slot, 0) + activation * float(link.weight)
+
+        frontier = {}
+        for slot in self.fed_slots:
+            if slot not in totals:
+                slot.set_default_activation(0)
+            frontier[slot.node.uid] = slot.node
+        for slot, total in totals.items():
+            slot.set_default_activation(total)
+            frontier[slot.node.uid] = slot.node
+        self.fed_slots = list(totals)
+        self.frontier = frontier
+        self.propagated = True
+        return True
+
+    def select_nodes(self, nodenet):
+        """Returns the nodes of the quiescent partitions to calculate in this step, by partition name and uid, in
+        the order of the partitions. Called after the activators and native modules were calculated."""
+        candidates = self.frontier.copy()
+        candidates.update(self.touched)
+        for nodespace_uid in nodenet.get_gate_factors():
+            for uid in nodenet.get_nodespace(nodespace_uid).get_known_ids('nodes'):
+                candidates[uid] = nodenet.get_node(uid)
+
+        selected = {}
+        for name in QUIESCENT_PARTITIONS:
+            partition = nodenet.get_partition(name)
+            nodes = self.restless[name].copy()
+            for uid, node in candidates.items():
+                if uid in partition:
+                    nodes[uid] = node
+            selected[name] = dict((uid, nodes[uid]) for uid in sorted(nodes, key=self.order.__getitem__))
+        self.calculated = selected.values()
+        return selected
+
+    def update(self, nodenet):
+        """Updates the sources from the nodes calculated in this step, or rebuilds the frontier from all nodes
+        after a full step or changes of the node net during the step"""
+        if self.propagated and self.valid:
+            calculated = [nodenet.get_partition(name) for name in ("activators", "nativemodules", "sensors", "actors")]
+            calculated.extend(self.calculated)
+            for partition in calculated:
+                for uid, node in partition.items():
+                    if is_source(node):
+                        self.sources[uid] = node
+                    else:
+                        self.sources.pop(uid, None)
+        else:
+            nodes = [nodenet.get_node(uid) for uid in nodenet.get_node_uids()]
+            self.order = dict((node.uid, position) for position, node in enumerate(nodes))
+            self.sources = dict((node.uid, node) for node in nodes if is_source(node))
+            self.fed_slots = []
+            for node in nodes:
+                for slot_type in node.get_slot_types():
+                    slot = node.get_slot(slot_type)
+                    if slot.get_default_activation() != 0:
+                        self.fed_slots.append(slot)
+            self.restless = {}
+            for name in QUIESCENT_PARTITIONS:
+                partition = nodenet.get_partition(name)
+                self.restless[name] = dict((uid, node) for uid, node in partition.items() if not is_quiescent(node))
+            self.valid = True
+        self.calculated = ()
+        self.touched = {}
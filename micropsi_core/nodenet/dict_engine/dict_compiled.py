@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+
+"""
+Compiled representation of a dict node net
+
+Propagating activation link by link is where a dict node net spends most of its step. As long as all gates
+only carry the default sheaf, propagation is a sparse matrix-vector product of the link weights and the gate
+activations, so the links are compiled into a CSR matrix ( one row per slot, one column per gate ) whenever the
+structure of the node net changes. The entries of every row keep the order in which DictPropagate visits the
+links, so that the sums, and thereby the slot activations, are exactly the same.
+
+Register and Concept nodes with linear gate functions are calculated from the propagated slot activations in
+one go as well, all other nodes keep running their node functions.
+
+The compiled representation is only available if numpy and scipy are installed.
+"""
+
+try:
+    import numpy as np
+    import scipy.sparse as sparse
+except ImportError:  # pragma: no cover
+    np = None
+    sparse = None
+
+from micropsi_core.nodenet import nodefunctions
+
+VECTORIZED_NODEFUNCTIONS = {
+    'Register': nodefunctions.register,
+    'Concept': nodefunctions.concept
+}
+
+VECTORIZED_GATEFUNCTIONS = ('identity', 'absolute')
+
+
+def is_available():
+    return sparse is not None
+
+
+def default_sheaves(activation):
+    return {"default": dict(uid="default", name="default", activation=activation)}
+
+
+class DictCompiledNet(object):
+    """A flat array representation of the links and linear nodes of a dict node net.
+
+    Attributes:
+        gates: all gates of the node net, in column order
+        slots: all slots of the node net, in row order
+        weights: the CSR matrix of link weights
+        link_positions: the position of every link's weight in the data of the weight matrix
+        node_uids: the uids of the nodes that are calculated here instead of by their node functions
+        step: the step in which activation was last propagated with this compiled net, or None
+    """
+
+    def __init__(self, nodenet):
+        self.step = None
+        self.slot_activations = None
+
+        nodes = [nodenet.get_node(uid) for uid in nodenet.get_node_uids()]
+
+        self.gates = []
+        self.slots = []
+        gate_indices = {}
+        slot_indices = {}
+        for node in nodes:
+            for gate_type in node.get_gate_types():
+                gate = node.get_gate(gate_type)
+                gate_indices[gate] = len(self.gates)
+                self.gates.append(gate)
+            for slot_type in node.get_slot_types():
+                slot = node.get_slot(slot_type)
+                slot_indices[slot] = len(self.slots)
+                self.slots.append(slot)
+
+        # links in the order DictPropagate visits them: by source node, gate and link
+        rows = []
+        columns = []
+        weights = []
+        links = []
+        for gate in self.gates:
+            for link in gate.get_links():
+                rows.append(slot_indices[link.target_slot])
+                columns.append(gate_indices[gate])
+                weights.append(float(link.weight))
+                links.append(link)
+
+        # a stable sort by row keeps the visiting order within every row
+        rows = np.array(rows, dtype=np.int64)
+        order = np.argsort(rows, kind='mergesort')
+        indptr = np.searchsorted(rows[order], np.arange(len(self.slots) + 1))
+        self.weights = sparse.csr_matrix(
+            (np.array(weights, dtype=float)[order], np.array(columns, dtype=np.int64)[order], indptr),
+            shape=(len(self.slots), len(self.gates)))
+        self.link_positions = dict((links[index], position) for position, index in enumerate(order.tolist()))
+
+        self.compile_linear_nodes(nodes, slot_indices)
+
+    def compile_linear_nodes(self, nodes, slot_indices):
+        self.nodes = []
+        self.node_uids = []
+        self.node_gates = []
+        gen_slots = []
+        gate_nodes = []
+        absolute = []
+        thresholds = []
+        amplifications = []
+        minima = []
+        maxima = []
+        factor_indices = []
+        self.factor_keys = []
+        factor_key_indices = {}
+        for node in nodes:
+            if VECTORIZED_NODEFUNCTIONS.get(node.type) is not node.nodetype.nodefunction:
+                continue
+            gate_types = node.get_gate_types()
+            if node.get_slot('gen') is None or \
+                    any(node.get_gatefunction_name(gate_type) not in VECTORIZED_GATEFUNCTIONS for gate_type in gate_types):
+                continue
+            for gate_type in gate_types:
+                gate = node.get_gate(gate_type)
+                key = (node.parent_nodespace or "Root", gate_type)
+                if key not in factor_key_indices:
+                    factor_key_indices[key] = len(self.factor_keys)
+                    self.factor_keys.append(key)
+                self.node_gates.append(gate)
+                gate_nodes.append(len(self.nodes))
+                absolute.append(node.get_gatefunction_name(gate_type) == 'absolute')
+                thresholds.append(gate.parameters['threshold'])
+                amplifications.append(gate.parameters['amplification'])
+                minima.append(gate.parameters['minimum'])
+                maxima.append(gate.parameters['maximum'])
+                factor_indices.append(factor_key_indices[key])
+            gen_slots.append(slot_indices[node.get_slot('gen')])
+            self.nodes.append(node)
+            self.node_uids.append(node.uid)
+
+        self.gen_slots = np.array(gen_slots, dtype=np.int64)
+        self.gate_nodes = np.array(gate_nodes, dtype=np.int64)
+        self.absolute = np.array(absolute, dtype=bool)
+        self.thresholds = np.array(thresholds, dtype=float)
+        self.amplifications = np.array(amplifications, dtype=float)
+        self.minima = np.array(minima, dtype=float)
+        self.maxima = np.array(maxima, dtype=float)
+        self.factor_indices = np.array(factor_indices, dtype=np.int64)
+
+    def set_link_weight(self, link, weight):
+        """Updates the weight of a compiled link in place, returns False if the link is not compiled"""
+        position = self.link_positions.get(link)
+        if position is None:
+            return False
+        self.weights.data[position] = float(weight)
+        return True
+
+    def propagate(self, step):
+        """Propagates activation from all gates to all slots.
+        Returns False without changing anything if a gate carries sheaves other than the default sheaf."""
+        activations = []
+        append = activations.append
+        for gate in self.gates:
+            activation = gate.get_default_activation()
+            if activation is None:
+                self.step = None
+                return False
+            append(activation)
+        self.slot_activations = self.weights.dot(np.array(activations, dtype=float))
+        for slot, activation in zip(self.slots, self.slot_activations.tolist()):
+            slot.set_default_activation(activation)
+        self.step = step
+        return True
+
+    def calculate(self, nodenet):
+        """Calculates the compiled Register and Concept nodes from the propagated slot activations,
+        as their node functions and DictGate.gate_function would"""
+        if not self.nodes:
+            return
+        node_activations = self.slot_activations[self.gen_slots]
+        activations = node_activations[self.gate_nodes]
+        activations = np.where(self.absolute, np.abs(activations), activations)
+
+        table = nodenet.get_gate_factors()
+        if table:
+            factors = [table.get(nodespace_uid, {}).get(gate_type, 1.0) for nodespace_uid, gate_type in self.factor_keys]
+            gate_factors = np.array(factors, dtype=float)[self.factor_indices]
+        else:
+            gate_factors = np.ones(len(self.factor_indices))
+
+        gate_activations = activations * self.amplifications * gate_factors
+        gate_activations[activations * gate_factors < self.thresholds] = 0
+        gate_activations = np.minimum(self.maxima, np.maximum(self.minima, gate_activations))
+        gate_activations[gate_factors == 0.0] = 0
+
+        for node, activation in zip(self.nodes, node_activations.tolist()):
+            node.sheaves = default_sheaves(activation)
+        for gate, activation in zip(self.node_gates, gate_activations.tolist()):
+            gate.set_default_activation(activation)
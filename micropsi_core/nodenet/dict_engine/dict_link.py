@@ -20,12 +20,7 @@ class DictLink(Link):
     You may retrieve links either from the global dictionary (by uid), or from the gates of nodes themselves.
     """
 
-    __weight = None
-    __certainty = None
-    __source_node = None
-    __target_node = None
-    __source_gate = None
-    __target_slot = None
+    __slots__ = ('__weight', '__certainty', '__source_node', '__target_node', '__source_gate', '__target_slot', '__key')
 
     @property
     def data(self):
@@ -42,7 +37,12 @@ class DictLink(Link):
 
     @property
     def uid(self):
-        return self.source_node.uid + ":" + self.source_gate.type + ":" + self.target_slot.type + ":" + self.target_node.uid
+        return ":".join(self.__key)
+
+    @property
+    def key(self):
+        """A tuple of source node uid, gate type, slot type and target node uid, identifying the link like its uid"""
+        return self.__key
 
     @property
     def weight(self):
@@ -89,8 +89,10 @@ class DictLink(Link):
         self.__target_slot = target_node.get_slot(target_slot_name)
         self.__weight = weight
         self.__certainty = certainty
+        self.__key = (source_node.uid, self.__source_gate.type, self.__target_slot.type, target_node.uid)
         self.__source_gate._register_outgoing(self)
         self.__target_slot._register_incoming(self)
+        source_node.nodenet._invalidate_compiled_net()
 
     def remove(self):
         """unplug the link from the node net
@@ -98,7 +100,9 @@ class DictLink(Link):
         """
         self.__source_gate._unregister_outgoing(self)
         self.__target_slot._unregister_incoming(self)
+        self.__source_node.nodenet._invalidate_compiled_net()
 
     def set_weight(self, weight, certainty=1):
         self.__weight = weight
         self.__certainty = certainty
+        self.__source_node.nodenet._link_weight_changed(self)
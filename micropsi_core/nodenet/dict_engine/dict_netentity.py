@@ -76,6 +76,9 @@ class NetEntity(object):
                     if old_parent and old_parent.uid != uid and old_parent.is_entity_known_as(self.entitytype, self.uid):
                         old_parent._unregister_entity(self.entitytype, self.uid)
         self.__parent_nodespace = uid
+        if self.entitytype == "nodes":
+            # gate activators depend on the nodespace
+            self.nodenet._invalidate_compiled_net()
 
     def __init__(self, nodenet, parent_nodespace, position, name="", entitytype="abstract_entities",
                  uid=None, index=None):
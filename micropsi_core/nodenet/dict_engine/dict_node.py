@@ -25,6 +25,12 @@ __date__ = '09.05.12'
 
 emptySheafElement = dict(uid="default", name="default", activation=0)
 
+# the parameters that bind sensors and actors to the world adapter
+BINDING_PARAMETERS = {
+    "Sensor": "datasource",
+    "Actor": "datatarget"
+}
+
 
 class DictNode(NetEntity, Node):
     """A net entity with slots and gates and a node function.
@@ -156,18 +162,23 @@ class DictNode(NetEntity, Node):
                     node_activation_to_carry_over[id] = self.sheaves[id]
 
             # clear activation states
+            default_only = len(sheaves_to_calculate) == 1
             for gatename in self.get_gate_types():
                 gate = self.get_gate(gatename)
-                gate.sheaves = {}
+                if default_only:
+                    gate.set_default_activation(0)
+                else:
+                    gate.sheaves = {}
             self.sheaves = {}
 
             # calculate activation states for all open sheaves
             for sheaf_id in sheaves_to_calculate:
 
                 # prepare sheaves
-                for gatename in self.get_gate_types():
-                    gate = self.get_gate(gatename)
-                    gate.sheaves[sheaf_id] = sheaves_to_calculate[sheaf_id].copy()
+                if not default_only:
+                    for gatename in self.get_gate_types():
+                        gate = self.get_gate(gatename)
+                        gate.sheaves[sheaf_id] = sheaves_to_calculate[sheaf_id].copy()
                 if sheaf_id in node_activation_to_carry_over:
                     self.sheaves[sheaf_id] = node_activation_to_carry_over[sheaf_id].copy()
                     self.set_sheaf_activation(node_activation_to_carry_over[sheaf_id]['activation'], sheaf_id)
@@ -209,13 +220,18 @@ class DictNode(NetEntity, Node):
         activation = float(activation)
         gate = self.get_gate(gatetype)
         if gate is not None:
-            gate.sheaves[sheaf]['activation'] = activation
+            gate.set_sheaf_activation(activation, sheaf)
+            self.nodenet._node_activation_set(self)
 
     def get_sheaves_to_calculate(self):
         sheaves_to_calculate = {}
         for slotname in self.get_slot_types():
-            for uid in self.get_slot(slotname).sheaves:
-                sheaves_to_calculate[uid] = self.get_slot(slotname).sheaves[uid].copy()
+            slot = self.get_slot(slotname)
+            if slot.get_default_activation() is not None:
+                sheaves_to_calculate['default'] = emptySheafElement.copy()
+                continue
+            for uid in slot.sheaves:
+                sheaves_to_calculate[uid] = slot.sheaves[uid].copy()
                 sheaves_to_calculate[uid]['activation'] = 0
         if 'default' not in sheaves_to_calculate:
             sheaves_to_calculate['default'] = emptySheafElement.copy()
@@ -256,6 +272,7 @@ class DictNode(NetEntity, Node):
             elif parameter in self.__non_default_gate_parameters.get(gate_type, {}):
                 del self.__non_default_gate_parameters[gate_type][parameter]
         self.get_gate(gate_type).parameters[parameter] = value
+        self.nodenet._invalidate_compiled_net()
 
     def get_gatefunction(self, gate_type):
         if self.get_gate(gate_type):
@@ -275,6 +292,7 @@ class DictNode(NetEntity, Node):
                 self.__gatefunctions[gate_type] = getattr(gatefunctions, gatefunction)
             else:
                 raise NameError("Unknown Gatefunction")
+            self.nodenet._invalidate_compiled_net()
         else:
             raise KeyError("Wrong Gatetype")
 
@@ -286,7 +304,7 @@ class DictNode(NetEntity, Node):
 
     def reset_slots(self):
         for slottype in self.get_slot_types():
-            self.get_slot(slottype).sheaves = {"default": emptySheafElement.copy()}
+            self.get_slot(slottype).set_default_activation(0)
 
     def get_parameter(self, parameter):
         if parameter in self.__parameters:
@@ -296,15 +314,24 @@ class DictNode(NetEntity, Node):
 
     def clear_parameter(self, parameter):
         if parameter in self.__parameters:
+            old_value = self.__parameters[parameter]
             if parameter not in self.nodetype.parameters:
                 del self.__parameters[parameter]
             else:
                 self.__parameters[parameter] = None
+            self.__binding_changed(parameter, old_value, None)
 
     def set_parameter(self, parameter, value):
         if value == '':
             value = None
+        old_value = self.__parameters.get(parameter)
         self.__parameters[parameter] = value
+        self.__binding_changed(parameter, old_value, value)
+
+    def __binding_changed(self, parameter, old_value, new_value):
+        # nodes that are not registered yet are indexed on registration
+        if parameter == BINDING_PARAMETERS.get(self.type) and self.nodenet.is_node(self.uid) and self.nodenet.get_node(self.uid) is self:
+            self.nodenet._node_binding_changed(self, parameter, old_value, new_value)
 
     def clone_parameters(self):
         return self.__parameters.copy()
@@ -378,7 +405,65 @@ class DictNode(NetEntity, Node):
             link.remove()
 
 
-class DictGate(Gate):
+class DictSheaves(object):
+    """The sheaves of a gate or a slot.
+
+    Sheaves are kept in a dict of sheaf dicts ({'uid', 'name', 'activation'}) by sheaf uid. Most gates and slots
+    only ever carry the default sheaf though, so as long as they do, only the activation of the default sheaf is
+    stored, and the dict is created when it is accessed.
+    """
+
+    __slots__ = ('__activation', '__sheaves')
+
+    @property
+    def sheaves(self):
+        if self.__sheaves is None:
+            self.__sheaves = {"default": dict(uid="default", name="default", activation=self.__activation)}
+        return self.__sheaves
+
+    @sheaves.setter
+    def sheaves(self, sheaves):
+        self.__sheaves = sheaves
+
+    @property
+    def activation(self):
+        if self.__sheaves is None:
+            return self.__activation
+        return self.__sheaves['default']['activation']
+
+    @property
+    def activations(self):
+        if self.__sheaves is None:
+            return {"default": self.__activation}
+        return dict((k, v['activation']) for k, v in self.__sheaves.items())
+
+    def get_default_activation(self):
+        """Returns the activation of the default sheaf, or None if there are other sheaves"""
+        sheaves = self.__sheaves
+        if sheaves is None:
+            return self.__activation
+        if len(sheaves) == 1 and "default" in sheaves:
+            return sheaves["default"]['activation']
+        return None
+
+    def set_default_activation(self, activation):
+        """Sets the activation of the default sheaf, and drops all other sheaves"""
+        self.__sheaves = None
+        self.__activation = activation
+
+    def set_sheaf_activation(self, activation, sheaf="default"):
+        if self.__sheaves is None and sheaf == "default":
+            self.__activation = activation
+        else:
+            self.sheaves[sheaf]['activation'] = activation
+
+    def clone_sheaves(self):
+        if self.__sheaves is None:
+            return {"default": dict(uid="default", name="default", activation=self.__activation)}
+        return self.__sheaves.copy()
+
+
+class DictGate(DictSheaves, Gate):
     """The activation outlet of a node. Nodes may have many gates, from which links originate.
 
     Attributes:
@@ -388,8 +473,7 @@ class DictGate(Gate):
         parameters: a dictionary of values used by the gate function
     """
 
-    __type = None
-    __node = None
+    __slots__ = ('__type', '__node', '__outgoing', 'parameters', 'monitor')
 
     @property
     def type(self):
@@ -403,14 +487,6 @@ class DictGate(Gate):
     def empty(self):
         return len(self.__outgoing) == 0
 
-    @property
-    def activation(self):
-        return self.sheaves['default']['activation']
-
-    @property
-    def activations(self):
-        return dict((k, v['activation']) for k, v in self.sheaves.items())
-
     def __init__(self, type, node, sheaves=None, parameters=None):
         """create a gate.
 
@@ -421,9 +497,8 @@ class DictGate(Gate):
         """
         self.__type = type
         self.__node = node
-        if sheaves is None:
-            self.sheaves = {"default": emptySheafElement.copy()}
-        else:
+        self.set_default_activation(0)
+        if sheaves is not None:
             self.sheaves = {}
             for key in sheaves:
                 self.sheaves[key] = dict(uid=sheaves[key]['uid'], name=sheaves[key]['name'], activation=sheaves[key]['activation'])
@@ -438,13 +513,10 @@ class DictGate(Gate):
         return self.parameters[parameter_name]
 
     def _register_outgoing(self, link):
-        self.__outgoing[link.uid] = link
+        self.__outgoing[link.key] = link
 
     def _unregister_outgoing(self, link):
-        del self.__outgoing[link.uid]
-
-    def clone_sheaves(self):
-        return self.sheaves.copy()
+        del self.__outgoing[link.key]
 
     def gate_function(self, input_activation, sheaf="default"):
         """This function sets the activation of the gate.
@@ -457,13 +529,13 @@ class DictGate(Gate):
             input_activation = 0
 
         # check if the current node space has an activator that would prevent the activity of this gate
-        nodespace = self.node.nodenet.get_nodespace(self.node.parent_nodespace)
-        if nodespace.has_activator(self.type):
-            gate_factor = nodespace.get_activator_value(self.type)
+        gate_factors = self.__node.nodenet.get_gate_factors().get(self.__node.parent_nodespace or "Root")
+        if gate_factors is not None and self.__type in gate_factors:
+            gate_factor = gate_factors[self.__type]
         else:
             gate_factor = 1.0
         if gate_factor == 0.0:
-            self.sheaves[sheaf]['activation'] = 0
+            self.set_sheaf_activation(0, sheaf)
             return  # if the gate is closed, we don't need to execute the gate function
             # simple linear threshold function; you might want to use a sigmoid for neural learning
         gatefunction = self.__node.get_gatefunction(self.__type)
@@ -483,7 +555,7 @@ class DictGate(Gate):
         #     else:
         #         activation = max(activation, self.activation * (1 - self.parameters["decay"]))
 
-        self.sheaves[sheaf]['activation'] = min(self.parameters["maximum"], max(self.parameters["minimum"], activation))
+        self.set_sheaf_activation(min(self.parameters["maximum"], max(self.parameters["minimum"], activation)), sheaf)
 
     def open_sheaf(self, input_activation, sheaf="default"):
         """This function opens a new sheaf and calls the gate function for the newly opened sheaf
@@ -497,11 +569,12 @@ class DictGate(Gate):
 
         new_sheaf = dict(uid=sheaf_uid_prefix + self.node.uid, name=sheaf_name_prefix + self.node.name, activation=0)
         self.sheaves[new_sheaf['uid']] = new_sheaf
+        self.__node.nodenet._node_activation_set(self.__node)
 
         self.gate_function(input_activation, new_sheaf['uid'])
 
 
-class DictSlot(Slot):
+class DictSlot(DictSheaves, Slot):
     """The entrance of activation into a node. Nodes may have many slots, in which links terminate.
 
     Attributes:
@@ -512,8 +585,7 @@ class DictSlot(Slot):
         incoming: a dictionary of incoming links together with the respective activation received by them
     """
 
-    __type = None
-    __node = None
+    __slots__ = ('__type', '__node', '__incoming')
 
     @property
     def type(self):
@@ -527,14 +599,6 @@ class DictSlot(Slot):
     def empty(self):
         return len(self.__incoming) == 0
 
-    @property
-    def activation(self):
-        return self.sheaves['default']['activation']
-
-    @property
-    def activations(self):
-        return dict((k, v['activation']) for k, v in self.sheaves.items())
-
     def __init__(self, type, node):
         """create a slot.
 
@@ -545,11 +609,14 @@ class DictSlot(Slot):
         self.__type = type
         self.__node = node
         self.__incoming = {}
-        self.sheaves = {"default": emptySheafElement.copy()}
+        self.set_default_activation(0)
 
     def get_activation(self, sheaf="default"):
         if len(self.__incoming) == 0:
             return 0
+        activation = self.get_default_activation()
+        if activation is not None:
+            return activation if sheaf == "default" else 0
         if sheaf not in self.sheaves:
             return 0
         return self.sheaves[sheaf]['activation']
@@ -558,7 +625,7 @@ class DictSlot(Slot):
         return list(self.__incoming.values())
 
     def _register_incoming(self, link):
-        self.__incoming[link.uid] = link
+        self.__incoming[link.key] = link
 
     def _unregister_incoming(self, link):
-        del self.__incoming[link.uid]
+        del self.__incoming[link.key]
@@ -9,8 +9,10 @@ from micropsi_core.nodenet import monitor
 from micropsi_core.nodenet.node import Nodetype
 from micropsi_core.nodenet.nodenet import Nodenet, NODENET_VERSION, NodenetLockException
 from .dict_stepoperators import DictPropagate, DictPORRETDecay, DictCalculate, DictDoernerianEmotionalModulators
-from .dict_node import DictNode
+from .dict_node import DictNode, BINDING_PARAMETERS
 from .dict_nodespace import DictNodespace
+from . import dict_compiled
+from . import dict_activity
 import copy
 
 STANDARD_NODETYPES = {
@@ -161,6 +163,24 @@ STANDARD_NODETYPES = {
     }
 }
 
+# nodes are kept in partitions by type, so that step operators can go through the ones they need directly
+NODE_PARTITIONS = ("activators", "nativemodules", "sensors", "actors", "pipes", "plain")
+PARTITIONS_BY_TYPE = {
+    "Activator": "activators",
+    "Sensor": "sensors",
+    "Actor": "actors",
+    "Pipe": "pipes",
+    "Script": "pipes",
+    "Trigger": "pipes"
+}
+
+
+def get_partition_name(nodetype):
+    if nodetype not in STANDARD_NODETYPES:
+        return "nativemodules"
+    return PARTITIONS_BY_TYPE.get(nodetype, "plain")
+
+
 class DictNodenet(Nodenet):
     """Main data structure for MicroPsi agents,
 
@@ -192,6 +212,7 @@ class DictNodenet(Nodenet):
         data['nodespaces'] = self.construct_nodespaces_dict("Root")
         data['version'] = self.__version
         data['modulators'] = self.construct_modulators_dict()
+        data['activity_driven'] = self.activity_driven
         return data
 
     @property
@@ -202,6 +223,17 @@ class DictNodenet(Nodenet):
     def current_step(self):
         return self.__step
 
+    @property
+    def activity_driven(self):
+        """If True, steps only push activation from active gates and only calculate the nodes that received
+        activation, see dict_activity"""
+        return self.__activity is not None
+
+    @activity_driven.setter
+    def activity_driven(self, activity_driven):
+        if activity_driven != self.activity_driven:
+            self.__activity = dict_activity.DictActivity() if activity_driven else None
+
     def __init__(self, name="", worldadapter="Default", world=None, owner="", uid=None, native_modules={}):
         """Create a new MicroPsi agent.
 
@@ -225,6 +257,12 @@ class DictNodenet(Nodenet):
             self.worldadapter = worldadapter
 
         self.__nodes = {}
+        self.__partitions = dict((name, {}) for name in NODE_PARTITIONS)
+        self.__lent = set()
+        self.__compiled_net = None
+        self.__activity = None
+        self.__gate_factors = None
+        self.__bindings = {"datasource": {}, "datatarget": {}}
         self.__nodespaces = {}
         self.__nodespaces["Root"] = DictNodespace(self, None, (0, 0), name="Root", uid="Root")
 
@@ -306,9 +344,11 @@ class DictNodenet(Nodenet):
         """
 
         self.__modulators = initfrom.get("modulators", {})
+        self.activity_driven = initfrom.get("activity_driven", False)
 
         # set up nodespaces; make sure that parent nodespaces exist before children are initialized
         self.__nodespaces = {}
+        self.__gate_factors = None
         self.__nodespaces["Root"] = DictNodespace(self, None, (0, 0), name="Root", uid="Root")
 
         if len(initfrom) != 0:
@@ -409,12 +449,18 @@ class DictNodenet(Nodenet):
             del self.__nodespaces[node_uid]
         else:
             node = self.__nodes[node_uid]
+            partition = get_partition_name(node.type)
+            self.__unlend(partition)
             node.unlink_completely()
             parent_nodespace = self.__nodespaces.get(self.__nodes[node_uid].parent_nodespace)
             parent_nodespace._unregister_entity('nodes', node_uid)
             if self.__nodes[node_uid].type == "Activator":
                 parent_nodespace.unset_activator_value(self.__nodes[node_uid].get_parameter('type'))
+            if node.type in BINDING_PARAMETERS:
+                self._node_binding_changed(node, BINDING_PARAMETERS[node.type], node.get_parameter(BINDING_PARAMETERS[node.type]), None)
             del self.__nodes[node_uid]
+            del self.__partitions[partition][node_uid]
+            self._invalidate_compiled_net()
 
     def delete_nodespace(self, uid):
         self.delete_node(uid)
@@ -422,6 +468,13 @@ class DictNodenet(Nodenet):
     def clear(self):
         super(DictNodenet, self).clear()
         self.__nodes = {}
+        self.__partitions = dict((name, {}) for name in NODE_PARTITIONS)
+        self.__lent = set()
+        self.__compiled_net = None
+        if self.__activity is not None:
+            self.__activity = dict_activity.DictActivity()
+        self.__gate_factors = None
+        self.__bindings = {"datasource": {}, "datatarget": {}}
 
         self.max_coords = {'x': 0, 'y': 0}
 
@@ -429,7 +482,86 @@ class DictNodenet(Nodenet):
         DictNodespace(self, None, (0, 0), "Root", "Root")
 
     def _register_node(self, node):
+        partition = get_partition_name(node.type)
+        self.__unlend(partition)
         self.__nodes[node.uid] = node
+        self.__partitions[partition][node.uid] = node
+        if node.type in BINDING_PARAMETERS:
+            self._node_binding_changed(node, BINDING_PARAMETERS[node.type], None, node.get_parameter(BINDING_PARAMETERS[node.type]))
+        self._invalidate_compiled_net()
+
+    def _node_binding_changed(self, node, parameter, old_value, new_value):
+        """Keeps the index of sensors by datasource and actors by datatarget up to date,
+        called whenever a sensor or actor is registered, deleted or bound to another datasource or datatarget"""
+        bindings = self.__bindings[parameter]
+        if old_value in bindings:
+            bindings[old_value].pop(node.uid, None)
+            if not bindings[old_value]:
+                del bindings[old_value]
+        if new_value is not None:
+            bindings.setdefault(new_value, {})[node.uid] = node
+
+    def get_bound_nodes(self, parameter, value, nodespace=None):
+        """Returns a dict of the sensors bound to the given datasource, or the actors bound to the given datatarget
+        ( parameter is "datasource" or "datatarget" ), optionally filtered by the given nodespace"""
+        bound = self.__bindings[parameter].get(value, {})
+        return dict((uid, node) for uid, node in bound.items() if nodespace is None or node.parent_nodespace == nodespace)
+
+    def __unlend(self, partition):
+        """Step operators iterate the node dicts without copying them, so copy them before they change"""
+        if "nodes" in self.__lent:
+            self.__nodes = self.__nodes.copy()
+        if partition in self.__lent:
+            self.__partitions[partition] = self.__partitions[partition].copy()
+        self.__lent.difference_update(("nodes", partition))
+
+    def get_partition(self, name):
+        """Returns the dict of nodes in the given partition ( see NODE_PARTITIONS ).
+        The dict must not be changed, and will not change during the current step operator."""
+        return self.__partitions[name]
+
+    def _invalidate_compiled_net(self):
+        """Called whenever nodes, links, gate parameters or gate functions change"""
+        self.__compiled_net = None
+        if self.__activity is not None:
+            self.__activity.invalidate()
+
+    def _node_activation_set(self, node):
+        """Called whenever the gate activations of a node are set through the node"""
+        if self.__activity is not None:
+            self.__activity.touch(node)
+
+    def get_activity(self):
+        """Returns the frontier of activity of the node net ( see dict_activity ), or None if the node net is not
+        activity driven"""
+        return self.__activity
+
+    def _invalidate_gate_factors(self):
+        """Called whenever the activators of a nodespace change"""
+        self.__gate_factors = None
+
+    def get_gate_factors(self):
+        """Returns a dict of the activator values of all nodespaces that have activators, by nodespace uid
+        and gate type. Gates of nodespaces or gate types without activators are not restricted.
+        The dict is built once after the activators changed, which they usually do once per step."""
+        if self.__gate_factors is None:
+            self.__gate_factors = {}
+            for uid, nodespace in self.__nodespaces.items():
+                activators = nodespace.clone_activators()
+                if activators:
+                    self.__gate_factors[uid] = activators
+        return self.__gate_factors
+
+    def _link_weight_changed(self, link):
+        if self.__compiled_net is not None and not self.__compiled_net.set_link_weight(link, link.weight):
+            self.__compiled_net = None
+
+    def get_compiled_net(self, build=True):
+        """Returns the compiled representation of the node net ( see dict_compiled ), compiling it if
+        necessary and build is True. Returns None if it can not be compiled."""
+        if self.__compiled_net is None and build and dict_compiled.is_available():
+            self.__compiled_net = dict_compiled.DictCompiledNet(self)
+        return self.__compiled_net
 
     def _register_nodespace(self, nodespace):
         self.__nodespaces[nodespace.uid] = nodespace
@@ -497,7 +629,9 @@ class DictNodenet(Nodenet):
             self.timeout_locks()
 
             for operator in self.stepoperators:
-                operator.execute(self, self.__nodes.copy(), self.netapi)
+                self.__lent = set(NODE_PARTITIONS + ("nodes",))
+                operator.execute(self, self.__nodes, self.netapi)
+            self.__lent = set()
 
             self.netapi._step()
 
@@ -552,42 +686,33 @@ class DictNodenet(Nodenet):
 
     def get_nativemodules(self, nodespace=None):
         """Returns a dict of native modules. Optionally filtered by the given nodespace"""
-        nodes = self.__nodes if nodespace is None else self.__nodespaces[nodespace].get_known_ids('nodes')
-        nativemodules = {}
-        for uid in nodes:
-            if self.__nodes[uid].type not in STANDARD_NODETYPES:
-                nativemodules.update({uid: self.__nodes[uid]})
-        return nativemodules
+        return self.get_partition_nodes("nativemodules", nodespace)
 
     def get_activators(self, nodespace=None, type=None):
         """Returns a dict of activator nodes. OPtionally filtered by the given nodespace and the given type"""
-        nodes = self.__nodes if nodespace is None else self.__nodespaces[nodespace].get_known_ids('nodes')
-        activators = {}
-        for uid in nodes:
-            if self.__nodes[uid].type == 'Activator':
-                if type is None or type == self.__nodes[uid].get_parameter('type'):
-                    activators.update({uid: self.__nodes[uid]})
+        activators = self.get_partition_nodes("activators", nodespace)
+        if type is not None:
+            activators = dict((uid, node) for uid, node in activators.items() if node.get_parameter('type') == type)
         return activators
 
     def get_sensors(self, nodespace=None, datasource=None):
         """Returns a dict of all sensor nodes. Optionally filtered by the given nodespace"""
-        nodes = self.__nodes if nodespace is None else self.__nodespaces[nodespace].get_known_ids('nodes')
-        sensors = {}
-        for uid in nodes:
-            if self.__nodes[uid].type == 'Sensor':
-                if datasource is None or self.__nodes[uid].get_parameter('datasource') == datasource:
-                    sensors[uid] = self.__nodes[uid]
-        return sensors
+        if datasource is not None:
+            return self.get_bound_nodes("datasource", datasource, nodespace)
+        return self.get_partition_nodes("sensors", nodespace)
 
     def get_actors(self, nodespace=None, datatarget=None):
         """Returns a dict of all sensor nodes. Optionally filtered by the given nodespace"""
-        nodes = self.__nodes if nodespace is None else self.__nodespaces[nodespace].get_known_ids('nodes')
-        actors = {}
-        for uid in nodes:
-            if self.__nodes[uid].type == 'Actor':
-                if datatarget is None or self.__nodes[uid].get_parameter('datatarget') == datatarget:
-                    actors[uid] = self.__nodes[uid]
-        return actors
+        if datatarget is not None:
+            return self.get_bound_nodes("datatarget", datatarget, nodespace)
+        return self.get_partition_nodes("actors", nodespace)
+
+    def get_partition_nodes(self, name, nodespace=None):
+        """Returns a copy of the dict of nodes in the given partition, optionally filtered by the given nodespace"""
+        partition = self.__partitions[name]
+        if nodespace is None:
+            return partition.copy()
+        return dict((uid, partition[uid]) for uid in self.__nodespaces[nodespace].get_known_ids('nodes') if uid in partition)
 
     def set_link_weight(self, source_node_uid, gate_type, target_node_uid, slot_type, weight=1, certainty=1):
         """Set weight of the given link."""
@@ -65,9 +65,14 @@ class DictNodespace(NetEntity, Nodespace):
 
     def set_activator_value(self, type, value):
         self.__activators[type] = value
+        self.nodenet._invalidate_gate_factors()
 
     def unset_activator_value(self, type):
         self.__activators.pop(type, None)
+        self.nodenet._invalidate_gate_factors()
+
+    def clone_activators(self):
+        return self.__activators.copy()
 
     def _register_entity(self, entity):
         if entity.entitytype not in self.__netentities:
@@ -4,6 +4,8 @@ import math
 
 from micropsi_core.nodenet.stepoperators import StepOperator, Propagate, Calculate
 
+DEFAULT_SHEAF = 0
+
 
 class DictPropagate(Propagate):
     """
@@ -16,40 +18,107 @@ class DictPropagate(Propagate):
                 limit_gatetypes (optional): a list of gatetypes to restrict the activation to links originating
                     from the given slottypes.
         """
-        for uid, node in nodes.items():
-            node.reset_slots()
-
-        # propagate sheaf existence
+        # activity-driven node nets only push activation from active gates (see dict_activity)
+        activity = nodenet.get_activity()
+        if activity is not None and activity.propagate(nodenet):
+            return
+
+        # as long as there are no sheaves to spread, use the compiled links (see dict_compiled)
+        compiled_net = nodenet.get_compiled_net()
+        if compiled_net is not None and compiled_net.propagate(nodenet.current_step):
+            return
+
+        # sheaves are numbered per step, so that the link loops below only deal with integer ids
+        sheaf_ids = {"default": DEFAULT_SHEAF}
+        sheaf_uids = ["default"]
+        outgoing = []
         for uid, node in nodes.items():
             for gate_type in node.get_gate_types():
                 gate = node.get_gate(gate_type)
-                if gate.get_parameter('spreadsheaves'):
-                    for sheaf in gate.sheaves:
-                        for link in gate.get_links():
-                            for slotname in link.target_node.get_slot_types():
-                                if sheaf not in link.target_node.get_slot(slotname).sheaves and link.target_node.type != "Actor":
-                                    link.target_node.get_slot(slotname).sheaves[sheaf] = dict(
-                                        uid=gate.sheaves[sheaf]['uid'],
-                                        name=gate.sheaves[sheaf]['name'],
-                                        activation=0)
+                links = gate.get_links()
+                if not links:
+                    continue
+                activation = gate.get_default_activation()
+                if activation is not None:
+                    outgoing.append((links, [(DEFAULT_SHEAF, None, float(activation))], False))
+                    continue
+                sheaves = []
+                for sheaf, element in gate.sheaves.items():
+                    sheaf_id = sheaf_ids.get(sheaf)
+                    if sheaf_id is None:
+                        sheaf_id = sheaf_ids[sheaf] = len(sheaf_uids)
+                        sheaf_uids.append(sheaf)
+                    sheaves.append((sheaf_id, element, float(element['activation'])))
+                outgoing.append((links, sheaves, gate.get_parameter('spreadsheaves')))
+
+        # propagate sheaf existence: sheaves spread to all slots of the target nodes
+        spread_sheaves = {}
+        for links, sheaves, spreadsheaves in outgoing:
+            if spreadsheaves and any(sheaf_id != DEFAULT_SHEAF for sheaf_id, element, activation in sheaves):
+                for link in links:
+                    target = link.target_node
+                    if target.type != "Actor":
+                        existing = spread_sheaves.get(target)
+                        if existing is None:
+                            existing = spread_sheaves[target] = {}
+                        for sheaf_id, element, activation in sheaves:
+                            if sheaf_id != DEFAULT_SHEAF and sheaf_id not in existing:
+                                existing[sheaf_id] = element
 
         # propagate activation
-        for uid, node in nodes.items():
-            for gate_type in node.get_gate_types():
-                gate = node.get_gate(gate_type)
-                for link in gate.get_links():
-                    for sheaf in gate.sheaves:
-                        targetsheaf = sheaf
-                        if link.target_node.type != "Pipe":
-                            targetsheaf = "default"
+        slot_activations = {}
+        closing_sheaves = {}
+        no_sheaves = {}
+        for links, sheaves, spreadsheaves in outgoing:
+            for link in links:
+                target = link.target_node
+                activations = slot_activations.get(link.target_slot)
+                if activations is None:
+                    activations = slot_activations[link.target_slot] = {}
+                weight = float(link.weight)  # TODO: where's the string coming from?
+                if target.type != "Pipe":
+                    # everything ends up in the default sheaf
+                    total = activations.get(DEFAULT_SHEAF, 0)
+                    for sheaf_id, element, activation in sheaves:
+                        total += activation * weight
+                    activations[DEFAULT_SHEAF] = total
+                    continue
+                existing = spread_sheaves.get(target, no_sheaves)
+                for sheaf_id, element, activation in sheaves:
+                    target_id = sheaf_id
+                    if target_id != DEFAULT_SHEAF and target_id not in existing:
+                        # a sheaf that has not been spread to the pipe that opened it is closed there
+                        key = (sheaf_id, target)
+                        if key not in closing_sheaves:
+                            closing_sheaves[key] = self.get_closed_sheaf(sheaf_uids[sheaf_id], target, sheaf_ids, existing)
+                        target_id = closing_sheaves[key]
+                        if target_id is None:
+                            continue
+                    activations[target_id] = activations.get(target_id, 0) + activation * weight
 
-                        if targetsheaf in link.target_slot.sheaves:
-                            link.target_slot.sheaves[targetsheaf]['activation'] += \
-                                float(gate.sheaves[sheaf]['activation']) * float(link.weight)  # TODO: where's the string coming from?
-                        elif sheaf.endswith(link.target_node.uid):
-                            targetsheaf = sheaf[:-(len(link.target_node.uid) + 1)]
-                            link.target_slot.sheaves[targetsheaf]['activation'] += \
-                                float(gate.sheaves[sheaf]['activation']) * float(link.weight)  # TODO: where's the string coming from?
+        for uid, node in nodes.items():
+            existing = [(sheaf_uids[sheaf_id], sheaf_id, element['uid'], element['name'])
+                        for sheaf_id, element in spread_sheaves.get(node, no_sheaves).items()]
+            for slot_type in node.get_slot_types():
+                slot = node.get_slot(slot_type)
+                activations = slot_activations.get(slot, no_sheaves)
+                if not existing:
+                    slot.set_default_activation(activations.get(DEFAULT_SHEAF, 0))
+                    continue
+                slot.sheaves = {"default": dict(uid="default", name="default", activation=activations.get(DEFAULT_SHEAF, 0))}
+                for sheaf, sheaf_id, sheaf_uid, name in existing:
+                    slot.sheaves[sheaf] = dict(uid=sheaf_uid, name=name, activation=activations.get(sheaf_id, 0))
+
+    def get_closed_sheaf(self, sheaf, target, sheaf_ids, existing):
+        """ Returns the id of the sheaf that the given sheaf was opened in, if it was opened by the target node,
+            or None. Raises a KeyError if the target node's slots do not have that sheaf. """
+        if not sheaf.endswith(target.uid):
+            return None
+        parent = sheaf[:-(len(target.uid) + 1)]
+        parent_id = sheaf_ids.get(parent)
+        if parent_id != DEFAULT_SHEAF and parent_id not in existing:
+            raise KeyError(parent)
+        return parent_id
 
 
 class DictCalculate(Calculate):
@@ -57,22 +126,43 @@ class DictCalculate(Calculate):
     The default dict implementation of the Calculate operator.
     """
     def execute(self, nodenet, nodes, netapi):
-        activators = nodenet.get_activators()
-        nativemodules = nodenet.get_nativemodules()
-        everythingelse = nodes
-        for key in nativemodules:
-            del everythingelse[key]
+        activators = nodenet.get_partition("activators")
+        nativemodules = nodenet.get_partition("nativemodules")
+        names = ("sensors", "actors", "pipes", "plain")
+        everythingelse = [nodenet.get_partition(name) for name in names]
 
         self.calculate_node_functions(activators)       # activators go first
+        nodenet.get_gate_factors()                      # the activator values are set now, so gates can look them up
         self.calculate_node_functions(nativemodules)    # then native modules, so API sees a deterministic state
-        self.calculate_node_functions(everythingelse)   # then all the peasant nodes get calculated
+
+        activity = nodenet.get_activity()
+        if activity is not None and activity.propagated and activity.valid:
+            # only the nodes at the frontier of activity, if activation was only pushed from active gates
+            # and native modules did not change the structure of the node net (see dict_activity)
+            selected = activity.select_nodes(nodenet)
+            everythingelse = [selected.get(name, nodenet.get_partition(name)) for name in names]
+
+        # linear nodes are calculated by the compiled net, if it propagated this step
+        # and native modules did not change the structure of the node net
+        compiled = ()
+        compiled_net = nodenet.get_compiled_net(build=False)
+        if compiled_net is not None and compiled_net.step == nodenet.current_step:
+            compiled = set(compiled_net.node_uids)
+            compiled_net.calculate(nodenet)
+
+        for partition in everythingelse:                # then all the peasant nodes get calculated
+            self.calculate_node_functions(partition, compiled)
 
         for uid, node in activators.items():
             node.activation = nodenet.get_nodespace(node.parent_nodespace).get_activator_value(node.get_parameter('type'))
 
-    def calculate_node_functions(self, nodes):
-        for uid, node in nodes.copy().items():
-            node.node_function()
+        if activity is not None:
+            activity.update(nodenet)
+
+    def calculate_node_functions(self, nodes, skip=()):
+        for uid, node in nodes.items():
+            if uid not in skip:
+                node.node_function()
 
 
 class DictPORRETDecay(StepOperator):
@@ -16,6 +16,8 @@ class Link(metaclass=ABCMeta):
     A link between two nodes, starting from a gate and ending in a slot.
     """
 
+    __slots__ = ()
+
     @property
     def data(self):
         data = {
@@ -213,9 +213,8 @@ class NetAPI(object):
         if datatarget not in self.world.get_available_datatargets(self.__nodenet.uid):
             raise KeyError("Data target %s not found" % datatarget)
         actor = None
-        for uid, candidate in self.__nodenet.get_actors(node.parent_nodespace).items():
-            if candidate.get_parameter('datatarget') == datatarget:
-                actor = candidate
+        for uid, candidate in self.__nodenet.get_actors(node.parent_nodespace, datatarget).items():
+            actor = candidate
         if actor is None:
             actor = self.create_node("Actor", node.parent_nodespace, datatarget)
             actor.set_parameter('datatarget', datatarget)
@@ -231,9 +230,8 @@ class NetAPI(object):
         if datasource not in self.world.get_available_datasources(self.__nodenet.uid):
             raise KeyError("Data source %s not found" % datasource)
         sensor = None
-        for uid, candidate in self.__nodenet.get_sensors(node.parent_nodespace).items():
-            if candidate.get_parameter('datasource') == datasource:
-                sensor = candidate
+        for uid, candidate in self.__nodenet.get_sensors(node.parent_nodespace, datasource).items():
+            sensor = candidate
         if sensor is None:
             sensor = self.create_node("Sensor", node.parent_nodespace, datasource)
             sensor.set_parameter('datasource', datasource)
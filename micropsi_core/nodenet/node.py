@@ -355,6 +355,8 @@ class Gate(metaclass=ABCMeta):
     Gate activations are set by the node's node_function through calling gate_function for all of their gates.
     """
 
+    __slots__ = ()
+
     @property
     @abstractmethod
     def type(self):
@@ -457,6 +459,8 @@ class Slot(metaclass=ABCMeta):
     net step by node functions.)
     """
 
+    __slots__ = ()
+
     @property
     @abstractmethod
     def type(self):
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+"""
+Nodenet definition for the numpy engine
+
+The numpy engine shares the data layout, the allocation of nodes and elements and the persistence format with
+the theano engine, so nodenets saved by one engine can be loaded by the other. Only the arrays are held in plain
+numpy / scipy.sparse containers instead of theano shared variables, and the step operators are implemented with
+numpy and scipy.sparse instead of compiled theano graphs. The [theano] section of the configuration applies to
+both engines.
+"""
+
+import numpy as np
+
+from micropsi_core.nodenet.theano_engine.theano_nodenet import TheanoNodenet
+from micropsi_core.nodenet.numpy_engine.numpy_stepoperators import NumpyPropagate, NumpyCalculate
+
+
+class NumpySharedArray(object):
+    """
+    Holds one of the arrays of a numpy nodenet, with the get_value / set_value interface of theano shared variables.
+    version counts the calls of set_value, so that values derived from the array know when to recalculate.
+    """
+
+    def __init__(self, value, name=None, borrow=False):
+        self.name = name
+        self.value = None
+        self.version = 0
+        self.set_value(value, borrow)
+
+    def get_value(self, borrow=False, return_internal_type=False):
+        if borrow:
+            return self.value
+        return self.value.copy()
+
+    def set_value(self, value, borrow=False):
+        if isinstance(value, np.matrix):
+            value = np.asarray(value)
+        if borrow:
+            self.value = value
+        else:
+            self.value = value.copy()
+        self.version += 1
+
+
+class NumpyNodenet(TheanoNodenet):
+    """
+    A theano nodenet, calculated with numpy and scipy.sparse
+    """
+
+    @property
+    def engine(self):
+        return "numpy_engine"
+
+    def initialize_backend(self):
+        self.logger.info("Numpy engine configured to use %s", self.floatX)
+
+    def shared(self, value, name, borrow=False):
+        return NumpySharedArray(value, name=name, borrow=borrow)
+
+    def initialize_stepoperators(self):
+        self.initialize_nodespace_activity()
+        self.stepoperators = [NumpyPropagate(self), NumpyCalculate(self)]
+        self.stepoperators.sort(key=lambda op: op.priority)
@@ -0,0 +1,279 @@
+
+import numpy as np
+import scipy.sparse as sp
+
+from micropsi_core.nodenet.stepoperators import Propagate
+from micropsi_core.nodenet.theano_engine.theano_stepoperators import *
+
+
+def fits(buffer, array):
+    """
+    Returns whether the given preallocated array can hold the given array in its first elements
+    """
+    return buffer is not None and len(buffer) >= len(array) and buffer.shape[1:] == array.shape[1:] and \
+        buffer.dtype == array.dtype
+
+
+def get_buffer(buffers, array):
+    """
+    Returns a preallocated array shaped like the given array, that does not hold the given array itself.
+    buffers is the list of preallocated arrays, which holds at most two of them. Arrays of fewer elements, like the
+    live elements of a nodenet, get the first elements of a buffer, so that buffers are only reallocated to grow.
+    """
+    for buffer in buffers:
+        if buffer is not array and array.base is not buffer and fits(buffer, array):
+            return buffer[:len(array)]
+    buffer = np.empty_like(array)
+    buffers[:] = [b for b in buffers if b is array or array.base is b] + [buffer]
+    return buffer
+
+
+class NumpyPropagateFunction(object):
+    """
+        Returns the dot product of weight matrix and activations, in one of two preallocated buffers if the weight
+        matrix is dense. scipy.sparse can not write into a given array.
+    """
+
+    def __init__(self):
+        self.buffers = []
+
+    def __call__(self, w, a):
+        if sp.issparse(w):
+            return w.dot(a)
+        return np.dot(w, a, out=get_buffer(self.buffers, a))
+
+
+class NumpyPropagate(Propagate):
+    """
+        numpy implementation of the Propagate operator.
+
+        Propagates activation from a across w back to a (a is the gate vector and becomes the slot vector)
+
+        every entry in the target vector is the sum of the products of the corresponding input vector
+        and the weight values, i.e. the dot product of weight matrix and activation vector
+
+    """
+
+    propagate_function = None
+
+    def __init__(self, nodenet):
+        self.propagate_function = NumpyPropagateFunction()
+
+    def execute(self, nodenet, nodes, netapi):
+        w = nodenet.w.get_value(borrow=True, return_internal_type=True)
+        a = nodenet.a.get_value(borrow=True, return_internal_type=True)
+        slots = None
+        if nodenet.nodespace_activity is not None:
+            slots = nodenet.nodespace_activity.propagate(nodenet, w, a)
+        if slots is None:
+            slots = self.propagate_function(w, a)
+        nodenet.a.set_value(slots, borrow=True)
+
+
+class NumpyCalculateFunction(object):
+    """
+        Calculates node and gate functions for nodenets with the given features ( see CALCULATE_FEATURES ),
+        taking the same inputs and returning the same activation vector as the compiled theano calculate function.
+        For ensembles, activations and gate parameters are ( elements x members ) matrices, and the selectors are
+        columns.
+
+        Only the parts of the calculation the nodenet uses are run, and all vector operations work in place on
+        preallocated buffers.
+    """
+
+    def __init__(self, features):
+        self.has = dict(zip(CALCULATE_FEATURES, features))
+        self.buffers = []
+        self.scratch = None
+        self.mask = None
+        self.condition = None
+
+    def __call__(self, a, n_node_porlinked, n_node_retlinked, n_function_selector, g_factor, g_function_selector,
+                 g_theta, g_threshold, g_amplification, g_min, g_max):
+
+        if not fits(self.scratch, a):
+            self.scratch = np.empty_like(a)
+            self.mask = np.empty(a.shape, dtype=bool)
+            self.condition = np.empty(a.shape, dtype=bool)
+        scratch = self.scratch[:len(a)]
+        mask = self.mask[:len(a)]
+        condition = self.condition[:len(a)]
+
+        # node functions implemented with identity by default (native modules are calculated by python)
+        nodefunctions = get_buffer(self.buffers, a)
+        np.copyto(nodefunctions, a)
+
+        if self.has['has_pipes']:
+            self.calculate_pipes(a, nodefunctions, n_node_porlinked, n_node_retlinked, n_function_selector)
+
+        # gate logic
+
+        # multiply with gate factor for the node space
+        if self.has['has_directional_activators']:
+            np.multiply(nodefunctions, g_factor, out=nodefunctions)
+
+        # apply actual gate functions
+        gate_function_output = nodefunctions
+
+        # apply GATE_FUNCTION_ABS to masked gates
+        if self.has['has_gatefunction_absolute']:
+            np.equal(g_function_selector, GATE_FUNCTION_ABSOLUTE, out=mask)
+            np.abs(gate_function_output, out=gate_function_output, where=mask)
+        # apply GATE_FUNCTION_SIGMOID to masked gates
+        if self.has['has_gatefunction_sigmoid']:
+            np.add(gate_function_output, g_theta, out=scratch)
+            np.negative(scratch, out=scratch)
+            with np.errstate(over='ignore'):
+                np.exp(scratch, out=scratch)
+            np.add(scratch, 1, out=scratch)
+            np.reciprocal(scratch, out=scratch)
+            np.equal(g_function_selector, GATE_FUNCTION_SIGMOID, out=mask)
+            np.copyto(gate_function_output, scratch, where=mask)
+        # apply GATE_FUNCTION_TANH to masked gates
+        if self.has['has_gatefunction_tanh']:
+            np.subtract(gate_function_output, g_theta, out=scratch)
+            np.tanh(scratch, out=scratch)
+            np.equal(g_function_selector, GATE_FUNCTION_TANH, out=mask)
+            np.copyto(gate_function_output, scratch, where=mask)
+        # apply GATE_FUNCTION_RECT to masked gates
+        if self.has['has_gatefunction_rect']:
+            np.subtract(gate_function_output, g_theta, out=scratch)
+            np.maximum(scratch, 0, out=scratch)
+            np.equal(g_function_selector, GATE_FUNCTION_RECT, out=mask)
+            np.copyto(gate_function_output, scratch, where=mask)
+        # apply GATE_FUNCTION_DIST to masked gates
+        if self.has['has_gatefunction_one_over_x']:
+            np.not_equal(gate_function_output, 0, out=condition)
+            scratch.fill(0)
+            np.divide(1, gate_function_output, out=scratch, where=condition)
+            np.equal(g_function_selector, GATE_FUNCTION_DIST, out=mask)
+            np.copyto(gate_function_output, scratch, where=mask)
+
+        # apply threshold
+        np.greater_equal(gate_function_output, g_threshold, out=condition)
+        np.logical_not(condition, out=condition)
+        np.copyto(gate_function_output, 0, where=condition)
+
+        # apply amplification
+        np.multiply(gate_function_output, g_amplification, out=gate_function_output)
+
+        # apply minimum and maximum, the lower bound taking precedence as with theano's clip
+        np.less(gate_function_output, g_min, out=mask)
+        np.greater(gate_function_output, g_max, out=condition)
+        np.copyto(gate_function_output, g_max, where=condition)
+        np.copyto(gate_function_output, g_min, where=mask)
+
+        return gate_function_output
+
+    def calculate_pipes(self, a, nodefunctions, n_node_porlinked, n_node_retlinked, n_function_selector):
+        """
+        Writes the pipe node functions of all pipe gates into nodefunctions.
+        Every pipe gate only depends on the slots of its own node, which are the seven elements starting at the
+        node's gen element, so the slots are gathered per pipe node instead of shifting the activation vector.
+        The formulas are the ones of the theano graph ( see compile_calculate_function ).
+        """
+        offsets = np.flatnonzero(n_function_selector == NFPG_PIPE_GEN)
+        if len(offsets) == 0:
+            return
+        gen, por, ret, sub, sur, cat, exp = (a[offsets + index] for index in range(7))
+        # the linked flags are set for all elements of a pipe node at once
+        por_linked = n_node_porlinked[offsets] == 1
+        ret_linked = n_node_retlinked[offsets] == 1
+        por_condition = ~por_linked | (por > 0)                 # (if linked, por must be > 0)
+        sub_sur_zero = (sub == 0) & (sur == 0)
+
+        ### gen plumbing
+        pipe_gen_sur_exp = sur + exp                            # sum of sur and exp as default
+        pipe_gen = gen * sub                                    # gen * sub
+        pipe_gen = np.where(abs(pipe_gen) > 0.1, pipe_gen, pipe_gen_sur_exp)  # drop to def. if below 0.1
+        pipe_gen = np.where((por == 0) & por_linked, pipe_gen_sur_exp, pipe_gen)  # drop to def. if por == 0 and por slot is linked
+
+        ### por plumbing
+        pipe_por = (sur + (gen > 0.1)) * (por_condition & (sub > 0))
+        pipe_por += por * sub_sur_zero                          # add por (for search) if sub=sur=0
+
+        ### ret plumbing
+        pipe_ret = -sub * (por >= 0)                            # start with -sub if por >= 0
+        pipe_ret += ret * sub_sur_zero                          # add ret (for search) if sub=sur=0
+
+        ### sub plumbing
+        pipe_sub = (np.clip(sur, 0, 1) + sub + cat) * (por_condition & (gen == 0))
+
+        ### sur plumbing
+        sur_condition = por_condition & (~ret_linked | por_linked) & (ret >= 0)  # and we aren't first in a script
+        pipe_sur = (sur + (gen > 0.2) + exp) * sur_condition
+
+        ### cat plumbing
+        pipe_cat = (np.clip(sur, 0, 1) + sub + cat) * (por_condition & (gen == 0))
+        pipe_cat += cat * sub_sur_zero                          # add cat (for search) if sub=sur=0
+
+        ### exp plumbing
+        pipe_exp = sur + exp
+
+        for index, pipe in enumerate((pipe_gen, pipe_por, pipe_ret, pipe_sub, pipe_sur, pipe_cat, pipe_exp)):
+            nodefunctions[offsets + index] = pipe
+
+
+class NumpyStepManyFunction(object):
+    """
+        Runs propagate and calculate for a number of steps, as the compiled theano step_many function does, taking
+        the STEP_MANY_INPUTS, the weight matrix and the inputs of the calculate function but the gate factors.
+        Returns the activations after the last step and the matrix of data target values.
+    """
+
+    def __init__(self, features):
+        self.propagate_function = NumpyPropagateFunction()
+        self.calculate_function = NumpyCalculateFunction(features)
+
+    def __call__(self, datasource_values, sensor_elements, sensor_columns, actuator_elements, actuator_columns,
+                 number_of_datatargets, allocated_elements_to_activators, w, a, n_node_porlinked, n_node_retlinked,
+                 n_function_selector, g_function_selector, g_theta, g_threshold, g_amplification, g_min, g_max):
+
+        datatarget_values = np.zeros((len(datasource_values), number_of_datatargets), dtype=a.dtype)
+        g_factor = None
+        for step, datasource_row in enumerate(datasource_values):
+            slots = self.propagate_function(w, a)
+            np.add.at(datatarget_values[step], actuator_columns, slots[actuator_elements])
+            slots[sensor_elements] = datasource_row[sensor_columns]
+            if self.calculate_function.has['has_directional_activators']:
+                slots[0] = 1.
+                g_factor = slots[allocated_elements_to_activators]
+            a = self.calculate_function(slots, n_node_porlinked, n_node_retlinked, n_function_selector, g_factor,
+                                        g_function_selector, g_theta, g_threshold, g_amplification, g_min, g_max)
+        return a, datatarget_values
+
+
+class NumpyCalculate(TheanoCalculate):
+    """
+        numpy implementation of the Calculate operator.
+
+        implements node and gate functions with numpy operations, reading sensors, writing actuators and
+        calculating native modules as TheanoCalculate does.
+
+    """
+
+    def compile_theano_functions(self, nodenet):
+        # nothing to compile, but the calculate function depends on the features of the nodenet as well
+        self.calculate_function = NumpyCalculateFunction(get_calculate_features(nodenet))
+        self.step_many_function = None
+
+    def get_element_calculate_function(self):
+        return self.calculate_function
+
+    def calculate_all(self):
+        nodenet = self.nodenet
+        inputs = [getattr(nodenet, name).get_value(borrow=True) for name in CALCULATE_INPUTS]
+        nodenet.a.set_value(self.calculate_function(*inputs), borrow=True)
+
+    def get_ensemble_functions(self, nodenet):
+        return NumpyPropagateFunction(), NumpyCalculateFunction(get_calculate_features(nodenet))
+
+    def step_many(self, inputs):
+        nodenet = self.nodenet
+        if self.step_many_function is None:
+            self.step_many_function = NumpyStepManyFunction(get_calculate_features(nodenet))
+        a, datatarget_values = self.step_many_function(
+            *([inputs[name] for name in STEP_MANY_INPUTS] + [nodenet.w.get_value(borrow=True)] +
+              [getattr(nodenet, name).get_value(borrow=True) for name in CALCULATE_INPUTS if name != 'g_factor']))
+        nodenet.a.set_value(a, borrow=True)
+        return datatarget_values
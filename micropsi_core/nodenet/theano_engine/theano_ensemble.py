@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+"""
+Ensembles of theano nodenets
+
+An ensemble runs a number of copies ( members ) of one nodenet at once. All members share the weight matrix and
+the node and gate functions of the nodenet, but have their own activations, gate parameters, sensor values and
+actuator values. Activations and gate parameters are ( elements x members ) matrices, so that propagation is one
+sparse-dense matrix product for all members, and the calculate graph runs on all members at once.
+
+Ensembles don't run native modules, and don't talk to the world adapter of the nodenet: sensor values are set and
+actuator values are read per member.
+"""
+
+import numpy as np
+
+from micropsi_core.nodenet.theano_engine import theano_node as tnode
+from micropsi_core.nodenet.theano_engine.theano_node import get_numerical_gate_type
+from micropsi_core.nodenet.theano_engine.theano_stepoperators import TheanoCalculate, get_calculate_features
+
+# gate parameters that can be set per member, and the arrays of TheanoNodenet holding them
+GATE_PARAMETERS = {
+    'theta': 'g_theta',
+    'threshold': 'g_threshold',
+    'amplification': 'g_amplification',
+    'minimum': 'g_min',
+    'maximum': 'g_max'
+}
+
+
+class TheanoEnsemble(object):
+    """
+    A number of members calculated with the structure of the given nodenet.
+
+    Attributes:
+        nodenet: the nodenet whose weights and node and gate functions the members share
+        size: the number of members
+        current_step: the number of steps the ensemble ran since it was created or reset
+        a: the ( elements x members ) matrix of activations
+        monitors: the gate activations of all members over time, by ( node uid, gate type ) and step
+    """
+
+    def __init__(self, nodenet, size):
+        if nodenet.native_module_instances:
+            raise ValueError("Ensembles can not run nodenets with native modules")
+        self.nodenet = nodenet
+        self.size = size
+        self.monitors = {}
+        self.features = None
+        self.propagate_function = None
+        self.calculate_function = None
+        self.reset()
+
+    def reset(self):
+        """
+        Sets the activations and gate parameters of all members to the ones of the nodenet
+        """
+        self.current_step = 0
+        self.a = self.broadcast(self.nodenet.a)
+        for name in GATE_PARAMETERS.values():
+            setattr(self, name, self.broadcast(getattr(self.nodenet, name)))
+        self.datasource_values = {}
+        self.datatarget_values = {}
+        for values in self.monitors.values():
+            values.clear()
+
+    def broadcast(self, shared):
+        value = shared.get_value(borrow=True)
+        return np.repeat(value[:, np.newaxis], self.size, axis=1)
+
+    def get_element(self, node_uid, gate_type):
+        node = self.nodenet.get_node(node_uid)
+        return self.nodenet.allocated_node_offsets[tnode.from_id(node_uid)] + get_numerical_gate_type(gate_type, node.nodetype)
+
+    def set_datasource_values(self, datasource, values):
+        """
+        Sets the values of the given data source for all members, read by the sensors bound to it in every step
+        """
+        self.datasource_values[datasource] = np.asarray(values, dtype=self.a.dtype)
+
+    def get_datatarget_values(self, datatarget):
+        """
+        Returns the values the actuators bound to the given data target wrote for all members in the last step
+        """
+        return self.datatarget_values.get(datatarget, np.zeros(self.size, dtype=self.a.dtype))
+
+    def get_gate_activations(self, node_uid, gate_type="gen"):
+        return self.a[self.get_element(node_uid, gate_type)].copy()
+
+    def set_gate_activations(self, node_uid, gate_type, values):
+        self.a[self.get_element(node_uid, gate_type)] = values
+
+    def get_gate_parameter(self, node_uid, gate_type, parameter):
+        return getattr(self, GATE_PARAMETERS[parameter])[self.get_element(node_uid, gate_type)].copy()
+
+    def set_gate_parameter(self, node_uid, gate_type, parameter, values):
+        """
+        Sets the given gate parameter ( theta, threshold, amplification, minimum or maximum ) for all members
+        """
+        getattr(self, GATE_PARAMETERS[parameter])[self.get_element(node_uid, gate_type)] = values
+
+    def add_monitor(self, node_uid, gate_type="gen"):
+        """
+        Records the activations of the given gate for all members in every step
+        """
+        self.monitors.setdefault((node_uid, gate_type), {})
+
+    def get_monitor_values(self, node_uid, gate_type="gen"):
+        return self.monitors[(node_uid, gate_type)]
+
+    def step(self):
+        nodenet = self.nodenet
+        features = get_calculate_features(nodenet)
+        if features != self.features:
+            operators = [operator for operator in nodenet.stepoperators if isinstance(operator, TheanoCalculate)]
+            if not operators:
+                raise ValueError("Ensembles can only run nodenets with a calculate step operator")
+            self.propagate_function, self.calculate_function = operators[0].get_ensemble_functions(nodenet)
+            self.features = features
+
+        w = nodenet.w.get_value(borrow=True, return_internal_type=True)
+        slots = self.propagate_function(w, self.a)
+
+        # sum up the actuators, then set the sensors, as TheanoCalculate does for single nodenets
+        datatargets, positions, elements = nodenet.get_actuator_index()
+        datatarget_values = np.zeros((len(datatargets), self.size), dtype=slots.dtype)
+        np.add.at(datatarget_values, positions, slots[elements])
+        self.datatarget_values = dict(zip(datatargets, datatarget_values))
+
+        datasources, positions, elements = nodenet.get_sensor_index()
+        for position, datasource in enumerate(datasources):
+            if datasource in self.datasource_values:
+                slots[elements[positions == position]] = self.datasource_values[datasource]
+
+        if nodenet.has_directional_activators:
+            slots[0] = 1.
+            g_factor = slots[nodenet.allocated_elements_to_activators]
+        else:
+            # unused by the calculate function, but of the right type
+            g_factor = slots
+
+        def column(name):
+            return getattr(nodenet, name).get_value(borrow=True)[:, np.newaxis]
+
+        self.a = self.calculate_function(
+            slots, column('n_node_porlinked'), column('n_node_retlinked'), column('n_function_selector'), g_factor,
+            column('g_function_selector'), self.g_theta, self.g_threshold, self.g_amplification, self.g_min, self.g_max)
+
+        self.current_step += 1
+        for (node_uid, gate_type), values in self.monitors.items():
+            values[self.current_step] = self.a[self.get_element(node_uid, gate_type)].tolist()
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+
+"""
+Compact storage of the gate parameters of a theano nodenet
+
+Almost all gates of a node net keep the parameters their node type defines as gate defaults. Instead of one full
+vector per gate parameter, GateParameterRows notes for every element the row of its node type and gate in a small
+table of defaults, and every CompactSharedVector only holds the elements whose parameter deviates from the default
+of their row. The vectors are expanded when the step operators ask for them with get_value, and keep the expanded
+values until they change. Saved node nets hold two bytes per element for all gate parameters, instead of five
+floats.
+"""
+
+import numpy as np
+
+# the gate parameters that can be stored compactly: the arrays of TheanoNodenet holding them, the names of the
+# parameters in the gate defaults of node types, and the values for elements that belong to no node
+GATE_PARAMETERS = (
+    ('g_theta', 'theta', 0),
+    ('g_threshold', 'threshold', 0),
+    ('g_amplification', 'amplification', 1),
+    ('g_min', 'minimum', 0),
+    ('g_max', 'maximum', 1))
+
+GATE_PARAMETER_ARRAYS = tuple(attribute for attribute, parameter, value in GATE_PARAMETERS)
+
+
+class GateParameterRows(object):
+    """
+    The table of gate parameter defaults, and the row of every element in that table.
+    Row 0 holds the values for elements that belong to no node, every other row the gate defaults of one gate of
+    one node type, keyed by numerical node type and numerical gate type.
+    """
+
+    def __init__(self, number_of_elements, dtype):
+        self.rows = np.zeros(number_of_elements, dtype=np.int16)
+        self.keys = {}
+        self.defaults = np.array([[value for attribute, parameter, value in GATE_PARAMETERS]], dtype=dtype)
+        self.vectors = []
+
+    def get_keys(self):
+        """
+        Returns the keys of all rows as an array, in the order of the rows
+        """
+        keys = np.zeros((len(self.defaults), 2), dtype=np.int32)
+        for key, row in self.keys.items():
+            keys[row] = key
+        return keys
+
+    def add_rows(self, keys, defaults):
+        """
+        Adds rows with the given defaults for the given keys, for example the ones saved with a node net
+        """
+        for key, row_defaults in zip(keys, defaults):
+            key = (int(key[0]), int(key[1]))
+            if key not in self.keys and key != (0, 0):
+                self.keys[key] = len(self.defaults)
+                self.defaults = np.vstack((self.defaults, np.array(row_defaults, dtype=self.defaults.dtype)))
+
+    def get_row(self, numerical_type, gate, nodetype):
+        """
+        Returns the row for the given gate of the given node type, adding it from the node type's gate defaults
+        if it does not exist yet
+        """
+        key = (int(numerical_type), int(gate))
+        if key not in self.keys:
+            gate_defaults = {}
+            if nodetype is not None and gate < len(nodetype.gatetypes):
+                gate_defaults = nodetype.gate_defaults.get(nodetype.gatetypes[gate], {})
+            self.add_rows([key], [[gate_defaults.get(parameter, value) for attribute, parameter, value in GATE_PARAMETERS]])
+        return self.keys[key]
+
+    def assign(self, offset, numerical_type, nodetype, number_of_elements):
+        """
+        Called whenever a node is created: its elements get the rows of its gates, and no deviating values
+        """
+        for gate in range(number_of_elements):
+            self.rows[offset + gate] = self.get_row(numerical_type, gate, nodetype)
+        for vector in self.vectors:
+            vector.clear(offset, number_of_elements)
+
+    def release(self, offset, number_of_elements):
+        """
+        Called whenever a node is deleted
+        """
+        self.rows[offset:offset + number_of_elements] = 0
+        for vector in self.vectors:
+            vector.clear(offset, number_of_elements)
+
+
+class CompactSharedVector(object):
+    """
+    One gate parameter of all elements, with the get_value / set_value interface of theano shared variables:
+    the defaults of the rows of the elements, and the values of the elements that deviate from them.
+    version counts the changes, so that values derived from the vector know when to recalculate, like the expanded
+    values get_value returns.
+    """
+
+    def __init__(self, rows, attribute, value=None):
+        self.name = attribute
+        self.rows = rows
+        self.column = GATE_PARAMETER_ARRAYS.index(attribute)
+        self.overrides = {}
+        self.version = 0
+        self.value = None
+        self.value_version = None
+        rows.vectors.append(self)
+        if value is not None:
+            self.set_value(value)
+
+    def get_defaults(self):
+        return self.rows.defaults[self.rows.rows, self.column]
+
+    def get_value(self, borrow=False, return_internal_type=False):
+        if self.value_version != self.version:
+            value = self.get_defaults()
+            if len(self.overrides) > 0:
+                elements = np.fromiter(self.overrides.keys(), dtype=np.int64, count=len(self.overrides))
+                value[elements] = np.fromiter(self.overrides.values(), dtype=value.dtype, count=len(self.overrides))
+            self.value = value
+            self.value_version = self.version
+        return self.value if borrow else self.value.copy()
+
+    def set_value(self, value, borrow=False):
+        value = np.asarray(value, dtype=self.rows.defaults.dtype)
+        elements = np.flatnonzero(value != self.get_defaults())
+        self.overrides = dict(zip(elements.tolist(), value[elements].tolist()))
+        self.version += 1
+
+    def get_elements(self, elements):
+        """
+        Returns the values of the given elements, without expanding the vector
+        """
+        elements = np.asarray(elements)
+        value = self.rows.defaults[self.rows.rows[elements], self.column]
+        for position, element in enumerate(elements.tolist()):
+            if element in self.overrides:
+                value[position] = self.overrides[element]
+        return value
+
+    def set_element(self, element, value):
+        """
+        Sets the value of the given element, without expanding the vector
+        """
+        element = int(element)
+        value = self.rows.defaults.dtype.type(value)
+        if value == self.rows.defaults[self.rows.rows[element], self.column]:
+            self.overrides.pop(element, None)
+        else:
+            self.overrides[element] = value.item()
+        self.version += 1
+
+    def clear(self, offset, number_of_elements):
+        for element in range(offset, offset + number_of_elements):
+            self.overrides.pop(element, None)
+        self.version += 1
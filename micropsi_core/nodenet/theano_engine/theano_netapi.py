@@ -12,21 +12,31 @@ class TheanoNetAPI(NetAPI):
         super(TheanoNetAPI, self).__init__(nodenet)
         self.__nodenet = nodenet
 
-    def group_nodes_by_names(self, nodespace=None, node_name_prefix=None):
+    def delete_nodes(self, nodes):
+        """
+        Deletes the given nodes and all links connected to them, clearing the links of all of them at once.
+        """
+        self.__nodenet.delete_nodes([node.uid for node in nodes])
+
+    def group_nodes_by_names(self, nodespace=None, node_name_prefix=None, gate=None, slot=None):
         """
         Will group the given set of nodes.
         Groups can be used in bulk operations.
         Grouped nodes will have stable sorting accross all bulk operations.
+        The group holds the given gate of every node, gen if neither gate nor slot are given, or the given slot.
+        Groups are saved with the node net, and nodes created later with matching names join the group.
         """
-        self.__nodenet.group_nodes_by_names(nodespace, node_name_prefix)
+        self.__nodenet.group_nodes_by_names(nodespace, node_name_prefix, gate, slot)
 
-    def group_nodes_by_ids(self, node_ids, group_name):
+    def group_nodes_by_ids(self, node_ids, group_name, gate=None, slot=None):
         """
         Will group the given set of nodes.
         Groups can be used in bulk operations.
         Grouped nodes will have stable sorting accross all bulk operations.
+        The group holds the given gate of every node, gen if neither gate nor slot are given, or the given slot.
+        Groups are saved with the node net, deleted nodes leave their groups.
         """
-        self.__nodenet.group_nodes_by_ids(node_ids, group_name)
+        self.__nodenet.group_nodes_by_ids(node_ids, group_name, gate, slot)
 
     def ungroup_nodes(self, group):
         """
@@ -34,17 +44,26 @@ class TheanoNetAPI(NetAPI):
         """
         self.__nodenet.ungroup_nodes(group)
 
+    def is_contiguous_group(self, group):
+        """
+        Returns True if the elements of the given group are evenly spaced in the node net, as they are for nodes of
+        the same type that were created one after the other.
+        """
+        return self.__nodenet.is_contiguous_group(group)
+
     def get_activations(self, group):
         """
-        Returns an array of activations for the given group.
+        Returns a read-only array of activations for the given group.
         For multi-gate nodes, the activations of the gen gates will be returned.
+        For contiguous groups, the array is a view of the activations of the node net, that the next step
+        may overwrite: copy it to keep it. Set the activations of the nodes to change them.
         """
         return self.__nodenet.get_activations(group)
 
     def get_thetas(self, group):
         """
-        Returns an array of theta values for the given group.
-        For multi-gate nodes, the thetas of the gen gates will be returned
+        Returns a read-only array of theta values for the given group, like get_activations.
+        For multi-gate nodes, the thetas of the gen gates will be returned. Use set_thetas to change them.
         """
         return self.__nodenet.get_thetas(group)
 
@@ -56,18 +75,49 @@ class TheanoNetAPI(NetAPI):
         """
         self.__nodenet.set_thetas(group, new_thetas)
 
-    def get_link_weights(self, group_from, group_to):
+    def get_link_weights(self, group_from, group_to, sparse=False):
         """
         Returns the weights of links between two groups as a matrix.
         Rows are group_to slots, columns are group_from gates.
         Non-existing links will be returned as 0-entries in the matrix.
+        If sparse is True, a scipy.sparse CSR matrix is returned instead of a dense one.
         """
-        return self.__nodenet.get_link_weights(group_from, group_to)
+        return self.__nodenet.get_link_weights(group_from, group_to, sparse)
 
-    def set_link_weights(self, group_from, group_to, new_w):
+    def set_link_weights(self, group_from, group_to, new_w, existing_only=False):
         """
         Sets the weights of links between two groups from the given matrix new_w.
         Rows are group_to slots, columns are group_from gates.
         Note that setting matrix entries to non-0 values will implicitly create links.
+        If existing_only is True, only the weights of existing links are set, and no links are created.
+        """
+        self.__nodenet.set_link_weights(group_from, group_to, new_w, existing_only)
+
+    def update_link_weights(self, group_from, group_to, update):
+        """
+        Updates the weights of the existing links between two groups in place.
+        update is called with three arrays of the same length: the current weights of the links, and their
+        rows ( positions in group_to ) and columns ( positions in group_from ). It returns the new weights.
+        """
+        self.__nodenet.update_link_weights(group_from, group_to, update)
+
+    def learn_hebbian(self, group_from, group_to, rate=1):
+        """
+        Hebbian learning on the existing links between two groups:
+        every weight grows by rate * activation of the group_to node * activation of the group_from node
+        """
+        self.__nodenet.learn_hebbian(group_from, group_to, rate)
+
+    def learn_delta(self, group_from, group_to, targets, rate=1):
+        """
+        Delta rule learning on the existing links between two groups:
+        every weight grows by rate * (target - activation of the group_to node) * activation of the group_from node
+        targets dimensionality has to match the length of group_to
+        """
+        self.__nodenet.learn_delta(group_from, group_to, targets, rate)
+
+    def decay_link_weights(self, group_from, group_to, rate):
+        """
+        Weight decay on the existing links between two groups: every weight is multiplied by (1 - rate)
         """
-        self.__nodenet.set_link_weights(group_from, group_to, new_w)
\ No newline at end of file
+        self.__nodenet.decay_link_weights(group_from, group_to, rate)
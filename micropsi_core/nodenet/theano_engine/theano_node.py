@@ -237,6 +237,9 @@ class TheanoNode(Node):
 
     parameters = None
 
+    # position of the first element of a native module in the native module index of the nodenet
+    native_module_position = None
+
     def __init__(self, nodenet, parent_uid, uid, type, parameters={}, **_):
 
         self._numerictype = type
@@ -245,8 +248,6 @@ class TheanoNode(Node):
         Node.__init__(self, strtype, nodenet.get_nodetype(strtype))
 
         if strtype in nodenet.native_modules:
-            self.slot_activation_snapshot = {}
-
             if parameters is not None:
                 self.parameters = parameters.copy()
             else:
@@ -290,6 +291,8 @@ class TheanoNode(Node):
                 del self._nodenet.names[self.uid]
         else:
             self._nodenet.names[self.uid] = name
+        self._nodenet.invalidate_name_index()
+        self._nodenet.update_nodegroups([self.uid])
 
     @property
     def parent_nodespace(self):
@@ -298,10 +301,12 @@ class TheanoNode(Node):
     @parent_nodespace.setter
     def parent_nodespace(self, uid):
         self._nodenet.allocated_node_parents[self._id] = nodespace.from_id(uid)
+        self._nodenet.invalidate_nodespace_elements()
+        self._nodenet.update_nodegroups([self.uid])
 
     @property
     def activation(self):
-        return float(self._nodenet.a.get_value(borrow=True)[self._nodenet.allocated_node_offsets[self._id] + GEN])
+        return self.get_gate_activation(GEN)
 
     @property
     def activations(self):
@@ -309,10 +314,31 @@ class TheanoNode(Node):
 
     @activation.setter
     def activation(self, activation):
-        a_array = self._nodenet.a.get_value(borrow=True)
-        a_array[self._nodenet.allocated_node_offsets[self._id] + GEN] = activation
+        self.set_gate_activation(GEN, activation)
+
+    def get_gate_activation(self, numerictype):
+        gate_activations = self._nodenet.native_module_gate_activations
+        if gate_activations is not None and self.native_module_position is not None:
+            # native module node functions are running, their gates are written back once all are done
+            return float(gate_activations[self.native_module_position + numerictype])
+        return float(self._nodenet.a.get_value(borrow=True)[self._nodenet.allocated_node_offsets[self._id] + numerictype])
+
+    def set_gate_activation(self, numerictype, activation):
+        gate_activations = self._nodenet.native_module_gate_activations
+        if gate_activations is not None and self.native_module_position is not None:
+            gate_activations[self.native_module_position + numerictype] = activation
+            return
+        a_array = self._nodenet.a.get_value(borrow=True, return_internal_type=True)
+        a_array[self._nodenet.allocated_node_offsets[self._id] + numerictype] = activation
         self._nodenet.a.set_value(a_array, borrow=True)
 
+    def get_slot_activation(self, numerictype):
+        slot_activations = self._nodenet.native_module_slot_activations
+        if slot_activations is not None and self.native_module_position is not None:
+            return float(slot_activations[self.native_module_position + numerictype])
+        # no snapshot has been taken for this node yet
+        return self.get_gate_activation(numerictype)
+
     def get_gate(self, type):
         return TheanoGate(type, self, self._nodenet)
 
@@ -349,58 +375,50 @@ class TheanoNode(Node):
         # todo: implement the other gate parameters
         elementindex = self._nodenet.allocated_node_offsets[self._id] + get_numerical_gate_type(gate_type, self.nodetype)
         if parameter == 'threshold':
-            g_threshold_array = self._nodenet.g_threshold.get_value(borrow=True)
-            g_threshold_array[elementindex] = value
-            self._nodenet.g_threshold.set_value(g_threshold_array, borrow=True)
+            self._nodenet.set_gate_parameter_value('g_threshold', elementindex, value)
         elif parameter == 'amplification':
-            g_amplification_array = self._nodenet.g_amplification.get_value(borrow=True)
-            g_amplification_array[elementindex] = value
-            self._nodenet.g_amplification.set_value(g_amplification_array, borrow=True)
+            self._nodenet.set_gate_parameter_value('g_amplification', elementindex, value)
         elif parameter == 'minimum':
-            g_min_array = self._nodenet.g_min.get_value(borrow=True)
-            g_min_array[elementindex] = value
-            self._nodenet.g_min.set_value(g_min_array, borrow=True)
+            self._nodenet.set_gate_parameter_value('g_min', elementindex, value)
         elif parameter == 'maximum':
-            g_max_array = self._nodenet.g_max.get_value(borrow=True)
-            g_max_array[elementindex] = value
-            self._nodenet.g_max.set_value(g_max_array, borrow=True)
+            self._nodenet.set_gate_parameter_value('g_max', elementindex, value)
         elif parameter == 'theta':
-            g_theta_array = self._nodenet.g_theta.get_value(borrow=True)
-            g_theta_array[elementindex] = value
-            self._nodenet.g_theta.set_value(g_theta_array, borrow=True)
+            self._nodenet.set_gate_parameter_value('g_theta', elementindex, value)
 
     def get_gate_parameters(self):
-        g_threshold_array = self._nodenet.g_threshold.get_value(borrow=True)
-        g_amplification_array = self._nodenet.g_amplification.get_value(borrow=True)
-        g_min_array = self._nodenet.g_min.get_value(borrow=True)
-        g_max_array = self._nodenet.g_max.get_value(borrow=True)
-        g_theta = self._nodenet.g_theta.get_value(borrow=True)
-
         result = {}
         number_of_gates = get_elements_per_type(self._numerictype, self._nodenet.native_modules)
         if self._numerictype == ACTIVATOR:
             number_of_gates = 0
+
+        elements = self._nodenet.allocated_node_offsets[self._id] + np.arange(number_of_gates)
+        g_threshold_array = self._nodenet.get_gate_parameter_values('g_threshold', elements)
+        g_amplification_array = self._nodenet.get_gate_parameter_values('g_amplification', elements)
+        g_min_array = self._nodenet.get_gate_parameter_values('g_min', elements)
+        g_max_array = self._nodenet.get_gate_parameter_values('g_max', elements)
+        g_theta = self._nodenet.get_gate_parameter_values('g_theta', elements)
+
         for numericalgate in range(0, number_of_gates):
             gate_type = get_string_gate_type(numericalgate, self.nodetype)
             gate_parameters = {}
 
-            threshold = g_threshold_array[self._nodenet.allocated_node_offsets[self._id] + numericalgate].item()
+            threshold = g_threshold_array[numericalgate].item()
             if 'threshold' not in self.nodetype.gate_defaults[gate_type] or threshold != self.nodetype.gate_defaults[gate_type]['threshold']:
                 gate_parameters['threshold'] = threshold
 
-            amplification = g_amplification_array[self._nodenet.allocated_node_offsets[self._id] + numericalgate].item()
+            amplification = g_amplification_array[numericalgate].item()
             if 'amplification' not in self.nodetype.gate_defaults[gate_type] or amplification != self.nodetype.gate_defaults[gate_type]['amplification']:
                 gate_parameters['amplification'] = amplification
 
-            minimum = g_min_array[self._nodenet.allocated_node_offsets[self._id] + numericalgate].item()
+            minimum = g_min_array[numericalgate].item()
             if 'minimum' not in self.nodetype.gate_defaults[gate_type] or minimum != self.nodetype.gate_defaults[gate_type]['minimum']:
                 gate_parameters['minimum'] = minimum
 
-            maximum = g_max_array[self._nodenet.allocated_node_offsets[self._id] + numericalgate].item()
+            maximum = g_max_array[numericalgate].item()
             if 'maximum' not in self.nodetype.gate_defaults[gate_type] or maximum != self.nodetype.gate_defaults[gate_type]['maximum']:
                 gate_parameters['maximum'] = maximum
 
-            theta = g_theta[self._nodenet.allocated_node_offsets[self._id] + numericalgate].item()
+            theta = g_theta[numericalgate].item()
             if 'theta' not in self.nodetype.gate_defaults[gate_type] or theta != self.nodetype.gate_defaults[gate_type]['theta']:
                 gate_parameters['theta'] = theta
 
@@ -413,27 +431,11 @@ class TheanoNode(Node):
     def clone_non_default_gate_parameters(self, gate_type):
         return self.get_gate_parameters()
 
-    def take_slot_activation_snapshot(self):
-        a_array = self._nodenet.a.get_value(borrow=True, return_internal_type=True)
-        self.slot_activation_snapshot.clear()
-        for slottype in self.nodetype.slottypes:
-            self.slot_activation_snapshot[slottype] =  \
-                a_array[self._nodenet.allocated_node_offsets[self._id] + get_numerical_slot_type(slottype, self.nodetype)]
-
     def get_slot(self, type):
         return TheanoSlot(type, self, self._nodenet)
 
     def unlink_completely(self):
-
-        # there's a simpler implementation for this that just clears the
-        # node's row and column in the weight matrix. Probably depends on the matrix implementation
-        # whether that's actually faster.
-
-        links = self.get_associated_links()
-        for slottype in self.nodetype.slottypes:
-            links.extend(self.get_slot(slottype).get_links())
-        for link in links:
-            self._nodenet.delete_link(link.source_node.uid, link.source_gate.type, link.target_node.uid, link.target_slot.type)
+        self._nodenet.unlink_nodes([self._id])
 
     def get_parameter(self, parameter):
         if self.type == "Sensor" and parameter == "datasource":
@@ -454,6 +456,7 @@ class TheanoNode(Node):
             connectedsensors.append(self._id)
             self._nodenet.sensormap[value] = connectedsensors
             self._nodenet.inverted_sensor_map[self.uid] = value
+            self._nodenet.invalidate_binding_indices()
         elif self.type == "Actor" and parameter == "datatarget":
             if self.uid in self._nodenet.inverted_actuator_map:
                 olddatatarget = self._nodenet.inverted_actuator_map[self.uid]     # first, clear old data target association
@@ -464,6 +467,7 @@ class TheanoNode(Node):
             connectedactuators.append(self._id)
             self._nodenet.actuatormap[value] = connectedactuators
             self._nodenet.inverted_actuator_map[self.uid] = value
+            self._nodenet.invalidate_binding_indices()
         elif self.type == "Activator" and parameter == "type":
             self._nodenet.set_nodespace_gatetype_activator(self.parent_nodespace, value, self.uid)
         elif self.type in self._nodenet.native_modules:
@@ -548,13 +552,11 @@ class TheanoGate(Gate):
 
     @property
     def activation(self):
-        return float(self.__nodenet.a.get_value(borrow=True)[self.__nodenet.allocated_node_offsets[from_id(self.__node.uid)] + self.__numerictype])
+        return self.__node.get_gate_activation(self.__numerictype)
 
     @activation.setter
     def activation(self, value):
-        a_array = self.__nodenet.a.get_value(borrow=True, return_internal_type=True)
-        a_array[self.__nodenet.allocated_node_offsets[from_id(self.__node.uid)] + self.__numerictype] = value
-        self.__nodenet.a.set_value(a_array, borrow=True)
+        self.__node.set_gate_activation(self.__numerictype, value)
 
     @property
     def activations(self):
@@ -626,7 +628,7 @@ class TheanoSlot(Slot):
 
     @property
     def activation(self):
-        return self.__node.slot_activation_snapshot[self.__type]
+        return self.__node.get_slot_activation(self.__numerictype)
 
     @property
     def activations(self):
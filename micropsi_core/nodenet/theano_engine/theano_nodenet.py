@@ -5,15 +5,21 @@ Nodenet definition
 """
 import json
 import os
+import bisect
 import copy
 import warnings
 
-import theano
-from theano import tensor as T
 import numpy as np
 import scipy.sparse as sp
 import scipy
 
+try:
+    import theano
+    from theano import tensor as T
+except ImportError:
+    # the numpy_engine shares the data layout of this engine, and runs without theano
+    theano = None
+
 from micropsi_core.nodenet import monitor
 from micropsi_core.nodenet.nodenet import Nodenet
 from micropsi_core.nodenet.node import Nodetype
@@ -24,10 +30,29 @@ from micropsi_core.nodenet.theano_engine.theano_node import *
 from micropsi_core.nodenet.theano_engine.theano_stepoperators import *
 from micropsi_core.nodenet.theano_engine.theano_nodespace import *
 from micropsi_core.nodenet.theano_engine.theano_netapi import TheanoNetAPI
+from micropsi_core.nodenet.theano_engine.theano_ensemble import TheanoEnsemble
+from micropsi_core.nodenet.theano_engine.theano_gateparameters import GateParameterRows, CompactSharedVector, GATE_PARAMETER_ARRAYS
 
 from configuration import config as settings
 
 
+class VersionedSharedVariable(object):
+    """
+    Mixed into the types of the theano shared variables of TheanoNodenet: version counts the calls of set_value,
+    as it does for the arrays of the numpy engine, so that values derived from a variable know when to recalculate.
+    Compiled functions that update a variable don't change its version.
+    """
+
+    version = 0
+
+    def set_value(self, new_value, borrow=False):
+        super(VersionedSharedVariable, self).set_value(new_value, borrow=borrow)
+        self.version += 1
+
+# the versioned subclasses of the theano shared variable types, by type
+versioned_shared_types = {}
+
+
 STANDARD_NODETYPES = {
     "Nodespace": {
         "name": "Nodespace"
@@ -119,6 +144,21 @@ DEFAULT_NUMBER_OF_NODES = 2000
 DEFAULT_NUMBER_OF_ELEMENTS = DEFAULT_NUMBER_OF_NODES * AVERAGE_ELEMENTS_PER_NODE_ASSUMPTION
 DEFAULT_NUMBER_OF_NODESPACES = 100
 
+
+def precompile_step_functions(background=True):
+    """
+    Compiles the theano step functions for all features, with the configured precision, weight matrix and gate
+    parameter storage, so that nodenets don't have to wait for the compilation when they start using a feature.
+    """
+    T.config.floatX = "float32" if settings['theano']['precision'] == "32" else "float64"
+    sparse = settings['theano']['sparse_weight_matrix'] != "False"
+    inputs = ()
+    if settings.has_option('theano', 'compact_gate_parameters') and \
+            settings['theano']['compact_gate_parameters'] == "True":
+        inputs = tuple(name for name in CALCULATE_INPUTS if name in GATE_PARAMETER_ARRAYS)
+    return precompile_theano_functions(sparse, T.config.floatX, inputs, background)
+
+
 class TheanoNodenet(Nodenet):
     """
         theano runtime engine implementation
@@ -175,11 +215,35 @@ class TheanoNodenet(Nodenet):
     # map of numerical node IDs to data targets
     inverted_actuator_map = {}
 
+    # index arrays of the sensors and actuators, built from sensormap and actuatormap when needed,
+    # see get_sensor_index and get_actuator_index
+    __sensor_index = None
+    __actuator_index = None
+
+    # element index of the native module instances, built when needed, see get_native_module_index
+    __native_module_index = None
+    __native_module_index_valid = False
+
+    # the dormant nodespaces the step operators skip, see initialize_nodespace_activity
+    nodespace_activity = None
+
+    # nodespaces of all elements and elements of all nodespaces, built when needed, see get_nodespace_elements
+    __nodespace_elements = None
+    # counts the changes of the nodespace elements, for caches built from them
+    nodespace_elements_version = 0
+
+    # sorted list of ( name, uid ) tuples of all named nodes, built when needed, see get_name_index
+    __name_index = None
+
+    # slot activations of all native module instances, taken before every calculation
+    native_module_slot_activations = None
+
+    # gate activations of all native module instances while their node functions are running, or None
+    native_module_gate_activations = None
+
     # theano tensors for performing operations
     w = None            # matrix of weights
     a = None            # vector of activations
-    a_shifted = None    # matrix with each row defined as [a[n], a[n+1], a[n+2], a[n+3], a[n+4], a[n+5], a[n+6]]
-                        # this is a view on the activation values instrumental in calculating concept node functions
 
     g_factor = None     # vector of gate factors, controlled by directional activators
     g_threshold = None  # vector of thresholds (gate parameters)
@@ -322,28 +386,23 @@ class TheanoNodenet(Nodenet):
 
         precision = settings['theano']['precision']
         if precision == "32":
-            T.config.floatX = "float32"
+            self.floatX = "float32"
             scipyfloatX = scipy.float32
             numpyfloatX = np.float32
             self.byte_per_float = 4
         elif precision == "64":
-            T.config.floatX = "float64"
+            self.floatX = "float64"
             scipyfloatX = scipy.float64
             numpyfloatX = np.float64
             self.byte_per_float = 8
         else:
             self.logger.warn("Unsupported precision value from configuration: %s, falling back to float64", precision)
-            T.config.floatX = "float64"
+            self.floatX = "float64"
             scipyfloatX = scipy.float64
             numpyfloatX = np.float64
             self.byte_per_float = 8
 
-        device = T.config.device
-        self.logger.info("Theano configured to use %s", device)
-        if device.startswith("gpu"):
-            self.logger.info("Using CUDA with cuda_root=%s and theano_flags=%s", os.environ["CUDA_ROOT"], os.environ["THEANO_FLAGS"])
-            if T.config.floatX != "float32":
-                self.logger.warn("Precision set to %s, but attempting to use gpu.", precision)
+        self.initialize_backend()
 
         self.netapi = TheanoNetAPI(self)
 
@@ -370,46 +429,48 @@ class TheanoNodenet(Nodenet):
         self.allocated_nodespaces_exp_activators = np.zeros(self.NoNS, dtype=np.int32)
 
         if self.sparse:
-            self.w = theano.shared(sp.csr_matrix((self.NoE, self.NoE), dtype=scipyfloatX), name="w")
+            self.w = self.shared(sp.csr_matrix((self.NoE, self.NoE), dtype=scipyfloatX), name="w")
         else:
             w_matrix = np.zeros((self.NoE, self.NoE), dtype=scipyfloatX)
-            self.w = theano.shared(value=w_matrix.astype(T.config.floatX), name="w", borrow=True)
+            self.w = self.shared(value=w_matrix.astype(self.floatX), name="w", borrow=True)
 
         a_array = np.zeros(self.NoE, dtype=numpyfloatX)
-        self.a = theano.shared(value=a_array.astype(T.config.floatX), name="a", borrow=True)
+        self.a = self.shared(value=a_array.astype(self.floatX), name="a", borrow=True)
 
-        a_shifted_matrix = np.lib.stride_tricks.as_strided(a_array, shape=(self.NoE, 7), strides=(self.byte_per_float, self.byte_per_float))
-        self.a_shifted = theano.shared(value=a_shifted_matrix.astype(T.config.floatX), name="a_shifted", borrow=True)
+        self.gate_parameter_rows = None
+        if settings.has_option('theano', 'compact_gate_parameters') and \
+                settings['theano']['compact_gate_parameters'] == "True":
+            self.gate_parameter_rows = GateParameterRows(self.NoE, self.floatX)
 
         g_theta_array = np.zeros(self.NoE, dtype=numpyfloatX)
-        self.g_theta = theano.shared(value=g_theta_array.astype(T.config.floatX), name="theta", borrow=True)
+        self.g_theta = self.shared_gate_parameter("g_theta", g_theta_array, name="theta")
 
         g_factor_array = np.ones(self.NoE, dtype=numpyfloatX)
-        self.g_factor = theano.shared(value=g_factor_array.astype(T.config.floatX), name="g_factor", borrow=True)
+        self.g_factor = self.shared(value=g_factor_array.astype(self.floatX), name="g_factor", borrow=True)
 
         g_threshold_array = np.zeros(self.NoE, dtype=numpyfloatX)
-        self.g_threshold = theano.shared(value=g_threshold_array.astype(T.config.floatX), name="g_threshold", borrow=True)
+        self.g_threshold = self.shared_gate_parameter("g_threshold", g_threshold_array, name="g_threshold")
 
         g_amplification_array = np.ones(self.NoE, dtype=numpyfloatX)
-        self.g_amplification = theano.shared(value=g_amplification_array.astype(T.config.floatX), name="g_amplification", borrow=True)
+        self.g_amplification = self.shared_gate_parameter("g_amplification", g_amplification_array, name="g_amplification")
 
         g_min_array = np.zeros(self.NoE, dtype=numpyfloatX)
-        self.g_min = theano.shared(value=g_min_array.astype(T.config.floatX), name="g_min", borrow=True)
+        self.g_min = self.shared_gate_parameter("g_min", g_min_array, name="g_min")
 
         g_max_array = np.ones(self.NoE, dtype=numpyfloatX)
-        self.g_max = theano.shared(value=g_max_array.astype(T.config.floatX), name="g_max", borrow=True)
+        self.g_max = self.shared_gate_parameter("g_max", g_max_array, name="g_max")
 
         g_function_selector_array = np.zeros(self.NoE, dtype=np.int8)
-        self.g_function_selector = theano.shared(value=g_function_selector_array, name="gatefunction", borrow=True)
+        self.g_function_selector = self.shared(value=g_function_selector_array, name="gatefunction", borrow=True)
 
         n_function_selector_array = np.zeros(self.NoE, dtype=np.int8)
-        self.n_function_selector = theano.shared(value=n_function_selector_array, name="nodefunction_per_gate", borrow=True)
+        self.n_function_selector = self.shared(value=n_function_selector_array, name="nodefunction_per_gate", borrow=True)
 
         n_node_porlinked_array = np.zeros(self.NoE, dtype=np.int8)
-        self.n_node_porlinked = theano.shared(value=n_node_porlinked_array, name="porlinked", borrow=True)
+        self.n_node_porlinked = self.shared(value=n_node_porlinked_array, name="porlinked", borrow=True)
 
         n_node_retlinked_array = np.zeros(self.NoE, dtype=np.int8)
-        self.n_node_retlinked = theano.shared(value=n_node_retlinked_array, name="retlinked", borrow=True)
+        self.n_node_retlinked = self.shared(value=n_node_retlinked_array, name="retlinked", borrow=True)
 
         self.initialize_stepoperators()
 
@@ -420,17 +481,101 @@ class TheanoNodenet(Nodenet):
         self.native_modules = {}
         for type, data in native_modules.items():
             self.native_modules[type] = Nodetype(nodenet=self, **data)
-
+        self.native_module_instances = {}
+        # names decide group membership, and must not be shared with other nodenets through the class
+        self.names = {}
+        self.positions = {}
+
+        # definitions of the node groups, by group name, see group_nodes_by_ids
+        self.nodegroup_definitions = {}
+        # elements of the node groups, and slices for the groups whose elements are evenly spaced, by group name
         self.nodegroups = {}
+        self.nodegroup_slices = {}
 
         self.create_nodespace(None, None, "Root", tnodespace.to_id(1))
 
         self.initialize_nodenet({})
 
+    def initialize_backend(self):
+        T.config.floatX = self.floatX
+        device = T.config.device
+        self.logger.info("Theano configured to use %s", device)
+        if device.startswith("gpu"):
+            self.logger.info("Using CUDA with cuda_root=%s and theano_flags=%s", os.environ["CUDA_ROOT"], os.environ["THEANO_FLAGS"])
+            if T.config.floatX != "float32":
+                self.logger.warn("Precision set to %s, but attempting to use gpu.", T.config.floatX)
+
+    def shared(self, value, name, borrow=False):
+        """
+        Returns a variable holding the given array, that the step operators can read and write
+        """
+        variable = theano.shared(value=value, name=name, borrow=borrow)
+        variable_type = type(variable)
+        if variable_type not in versioned_shared_types:
+            versioned_shared_types[variable_type] = type("Versioned" + variable_type.__name__,
+                                                         (VersionedSharedVariable, variable_type), {})
+        return versioned_shared_types[variable_type](name=name, type=variable.type, value=None, strict=None,
+                                                     container=variable.container)
+
+    def shared_gate_parameter(self, attribute, value, name):
+        """
+        Returns a variable holding the given gate parameter array, stored compactly if configured
+        """
+        if self.gate_parameter_rows is not None:
+            return CompactSharedVector(self.gate_parameter_rows, attribute, value)
+        return self.shared(value=value.astype(self.floatX), name=name, borrow=True)
+
+    def build_gate_parameter_rows(self, keys=None, defaults=None):
+        """
+        Returns the rows of all elements in the table of gate parameter defaults, starting with the given rows
+        """
+        rows = GateParameterRows(self.NoE, self.floatX)
+        if keys is not None:
+            rows.add_rows(keys, defaults)
+        for numerical_type in np.unique(self.allocated_nodes[self.allocated_nodes != 0]):
+            offsets = self.allocated_node_offsets[self.allocated_nodes == numerical_type]
+            nodetype = self.get_nodetype(get_string_node_type(numerical_type, self.native_modules))
+            for gate in range(get_elements_per_type(numerical_type, self.native_modules)):
+                rows.rows[offsets + gate] = rows.get_row(numerical_type, gate, nodetype)
+        return rows
+
+    def get_gate_parameter_values(self, attribute, elements):
+        """
+        Returns the values of the given gate parameter array for the given elements
+        """
+        if self.gate_parameter_rows is not None:
+            return getattr(self, attribute).get_elements(elements)
+        return getattr(self, attribute).get_value(borrow=True)[elements]
+
+    def set_gate_parameter_value(self, attribute, element, value):
+        """
+        Sets the value of the given gate parameter array for the given element
+        """
+        if self.gate_parameter_rows is not None:
+            getattr(self, attribute).set_element(element, value)
+        else:
+            array = getattr(self, attribute).get_value(borrow=True)
+            array[element] = value
+            getattr(self, attribute).set_value(array, borrow=True)
+
     def initialize_stepoperators(self):
+        self.initialize_nodespace_activity()
         self.stepoperators = [TheanoPropagate(self), TheanoCalculate(self)]
         self.stepoperators.sort(key=lambda op: op.priority)
 
+    def initialize_nodespace_activity(self):
+        """
+        Sets up the tracking of dormant nodespaces, that the step operators skip, if configured.
+        Nodenets on the gpu always calculate all nodespaces.
+        """
+        self.nodespace_activity = None
+        if settings.has_option('theano', 'skip_dormant_nodespaces') and \
+                settings['theano']['skip_dormant_nodespaces'] != "True":
+            return
+        if theano is not None and self.engine == "theano_engine" and not T.config.device.startswith("cpu"):
+            return
+        self.nodespace_activity = NodespaceActivity()
+
     def save(self, filename):
 
         # write json metadata, which will be used by runtime to manage the net
@@ -440,6 +585,7 @@ class TheanoNodenet(Nodenet):
             metadata['names'] = self.names
             metadata['actuatormap'] = self.actuatormap
             metadata['sensormap'] = self.sensormap
+            metadata['nodegroups'] = self.nodegroup_definitions
             fp.write(json.dumps(metadata, sort_keys=True, indent=4))
 
         # write bulk data to our own numpy-based file format
@@ -467,12 +613,7 @@ class TheanoNodenet(Nodenet):
             w = sp.csr_matrix(w)
 
         a = self.a.get_value(borrow=True)
-        g_theta = self.g_theta.get_value(borrow=True)
         g_factor = self.g_factor.get_value(borrow=True)
-        g_threshold = self.g_threshold.get_value(borrow=True)
-        g_amplification = self.g_amplification.get_value(borrow=True)
-        g_min = self.g_min.get_value(borrow=True)
-        g_max = self.g_max.get_value(borrow=True)
         g_function_selector = self.g_function_selector.get_value(borrow=True)
         n_function_selector = self.n_function_selector.get_value(borrow=True)
         n_node_porlinked = self.n_node_porlinked.get_value(borrow=True)
@@ -480,6 +621,23 @@ class TheanoNodenet(Nodenet):
 
         sizeinformation = [self.NoN, self.NoE, self.NoNS]
 
+        # gate parameters are saved as full arrays, or if stored compactly, as a table of defaults per node type
+        # and gate, and the deviating values
+        gate_parameter_rows = self.gate_parameter_rows
+        if gate_parameter_rows is None:
+            gate_parameters = dict((attribute, getattr(self, attribute).get_value(borrow=True))
+                                   for attribute in GATE_PARAMETER_ARRAYS)
+        else:
+            gate_parameters = {
+                'g_parameter_keys': gate_parameter_rows.get_keys(),
+                'g_parameter_defaults': gate_parameter_rows.defaults
+            }
+            for column, attribute in enumerate(GATE_PARAMETER_ARRAYS):
+                value = getattr(self, attribute).get_value(borrow=True)
+                elements = np.flatnonzero(value != gate_parameter_rows.defaults[gate_parameter_rows.rows, column])
+                gate_parameters[attribute + '_elements'] = elements.astype(np.int32)
+                gate_parameters[attribute + '_values'] = value[elements]
+
         np.savez(datafilename,
                  allocated_nodes=allocated_nodes,
                  allocated_node_offsets=allocated_node_offsets,
@@ -490,12 +648,7 @@ class TheanoNodenet(Nodenet):
                  w_indices=w.indices,
                  w_indptr=w.indptr,
                  a=a,
-                 g_theta=g_theta,
                  g_factor=g_factor,
-                 g_threshold=g_threshold,
-                 g_amplification=g_amplification,
-                 g_min=g_min,
-                 g_max=g_max,
                  g_function_selector=g_function_selector,
                  n_function_selector=n_function_selector,
                  n_node_porlinked=n_node_porlinked,
@@ -507,7 +660,8 @@ class TheanoNodenet(Nodenet):
                  allocated_nodespaces_sub_activators=allocated_nodespaces_sub_activators,
                  allocated_nodespaces_sur_activators=allocated_nodespaces_sur_activators,
                  allocated_nodespaces_cat_activators=allocated_nodespaces_cat_activators,
-                 allocated_nodespaces_exp_activators=allocated_nodespaces_exp_activators)
+                 allocated_nodespaces_exp_activators=allocated_nodespaces_exp_activators,
+                 **gate_parameters)
 
     def load(self, filename):
         """Load the node net from a file"""
@@ -619,59 +773,36 @@ class TheanoNodenet(Nodenet):
                     # if we're configured to be dense, convert from csr
                     if not self.sparse:
                         w = w.todense()
-                    self.w = theano.shared(value=w.astype(T.config.floatX), name="w", borrow=False)
-                    self.a = theano.shared(value=datafile['a'].astype(T.config.floatX), name="a", borrow=False)
+                    self.w = self.shared(value=w.astype(self.floatX), name="w", borrow=False)
+                    self.a = self.shared(value=datafile['a'].astype(self.floatX), name="a", borrow=False)
                 else:
                     self.logger.warn("no w_data, w_indices or w_indptr in file, falling back to defaults")
 
-                if 'g_theta' in datafile:
-                    self.g_theta = theano.shared(value=datafile['g_theta'].astype(T.config.floatX), name="theta", borrow=False)
-                else:
-                    self.logger.warn("no g_theta in file, falling back to defaults")
-
                 if 'g_factor' in datafile:
-                    self.g_factor = theano.shared(value=datafile['g_factor'].astype(T.config.floatX), name="g_factor", borrow=False)
+                    self.g_factor = self.shared(value=datafile['g_factor'].astype(self.floatX), name="g_factor", borrow=False)
                 else:
                     self.logger.warn("no g_factor in file, falling back to defaults")
 
-                if 'g_threshold' in datafile:
-                    self.g_threshold = theano.shared(value=datafile['g_threshold'].astype(T.config.floatX), name="g_threshold", borrow=False)
-                else:
-                    self.logger.warn("no g_threshold in file, falling back to defaults")
-
-                if 'g_amplification' in datafile:
-                    self.g_amplification = theano.shared(value=datafile['g_amplification'].astype(T.config.floatX), name="g_amplification", borrow=False)
-                else:
-                    self.logger.warn("no g_amplification in file, falling back to defaults")
-
-                if 'g_min' in datafile:
-                    self.g_min = theano.shared(value=datafile['g_min'].astype(T.config.floatX), name="g_min", borrow=False)
-                else:
-                    self.logger.warn("no g_min in file, falling back to defaults")
-
-                if 'g_max' in datafile:
-                    self.g_max = theano.shared(value=datafile['g_max'].astype(T.config.floatX), name="g_max", borrow=False)
-                else:
-                    self.logger.warn("no g_max in file, falling back to defaults")
+                self.load_gate_parameters(datafile)
 
                 if 'g_function_selector' in datafile:
-                    self.g_function_selector = theano.shared(value=datafile['g_function_selector'], name="gatefunction", borrow=False)
+                    self.g_function_selector = self.shared(value=datafile['g_function_selector'], name="gatefunction", borrow=False)
                 else:
                     self.logger.warn("no g_function_selector in file, falling back to defaults")
 
                 if 'n_function_selector' in datafile:
-                    self.n_function_selector = theano.shared(value=datafile['n_function_selector'], name="nodefunction_per_gate", borrow=False)
+                    self.n_function_selector = self.shared(value=datafile['n_function_selector'], name="nodefunction_per_gate", borrow=False)
                 else:
                     self.logger.warn("no n_function_selector in file, falling back to defaults")
 
 
                 if 'n_node_porlinked' in datafile:
-                    self.n_node_porlinked = theano.shared(value=datafile['n_node_porlinked'], name="porlinked", borrow=False)
+                    self.n_node_porlinked = self.shared(value=datafile['n_node_porlinked'], name="porlinked", borrow=False)
                 else:
                     self.logger.warn("no n_node_porlinked in file, falling back to defaults")
 
                 if 'n_node_retlinked' in datafile:
-                    self.n_node_retlinked = theano.shared(value=datafile['n_node_retlinked'], name="retlinked", borrow=False)
+                    self.n_node_retlinked = self.shared(value=datafile['n_node_retlinked'], name="retlinked", borrow=False)
                 else:
                     self.logger.warn("no n_node_retlinked in file, falling back to defaults")
 
@@ -693,6 +824,10 @@ class TheanoNodenet(Nodenet):
                     if self.allocated_nodes[id] > MAX_STD_NODETYPE:
                         uid = tnode.to_id(id)
                         self.native_module_instances[uid] = self.get_node(uid)
+                self.invalidate_native_module_index()
+                self.invalidate_nodespace_elements()
+
+            self.build_nodegroups()
 
             for sensor, id_list in self.sensormap.items():
                 for id in id_list:
@@ -700,12 +835,45 @@ class TheanoNodenet(Nodenet):
             for actuator, id_list in self.actuatormap.items():
                 for id in id_list:
                     self.inverted_actuator_map[tnode.to_id(id)] = actuator
+            self.invalidate_binding_indices()
 
             # re-initialize step operators for theano recompile to new shared variables
             self.initialize_stepoperators()
 
             return True
 
+    def load_gate_parameters(self, datafile):
+        """
+        Loads the gate parameter arrays from the given data file, saved as full arrays or as table of defaults
+        and deviating values
+        """
+        gate_parameter_rows = None
+        if 'g_parameter_keys' in datafile and 'g_parameter_defaults' in datafile:
+            gate_parameter_rows = self.build_gate_parameter_rows(datafile['g_parameter_keys'], datafile['g_parameter_defaults'])
+
+        values = {}
+        for column, attribute in enumerate(GATE_PARAMETER_ARRAYS):
+            if attribute in datafile:
+                values[attribute] = datafile[attribute].astype(self.floatX)
+            elif gate_parameter_rows is not None and attribute + '_elements' in datafile:
+                value = gate_parameter_rows.defaults[gate_parameter_rows.rows, column]
+                value[datafile[attribute + '_elements']] = datafile[attribute + '_values']
+                values[attribute] = value
+            else:
+                self.logger.warn("no %s in file, falling back to defaults", attribute)
+                values[attribute] = getattr(self, attribute).get_value(borrow=False)
+
+        if self.gate_parameter_rows is not None:
+            if gate_parameter_rows is None:
+                gate_parameter_rows = self.build_gate_parameter_rows()
+            self.gate_parameter_rows = gate_parameter_rows
+            for attribute in GATE_PARAMETER_ARRAYS:
+                setattr(self, attribute, CompactSharedVector(self.gate_parameter_rows, attribute, values[attribute]))
+        else:
+            for attribute in GATE_PARAMETER_ARRAYS:
+                name = "theta" if attribute == 'g_theta' else attribute
+                setattr(self, attribute, self.shared(value=values[attribute], name=name, borrow=False))
+
     def remove(self, filename):
         datafilename = os.path.join(os.path.dirname(filename), self.uid + "-data.npz")
         os.remove(datafilename)
@@ -721,12 +889,16 @@ class TheanoNodenet(Nodenet):
             self.merge_data(initfrom, keep_uids=True)
             if 'names' in initfrom:
                 self.names = initfrom['names']
+                self.invalidate_name_index()
             if 'positions' in initfrom:
                 self.positions = initfrom['positions']
             if 'actuatormap' in initfrom:
                 self.actuatormap = initfrom['actuatormap']
             if 'sensormap' in initfrom:
                 self.sensormap = initfrom['sensormap']
+            if 'nodegroups' in initfrom:
+                self.nodegroup_definitions = initfrom['nodegroups']
+            self.invalidate_binding_indices()
 
 
     def merge_data(self, nodenet_data, keep_uids=False):
@@ -848,6 +1020,78 @@ class TheanoNodenet(Nodenet):
 
             self.__step += 1
 
+    def step_many(self, steps, datasources=(), datasource_values=None, datatargets=()):
+        """
+        Runs the given number of steps at once, without talking to the world adapter.
+        datasource_values is a ( steps x datasources ) matrix of the values for the sensors of the given data sources
+        in every step. Returns a ( steps x datatargets ) matrix of the values the actuators of the given data targets
+        write in every step.
+        Nodenets without native modules or step operators of their own run all steps in one compiled function,
+        all others fall back to running step after step.
+        """
+        datasources = list(datasources)
+        datatargets = list(datatargets)
+        if datasource_values is None:
+            datasource_values = np.zeros((steps, len(datasources)), dtype=self.floatX)
+        datasource_values = np.asarray(datasource_values, dtype=self.floatX)
+        if datasource_values.shape != (steps, len(datasources)):
+            raise ValueError("Expected %d x %d data source values, got %s" % (steps, len(datasources), datasource_values.shape))
+
+        calculate = None
+        fusable = len(self.native_module_instances) == 0
+        for operator in self.stepoperators:
+            if isinstance(operator, TheanoCalculate):
+                calculate = operator
+            elif not isinstance(operator, Propagate):
+                fusable = False
+        if calculate is None:
+            raise ValueError("step_many can only run nodenets with a calculate step operator")
+
+        if not fusable:
+            datatarget_values = np.zeros((steps, len(datatargets)), dtype=self.floatX)
+            try:
+                for step in range(steps):
+                    calculate.datasource_values = dict(zip(datasources, datasource_values[step].tolist()))
+                    calculate.datatarget_values = {}
+                    self.step()
+                    datatarget_values[step] = [calculate.datatarget_values.get(datatarget, 0) for datatarget in datatargets]
+            finally:
+                calculate.datasource_values = None
+                calculate.datatarget_values = None
+            return datatarget_values
+
+        self.user_prompt = None
+        with self.netlock:
+            if self.has_new_usages or calculate.calculate_function is None or not calculate.is_bound(self):
+                calculate.compile_theano_functions(self)
+                self.has_new_usages = False
+
+            sensor_columns, sensor_elements = self.build_binding_index(self.sensormap, datasources)[1:]
+            actuator_columns, actuator_elements = self.build_binding_index(self.actuatormap, datatargets)[1:]
+            datatarget_values = calculate.step_many(dict(
+                datasource_values=datasource_values,
+                sensor_elements=sensor_elements,
+                sensor_columns=sensor_columns,
+                actuator_elements=actuator_elements,
+                actuator_columns=actuator_columns,
+                number_of_datatargets=len(datatargets),
+                allocated_elements_to_activators=self.allocated_elements_to_activators))
+            if self.nodespace_activity is not None:
+                self.nodespace_activity.set_stepped()
+
+            self.netapi._step()
+
+            self.__step += steps
+
+        return datatarget_values
+
+    def create_ensemble(self, size):
+        """
+        Returns an ensemble of the given number of members sharing the structure of this nodenet,
+        see theano_ensemble.TheanoEnsemble
+        """
+        return TheanoEnsemble(self, size)
+
     def get_node(self, uid):
         if uid in self.native_module_instances:
             return self.native_module_instances[uid]
@@ -916,15 +1160,20 @@ class TheanoNodenet(Nodenet):
         self.last_allocated_offset = offset
         self.allocated_nodes[id] = get_numerical_node_type(nodetype, self.native_modules)
         self.allocated_node_parents[id] = tnodespace.from_id(nodespace_uid)
+        self.invalidate_nodespace_elements()
         self.allocated_node_offsets[id] = offset
 
         for element in range (0, get_elements_per_type(self.allocated_nodes[id], self.native_modules)):
             self.allocated_elements_to_nodes[offset + element] = id
 
+        if self.gate_parameter_rows is not None:
+            self.gate_parameter_rows.assign(offset, self.allocated_nodes[id], self.get_nodetype(nodetype), number_of_elements)
+
         if position is not None:
             self.positions[uid] = position
         if name is not None and name != "" and name != uid:
             self.names[uid] = name
+            self.invalidate_name_index()
 
         if parameters is None:
             parameters = {}
@@ -937,6 +1186,7 @@ class TheanoNodenet(Nodenet):
                     connectedsensors.append(id)
                     self.sensormap[datasource] = connectedsensors
                     self.inverted_sensor_map[uid] = datasource
+                    self.invalidate_binding_indices()
         elif nodetype == "Actor":
             if 'datatarget' in parameters:
                 datatarget = parameters['datatarget']
@@ -945,6 +1195,7 @@ class TheanoNodenet(Nodenet):
                     connectedactuators.append(id)
                     self.actuatormap[datatarget] = connectedactuators
                     self.inverted_actuator_map[uid] = datatarget
+                    self.invalidate_binding_indices()
         elif nodetype == "Pipe":
             self.has_pipes = True
             n_function_selector_array = self.n_function_selector.get_value(borrow=True, return_internal_type=True)
@@ -989,29 +1240,46 @@ class TheanoNodenet(Nodenet):
 
         if nodetype not in STANDARD_NODETYPES:
             self.native_module_instances[uid] = node_proxy
+            self.invalidate_native_module_index()
+
+        self.update_nodegroups([uid])
 
         return uid
 
     def delete_node(self, uid):
+        self.delete_nodes([uid])
+
+    def delete_nodes(self, uids):
+        """
+        Deletes the given nodes, clearing the links of all of them in one pass over the weight matrix
+        """
+        self.unlink_nodes([tnode.from_id(uid) for uid in uids])
+
+        g_function_selector_array = self.g_function_selector.get_value(borrow=True, return_internal_type=True)
+        n_function_selector_array = self.n_function_selector.get_value(borrow=True, return_internal_type=True)
+        for uid in uids:
+            self.forget_node(uid, g_function_selector_array, n_function_selector_array)
+        self.g_function_selector.set_value(g_function_selector_array, borrow=True)
+        self.n_function_selector.set_value(n_function_selector_array, borrow=True)
+        self.invalidate_nodespace_elements()
+        self.update_nodegroups(uids, deleted=True)
+
+    def forget_node(self, uid, g_function_selector_array, n_function_selector_array):
 
         type = self.allocated_nodes[tnode.from_id(uid)]
         offset = self.allocated_node_offsets[tnode.from_id(uid)]
         parent = self.allocated_node_parents[tnode.from_id(uid)]
 
-        # unlink
-        self.get_node(uid).unlink_completely()
-
         # forget
         self.allocated_nodes[tnode.from_id(uid)] = 0
         self.allocated_node_offsets[tnode.from_id(uid)] = 0
         self.allocated_node_parents[tnode.from_id(uid)] = 0
-        g_function_selector_array = self.g_function_selector.get_value(borrow=True, return_internal_type=True)
         for element in range (0, get_elements_per_type(type, self.native_modules)):
             self.allocated_elements_to_nodes[offset + element] = 0
             g_function_selector_array[offset + element] = 0
-        self.g_function_selector.set_value(g_function_selector_array, borrow=True)
+        if self.gate_parameter_rows is not None:
+            self.gate_parameter_rows.release(offset, get_elements_per_type(type, self.native_modules))
 
-        n_function_selector_array = self.n_function_selector.get_value(borrow=True, return_internal_type=True)
         n_function_selector_array[offset + GEN] = NFPG_PIPE_NON
         n_function_selector_array[offset + POR] = NFPG_PIPE_NON
         n_function_selector_array[offset + RET] = NFPG_PIPE_NON
@@ -1019,11 +1287,11 @@ class TheanoNodenet(Nodenet):
         n_function_selector_array[offset + SUR] = NFPG_PIPE_NON
         n_function_selector_array[offset + CAT] = NFPG_PIPE_NON
         n_function_selector_array[offset + EXP] = NFPG_PIPE_NON
-        self.n_function_selector.set_value(n_function_selector_array, borrow=True)
 
         # clear from name and positions dicts
         if uid in self.names:
             del self.names[uid]
+            self.invalidate_name_index()
         if uid in self.positions:
             del self.positions[uid]
 
@@ -1033,6 +1301,7 @@ class TheanoNodenet(Nodenet):
         # remove the native module instance if there should be one
         if uid in self.native_module_instances:
             del self.native_module_instances[uid]
+            self.invalidate_native_module_index()
 
         # remove sensor association if there should be one
         if uid in self.inverted_sensor_map:
@@ -1042,6 +1311,7 @@ class TheanoNodenet(Nodenet):
                 self.sensormap[sensor].remove(tnode.from_id(uid))
             if len(self.sensormap[sensor]) == 0:
                 del self.sensormap[sensor]
+            self.invalidate_binding_indices()
 
         # remove actuator association if there should be one
         if uid in self.inverted_actuator_map:
@@ -1051,6 +1321,7 @@ class TheanoNodenet(Nodenet):
                 self.actuatormap[actuator].remove(tnode.from_id(uid))
             if len(self.actuatormap[actuator]) == 0:
                 del self.actuatormap[actuator]
+            self.invalidate_binding_indices()
 
         # clear activator usage if there should be one
         used_as_activator_by = np.where(self.allocated_elements_to_activators == offset)
@@ -1147,23 +1418,28 @@ class TheanoNodenet(Nodenet):
         return uid
 
     def delete_nodespace(self, uid):
-        nodespace_id = tnodespace.from_id(uid)
-        children_ids = np.where(self.allocated_nodespaces == nodespace_id)[0]
-        for child_id in children_ids:
-            self.delete_nodespace(tnodespace.to_id(child_id))
-        node_ids = np.where(self.allocated_node_parents == nodespace_id)[0]
-        for node_id in node_ids:
-            self.delete_node(tnode.to_id(node_id))
+        # collect the nodespace and all nodespaces contained within, children before their parents
+        nodespace_ids = [tnodespace.from_id(uid)]
+        for nodespace_id in nodespace_ids:
+            nodespace_ids.extend(np.where(self.allocated_nodespaces == nodespace_id)[0])
+        nodespace_ids.reverse()
 
-        # clear from name and positions dicts
-        if uid in self.names:
-            del self.names[uid]
-        if uid in self.positions:
-            del self.positions[uid]
+        # delete all their nodes at once
+        node_ids = np.where(np.in1d(self.allocated_node_parents, nodespace_ids))[0]
+        self.delete_nodes([tnode.to_id(node_id) for node_id in node_ids])
+
+        for nodespace_id in nodespace_ids:
+            nodespace_uid = tnodespace.to_id(nodespace_id)
+
+            # clear from name and positions dicts
+            if nodespace_uid in self.names:
+                del self.names[nodespace_uid]
+            if nodespace_uid in self.positions:
+                del self.positions[nodespace_uid]
 
-        self.allocated_nodespaces[nodespace_id] = 0
+            self.allocated_nodespaces[nodespace_id] = 0
 
-        self.last_allocated_nodespace = nodespace_id
+            self.last_allocated_nodespace = nodespace_id
 
     def get_sensors(self, nodespace=None, datasource=None):
         sensors = {}
@@ -1243,6 +1519,52 @@ class TheanoNodenet(Nodenet):
         self.set_link_weight(source_node_uid, gate_type, target_node_uid, slot_type, 0)
         return True
 
+    def unlink_nodes(self, node_ids):
+        """
+        Deletes all links from and to the nodes with the given numerical ids, clearing their rows and columns of
+        the weight matrix in one operation
+        """
+        elements = [np.arange(self.allocated_node_offsets[id],
+                              self.allocated_node_offsets[id] + get_elements_per_type(self.allocated_nodes[id], self.native_modules))
+                    for id in node_ids]
+        if len(elements) == 0:
+            return
+        elements = np.concatenate(elements)
+        cleared = np.zeros(self.NoE, dtype=bool)
+        cleared[elements] = True
+
+        w_matrix = self.w.get_value(borrow=True, return_internal_type=True)
+        if self.sparse:
+            rows = np.repeat(np.arange(self.NoE), np.diff(w_matrix.indptr))
+            columns = w_matrix.indices
+            targets = rows[cleared[columns] & (w_matrix.data != 0)]
+            w_matrix.data[cleared[rows] | cleared[columns]] = 0
+            w_matrix.eliminate_zeros()
+        else:
+            targets = np.nonzero(np.asarray(w_matrix[:, elements]).any(axis=1))[0]
+            w_matrix[elements, :] = 0
+            w_matrix[:, elements] = 0
+        self.w.set_value(w_matrix, borrow=True)
+
+        # the nodes lose their por- and ret-linked flags, and so do the pipes that lost their last por or ret links
+        n_node_porlinked_array = self.n_node_porlinked.get_value(borrow=True, return_internal_type=True)
+        n_node_retlinked_array = self.n_node_retlinked.get_value(borrow=True, return_internal_type=True)
+        n_node_porlinked_array[elements] = 0
+        n_node_retlinked_array[elements] = 0
+        for id in np.unique(self.allocated_elements_to_nodes[targets[~cleared[targets]]]):
+            if self.allocated_nodes[id] != PIPE:
+                continue
+            offset = self.allocated_node_offsets[id]
+            for slot, linked_array in ((POR, n_node_porlinked_array), (RET, n_node_retlinked_array)):
+                if self.sparse:
+                    linked = w_matrix.indptr[offset + slot + 1] > w_matrix.indptr[offset + slot]
+                else:
+                    linked = np.asarray(w_matrix[offset + slot]).any()
+                if not linked:
+                    linked_array[offset:offset + 7] = 0
+        self.n_node_porlinked.set_value(n_node_porlinked_array, borrow=True)
+        self.n_node_retlinked.set_value(n_node_retlinked_array, borrow=True)
+
     def reload_native_modules(self, native_modules):
         pass
 
@@ -1381,26 +1703,104 @@ class TheanoNodenet(Nodenet):
         """
         return copy.deepcopy(STANDARD_NODETYPES)
 
-    def set_sensors_and_actuator_feedback_to_values(self, datasource_to_value_map, datatarget_to_value_map):
+    def invalidate_binding_indices(self):
         """
-        Sets the sensors for the given data sources to the given values
+        Called whenever sensors or actuators are created, deleted or bound to other data sources or data targets
         """
+        self.__sensor_index = None
+        self.__actuator_index = None
+
+    def build_binding_index(self, bindingmap, keys=None):
+        if keys is None:
+            keys = list(bindingmap.keys())
+        positions = []
+        elements = []
+        for position, key in enumerate(keys):
+            for id in bindingmap.get(key, []):
+                positions.append(position)
+                elements.append(self.allocated_node_offsets[id] + GEN)
+        return keys, np.array(positions, dtype=np.int32), np.array(elements, dtype=np.int32)
+
+    def get_sensor_index(self):
+        """
+        Returns a tuple ( datasources, positions, elements ): the list of data sources sensors are bound to,
+        and for every sensor the position of its data source in that list and the element holding its activation
+        """
+        if self.__sensor_index is None:
+            self.__sensor_index = self.build_binding_index(self.sensormap)
+        return self.__sensor_index
 
-        a_array = self.a.get_value(borrow=True, return_internal_type=True)
+    def get_actuator_index(self):
+        """
+        Returns a tuple ( datatargets, positions, elements ): the list of data targets actuators are bound to,
+        and for every actuator the position of its data target in that list and the element holding its activation
+        """
+        if self.__actuator_index is None:
+            self.__actuator_index = self.build_binding_index(self.actuatormap)
+        return self.__actuator_index
 
-        for datasource in datasource_to_value_map:
-            value = datasource_to_value_map.get(datasource)
-            sensor_uids = self.sensormap.get(datasource, [])
+    def invalidate_native_module_index(self):
+        """
+        Called whenever native module instances are created or deleted
+        """
+        self.__native_module_index_valid = False
 
-            for sensor_uid in sensor_uids:
-                a_array[self.allocated_node_offsets[sensor_uid] + GEN] = value
+    def get_native_module_index(self):
+        """
+        Returns a tuple ( instances, elements ): the list of native module instances, and the elements of all
+        instances, consecutively in the order of that list. Every instance knows the position of its first element
+        in the index as native_module_position.
+        While native module node functions are running, the index of the step is kept even if they create or delete
+        instances, so that the positions hold until the gate activations are written back.
+        """
+        if not self.__native_module_index_valid and self.native_module_gate_activations is None:
+            instances = list(self.native_module_instances.values())
+            elements = []
+            for instance in instances:
+                id = tnode.from_id(instance.uid)
+                offset = self.allocated_node_offsets[id]
+                instance.native_module_position = len(elements)
+                elements.extend(range(offset, offset + get_elements_per_type(self.allocated_nodes[id], self.native_modules)))
+            self.__native_module_index = instances, np.array(elements, dtype=np.int32)
+            self.__native_module_index_valid = True
+            self.native_module_slot_activations = np.zeros(len(elements), dtype=self.floatX)
+        return self.__native_module_index
+
+    def invalidate_nodespace_elements(self):
+        """
+        Called whenever nodes are created or deleted
+        """
+        self.__nodespace_elements = None
+        self.nodespace_elements_version += 1
 
-        for datatarget in datatarget_to_value_map:
-            value = datatarget_to_value_map.get(datatarget)
-            actuator_uids = self.actuatormap.get(datatarget, [])
+    def get_nodespace_elements(self):
+        """
+        Returns a tuple ( element_nodespaces, nodespace_elements ): the numerical nodespace of every element,
+        0 for elements that belong to no node, and the sorted array of elements of every numerical nodespace
+        """
+        if self.__nodespace_elements is None:
+            element_nodespaces = self.allocated_node_parents[self.allocated_elements_to_nodes]
+            order = np.argsort(element_nodespaces, kind='mergesort')
+            bounds = np.searchsorted(element_nodespaces[order], np.arange(self.NoNS + 1))
+            nodespace_elements = [order[bounds[id]:bounds[id + 1]] for id in range(self.NoNS)]
+            self.__nodespace_elements = element_nodespaces, nodespace_elements
+        return self.__nodespace_elements
 
-            for actuator_uid in actuator_uids:
-                a_array[self.allocated_node_offsets[actuator_uid] + GEN] = value
+    def set_sensors_and_actuator_feedback_to_values(self, datasource_to_value_map, datatarget_to_value_map):
+        """
+        Sets the sensors for the given data sources to the given values
+        """
+
+        a_array = self.a.get_value(borrow=True, return_internal_type=True)
+
+        for index, value_map in ((self.get_sensor_index(), datasource_to_value_map),
+                                 (self.get_actuator_index(), datatarget_to_value_map)):
+            keys, positions, elements = index
+            if len(elements) == 0:
+                continue
+            given = np.array([key in value_map for key in keys], dtype=bool)[positions]
+            values = np.array([value_map.get(key, 0) for key in keys], dtype=a_array.dtype)[positions]
+            a_array[elements[given]] = values[given]
 
         self.a.set_value(a_array, borrow=True)
 
@@ -1409,68 +1809,259 @@ class TheanoNodenet(Nodenet):
         Returns a map of datatargets to values for writing back to the world adapter
         """
 
-        actuator_values_to_write = {}
-
         a_array = self.a.get_value(borrow=True, return_internal_type=True)
 
-        for datatarget in self.actuatormap:
-            actuator_node_activations = 0
-            for actuator_id in self.actuatormap[datatarget]:
-                actuator_node_activations += a_array[self.allocated_node_offsets[actuator_id] + GEN]
+        datatargets, positions, elements = self.get_actuator_index()
+        actuator_values = np.zeros(len(datatargets), dtype=a_array.dtype)
+        np.add.at(actuator_values, positions, a_array[elements])
 
-            actuator_values_to_write[datatarget] = actuator_node_activations
+        return dict(zip(datatargets, actuator_values.tolist()))
 
-        self.a.set_value(a_array, borrow=True)
-
-        return actuator_values_to_write
+    def invalidate_name_index(self):
+        """
+        Called whenever nodes are named, renamed or deleted
+        """
+        self.__name_index = None
 
-    def group_nodes_by_names(self, nodespace=None, node_name_prefix=None):
-        ids = []
-        for uid, name in self.names.items():
-            if name.startswith(node_name_prefix) and \
-                    (nodespace is None or self.allocated_node_parents[tnode.from_id(uid)] == tnodespace.from_id(nodespace)):
-                ids.append(uid)
-        self.group_nodes_by_ids(ids, node_name_prefix)
+    def get_name_index(self):
+        """
+        Returns the sorted list of ( name, uid ) tuples of all named nodes
+        """
+        if self.__name_index is None:
+            self.__name_index = sorted((name, uid) for uid, name in self.names.items() if uid.startswith("n"))
+        return self.__name_index
 
-    def group_nodes_by_ids(self, node_ids, group_name):
-        ids = [tnode.from_id(uid) for uid in node_ids]
-        ids = sorted(ids)
-        self.nodegroups[group_name] = self.allocated_node_offsets[ids]
+    def get_node_uids_by_name_prefix(self, node_name_prefix, nodespace=None):
+        """
+        Returns the uids of the nodes whose names start with the given prefix, optionally only those in the given
+        nodespace
+        """
+        name_index = self.get_name_index()
+        uids = []
+        for position in range(bisect.bisect_left(name_index, (node_name_prefix,)), len(name_index)):
+            name, uid = name_index[position]
+            if not name.startswith(node_name_prefix):
+                break
+            if nodespace is None or self.allocated_node_parents[tnode.from_id(uid)] == tnodespace.from_id(nodespace):
+                uids.append(uid)
+        return uids
+
+    def group_nodes_by_names(self, nodespace=None, node_name_prefix=None, gate=None, slot=None):
+        ids = self.get_node_uids_by_name_prefix(node_name_prefix, nodespace)
+        self.group_nodes_by_ids(ids, node_name_prefix, gate, slot)
+        self.nodegroup_definitions[node_name_prefix]['nodespace'] = nodespace
+        self.nodegroup_definitions[node_name_prefix]['node_name_prefix'] = node_name_prefix
+
+    def group_nodes_by_ids(self, node_ids, group_name, gate=None, slot=None):
+        ids = sorted(tnode.from_id(uid) for uid in node_ids)
+        self.nodegroup_definitions[group_name] = {
+            'node_ids': [tnode.to_id(id) for id in ids],
+            'gate': gate if slot is None else None,
+            'slot': slot,
+            'nodespace': None,
+            'node_name_prefix': None
+        }
+        self.build_nodegroup(group_name)
 
     def ungroup_nodes(self, group):
+        if group in self.nodegroup_definitions:
+            del self.nodegroup_definitions[group]
         if group in self.nodegroups:
             del self.nodegroups[group]
+            del self.nodegroup_slices[group]
+
+    def build_nodegroup(self, group):
+        """
+        Builds the elements of the given group from its definition: one element per node, the given gate of every
+        node ( gen if neither gate nor slot are given ), or the given slot
+        """
+        definition = self.nodegroup_definitions[group]
+        ids = np.array([tnode.from_id(uid) for uid in definition['node_ids']], dtype=np.int32)
+        elements = self.allocated_node_offsets[ids].astype(np.int32)
+        for numerical_type in np.unique(self.allocated_nodes[ids]):
+            nodetype = self.get_nodetype(get_string_node_type(numerical_type, self.native_modules))
+            if definition['slot'] is not None:
+                element = get_numerical_slot_type(definition['slot'], nodetype)
+            else:
+                element = get_numerical_gate_type(definition['gate'] or "gen", nodetype)
+            elements[self.allocated_nodes[ids] == numerical_type] += element
+        self.nodegroups[group] = elements
+
+        # evenly spaced elements can be addressed with a slice, which returns views instead of copies
+        self.nodegroup_slices[group] = None
+        if len(elements) > 0:
+            step = elements[1] - elements[0] if len(elements) > 1 else 1
+            if step > 0 and np.all(np.diff(elements) == step):
+                self.nodegroup_slices[group] = slice(int(elements[0]), int(elements[-1]) + 1, int(step))
+
+    def build_nodegroups(self):
+        """
+        Builds the elements of all groups, dropping the nodes that no longer exist
+        """
+        for group, definition in self.nodegroup_definitions.items():
+            definition['node_ids'] = [uid for uid in definition['node_ids'] if self.allocated_nodes[tnode.from_id(uid)] != 0]
+            self.build_nodegroup(group)
+
+    def update_nodegroups(self, uids, deleted=False):
+        """
+        Called whenever nodes are created, renamed, moved or deleted: the nodes join or leave the groups defined by
+        name prefix and nodespace as their names and nodespaces match them, deleted nodes leave all groups
+        """
+        for group, definition in self.nodegroup_definitions.items():
+            members = set(definition['node_ids'])
+            prefix = definition.get('node_name_prefix')
+            if deleted:
+                joining, leaving = set(), members.intersection(uids)
+            elif prefix is None:
+                continue
+            else:
+                nodespace = definition.get('nodespace')
+                parent = None if nodespace is None else tnodespace.from_id(nodespace)
+                # unnamed nodes go by their uids, but only names count for groups
+                matching = set(uid for uid in uids if uid in self.names and self.names[uid].startswith(prefix) and
+                               (parent is None or self.allocated_node_parents[tnode.from_id(uid)] == parent))
+                joining, leaving = matching - members, members.intersection(uids) - matching
+            if not joining and not leaving:
+                continue
+            definition['node_ids'] = sorted((members | joining) - leaving, key=tnode.from_id)
+            self.build_nodegroup(group)
+
+    def is_contiguous_group(self, group):
+        """
+        Returns True if the elements of the given group are evenly spaced, so that activations and thetas of the
+        group are returned as views where the node net holds them in arrays
+        """
+        return self.nodegroup_slices[group] is not None
+
+    def get_group_index(self, group):
+        """
+        Returns the slice of the elements of the given group if they are evenly spaced, or the elements otherwise
+        """
+        group_slice = self.nodegroup_slices[group]
+        return self.nodegroups[group] if group_slice is None else group_slice
+
+    def get_group_values(self, shared, group):
+        """
+        Returns the values of the given shared variable for the elements of the given group, as read-only array
+        """
+        values = shared.get_value(borrow=True, return_internal_type=True)[self.get_group_index(group)]
+        values.flags.writeable = False
+        return values
 
     def get_activations(self, group):
-        a_array = self.a.get_value(borrow=True, return_internal_type=True)
-        return a_array[self.nodegroups[group]]
+        return self.get_group_values(self.a, group)
 
     def get_thetas(self, group):
-        g_theta_array = self.g_theta.get_value(borrow=True, return_internal_type=True)
-        return g_theta_array[self.nodegroups[group]]
+        return self.get_group_values(self.g_theta, group)
 
     def set_thetas(self, group, thetas):
         g_theta_array = self.g_theta.get_value(borrow=True, return_internal_type=True)
-        g_theta_array[self.nodegroups[group]] = thetas
+        g_theta_array[self.get_group_index(group)] = thetas
         self.g_theta.set_value(g_theta_array, borrow=True)
 
-    def get_link_weights(self, group_from, group_to):
+    def get_link_weights(self, group_from, group_to, sparse=False):
+        w_matrix = self.w.get_value(borrow=True, return_internal_type=True)
+        block = w_matrix[self.nodegroups[group_to]][:, self.nodegroups[group_from]]
+        if sparse:
+            return sp.csr_matrix(block)
+        if sp.issparse(block):
+            return block.todense()
+        return np.asmatrix(block)
+
+    def set_link_weights(self, group_from, group_to, new_w, existing_only=False):
         w_matrix = self.w.get_value(borrow=True, return_internal_type=True)
-        return w_matrix[:,self.nodegroups[group_from]][self.nodegroups[group_to]].todense()
+        grp_from = self.nodegroups[group_from]
+        grp_to = self.nodegroups[group_to]
+        if sp.issparse(new_w):
+            new_w = new_w.toarray()
+        new_w = np.asarray(new_w, dtype=w_matrix.dtype).reshape(len(grp_to), len(grp_from))
+        if not sp.issparse(w_matrix):
+            block = np.ix_(grp_to, grp_from)
+            if existing_only:
+                new_w = np.where(w_matrix[block] != 0, new_w, 0)
+            w_matrix[block] = new_w
+            self.w.set_value(w_matrix, borrow=True)
+            return
+
+        # write the existing entries of the block in place, and only add the new links to the sparsity structure
+        positions, rows, columns = self.get_link_positions(group_from, group_to)
+        if existing_only:
+            linked = w_matrix.data[positions] != 0
+            positions, rows, columns = positions[linked], rows[linked], columns[linked]
+        w_matrix.data[positions] = new_w[rows, columns]
+        if not existing_only:
+            new_links = new_w != 0
+            new_links[rows, columns] = False
+            rows, columns = np.nonzero(new_links)
+            if len(rows):
+                added = sp.csr_matrix((new_w[rows, columns], (grp_to[rows], grp_from[columns])), shape=w_matrix.shape)
+                w_matrix = (w_matrix + added).tocsr()
+        self.w.set_value(w_matrix, borrow=True)
 
-    def set_link_weights(self, group_from, group_to, new_w):
+    def get_link_positions(self, group_from, group_to):
+        """
+        Returns a tuple ( positions, rows, columns ) of arrays for the stored entries of the sparse weight matrix
+        between the given groups: their positions in the data array of the matrix, and their rows in group_to
+        and columns in group_from
+        """
         w_matrix = self.w.get_value(borrow=True, return_internal_type=True)
         grp_from = self.nodegroups[group_from]
         grp_to = self.nodegroups[group_to]
-        cols, rows = np.meshgrid(grp_from, grp_to)
-        w_matrix[rows, cols] = new_w
+        group_columns = np.full(w_matrix.shape[1], -1, dtype=np.int64)
+        group_columns[grp_from] = np.arange(len(grp_from))
+        starts = w_matrix.indptr[grp_to]
+        lengths = w_matrix.indptr[grp_to + 1] - starts
+        positions = np.arange(lengths.sum()) + np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        rows = np.repeat(np.arange(len(grp_to)), lengths)
+        columns = group_columns[w_matrix.indices[positions]]
+        in_group = columns >= 0
+        return positions[in_group], rows[in_group], columns[in_group]
+
+    def update_link_weights(self, group_from, group_to, update):
+        """
+        Replaces the weights of all links between the given groups with update( weights, rows, columns ), where
+        weights are the current weights of the links, and rows and columns their positions in group_to and
+        group_from. Only existing links are updated, no links are created or removed.
+        """
+        w_matrix = self.w.get_value(borrow=True, return_internal_type=True)
+        if sp.issparse(w_matrix):
+            positions, rows, columns = self.get_link_positions(group_from, group_to)
+            weights = w_matrix.data[positions]
+            linked = weights != 0
+            positions, rows, columns = positions[linked], rows[linked], columns[linked]
+            w_matrix.data[positions] = update(weights[linked], rows, columns)
+        else:
+            block = np.ix_(self.nodegroups[group_to], self.nodegroups[group_from])
+            weights = w_matrix[block]
+            rows, columns = np.nonzero(weights)
+            weights[rows, columns] = update(weights[rows, columns], rows, columns)
+            w_matrix[block] = weights
         self.w.set_value(w_matrix, borrow=True)
 
+    def learn_hebbian(self, group_from, group_to, rate):
+        """
+        Strengthens the links between the given groups by rate times the product of their activations
+        """
+        a_from = self.get_activations(group_from)
+        a_to = self.get_activations(group_to)
+        self.update_link_weights(group_from, group_to,
+                                 lambda weights, rows, columns: weights + rate * a_to[rows] * a_from[columns])
+
+    def learn_delta(self, group_from, group_to, targets, rate):
+        """
+        Moves the links between the given groups by rate times the error of group_to ( targets minus activations )
+        times the activations of group_from
+        """
+        a_from = self.get_activations(group_from)
+        error = np.asarray(targets, dtype=a_from.dtype) - self.get_activations(group_to)
+        self.update_link_weights(group_from, group_to,
+                                 lambda weights, rows, columns: weights + rate * error[rows] * a_from[columns])
+
+    def decay_link_weights(self, group_from, group_to, rate):
+        """
+        Decays the links between the given groups by the given rate
+        """
+        self.update_link_weights(group_from, group_to, lambda weights, rows, columns: weights * (1 - rate))
+
     def get_available_gatefunctions(self):
         return ["identity", "absolute", "sigmoid", "tanh", "rect", "one_over_x"]
-
-    def rebuild_shifted(self):
-        a_array = self.a.get_value(borrow=True, return_internal_type=True)
-        a_rolled_array = np.roll(a_array, 7)
-        a_shifted_matrix = np.lib.stride_tricks.as_strided(a_rolled_array, shape=(self.NoE, 14), strides=(self.byte_per_float, self.byte_per_float))
-        self.a_shifted.set_value(a_shifted_matrix, borrow=True)
@@ -1,12 +1,21 @@
 
+import threading
+import numpy as np
+import scipy.sparse as sp
+
 from micropsi_core.nodenet.stepoperators import Propagate, Calculate
-import theano
-from theano import tensor as T
-from theano import shared
-from theano import function
-from theano.tensor import nnet as N
-import theano.sparse as ST
+try:
+    import theano
+    from theano import tensor as T
+    from theano import shared
+    from theano import function
+    from theano.tensor import nnet as N
+    import theano.sparse as ST
+except ImportError:
+    # the numpy_engine reuses the python parts of the calculate operator, and runs without theano
+    theano = None
 from micropsi_core.nodenet.theano_engine.theano_node import *
+from micropsi_core.nodenet.theano_engine import theano_node as tnode
 
 GATE_FUNCTION_IDENTITY = 0
 GATE_FUNCTION_ABSOLUTE = 1
@@ -24,6 +33,568 @@ NFPG_PIPE_SUR = 5
 NFPG_PIPE_CAT = 6
 NFPG_PIPE_EXP = 7
 
+# the features of a nodenet the calculate graph is built for, named like the flags of TheanoNodenet
+CALCULATE_FEATURES = (
+    'has_pipes',
+    'has_directional_activators',
+    'has_gatefunction_absolute',
+    'has_gatefunction_sigmoid',
+    'has_gatefunction_tanh',
+    'has_gatefunction_rect',
+    'has_gatefunction_one_over_x')
+
+# the inputs of the calculate function, named like the shared variables of TheanoNodenet
+CALCULATE_INPUTS = (
+    'a',
+    'n_node_porlinked',
+    'n_node_retlinked',
+    'n_function_selector',
+    'g_factor',
+    'g_function_selector',
+    'g_theta',
+    'g_threshold',
+    'g_amplification',
+    'g_min',
+    'g_max')
+
+# the inputs of the step_many function that the calculate function does not take.
+# the gate factors are calculated in every step
+STEP_MANY_INPUTS = (
+    'datasource_values',
+    'sensor_elements',
+    'sensor_columns',
+    'actuator_elements',
+    'actuator_columns',
+    'number_of_datatargets',
+    'allocated_elements_to_activators')
+
+# the selector vectors of TheanoNodenet, all others the step functions read are float vectors or the weight matrix
+SELECTORS = (
+    'n_node_porlinked',
+    'n_node_retlinked',
+    'n_function_selector',
+    'g_function_selector')
+
+# compiled theano functions, shared by all nodenets in this process.
+# compiling takes seconds, and the functions only depend on the features and the float type, not on the nodenet:
+# they are compiled with placeholders for the shared variables of a nodenet, and bound to the variables of every
+# nodenet with bind_theano_function.
+theano_functions = {}
+theano_function_locks = {}
+theano_functions_lock = threading.Lock()
+
+
+def get_theano_function(key, compile):
+    """
+    Returns the compiled theano function for the given key, calling compile to compile it if it is not cached yet.
+    """
+    with theano_functions_lock:
+        if key in theano_functions:
+            return theano_functions[key]
+        lock = theano_function_locks.setdefault(key, threading.Lock())
+    # compile outside of the global lock, so that other functions can be looked up meanwhile
+    with lock:
+        if key not in theano_functions:
+            theano_functions[key] = compile()
+    return theano_functions[key]
+
+
+def is_theano_function_compiled(key):
+    with theano_functions_lock:
+        return key in theano_functions
+
+
+def get_placeholders(names, floatX, sparse=False):
+    """
+    Returns shared variables of the types of the given shared variables of TheanoNodenet, by name
+    """
+    placeholders = {}
+    for name in names:
+        if name == 'w':
+            value = sp.csr_matrix((1, 1), dtype=floatX) if sparse else np.zeros((1, 1), dtype=floatX)
+        elif name in SELECTORS:
+            value = np.zeros(1, dtype=np.int8)
+        else:
+            value = np.zeros(1, dtype=floatX)
+        placeholders[name] = theano.shared(value=value, name=name)
+    return placeholders
+
+
+def bind_theano_function(compiled, nodenet):
+    """
+    Returns a copy of the given function compiled with placeholders, that reads and updates the shared variables of
+    the given nodenet instead. Copying does not compile anything.
+    """
+    function, placeholders = compiled
+    swap = dict((placeholder, getattr(nodenet, name)) for name, placeholder in placeholders.items())
+    return function.copy(swap=swap)
+
+
+def get_propagate_function(sparse, floatX):
+    return get_theano_function(('propagate', sparse, floatX), lambda: compile_propagate_function(sparse, floatX))
+
+
+def get_calculate_key(features, floatX, inputs=()):
+    return ('calculate', features, floatX, inputs)
+
+
+def get_calculate_function(features, floatX, inputs=()):
+    return get_theano_function(get_calculate_key(features, floatX, inputs),
+                               lambda: compile_calculate_function(features, floatX, inputs))
+
+
+def get_ensemble_propagate_function(sparse, floatX):
+    return get_theano_function(('ensemble_propagate', sparse, floatX),
+                               lambda: compile_ensemble_propagate_function(sparse, floatX))
+
+
+def get_ensemble_calculate_function(features, floatX):
+    return get_theano_function(('ensemble_calculate', features, floatX),
+                               lambda: compile_ensemble_calculate_function(features, floatX))
+
+
+def get_element_calculate_function(features, floatX):
+    return get_theano_function(('element_calculate', features, floatX),
+                               lambda: compile_element_calculate_function(features, floatX))
+
+
+def get_step_many_function(features, sparse, floatX, inputs=()):
+    return get_theano_function(('step_many', features, sparse, floatX, inputs),
+                               lambda: compile_step_many_function(features, sparse, floatX, inputs))
+
+
+def get_calculate_features(nodenet):
+    return tuple(bool(getattr(nodenet, feature)) for feature in CALCULATE_FEATURES)
+
+
+# the calculate function for all features calculates nodenets with fewer features just as well, only slower
+ALL_FEATURES = (True,) * len(CALCULATE_FEATURES)
+
+
+def precompile_theano_functions(sparse, floatX, inputs=(), background=True):
+    """
+    Compiles the propagate function and the calculate functions for all features, which nodenets use instead of
+    compiling calculate functions for their features. Returns the compiling thread if background is True.
+    """
+    def compile_all():
+        get_propagate_function(sparse, floatX)
+        get_calculate_function(ALL_FEATURES, floatX, inputs)
+        get_element_calculate_function(ALL_FEATURES, floatX)
+
+    if not background:
+        compile_all()
+        return None
+    thread = threading.Thread(target=compile_all, name="theano precompiler")
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+def compile_propagate_function(sparse, floatX):
+    """
+    Compiles propagation across w, updating a, and returns the function with its placeholders
+    """
+    placeholders = get_placeholders(('w', 'a'), floatX, sparse)
+    w, a = placeholders['w'], placeholders['a']
+    if sparse:
+        slots = ST.dot(w, a)
+    else:
+        slots = T.dot(w, a)
+    return theano.function([], None, updates={a: slots}), placeholders
+
+
+def compile_ensemble_propagate_function(sparse, floatX):
+    a = T.matrix("a", dtype=floatX)
+    if sparse:
+        w = ST.csr_matrix("w", dtype=floatX)
+        slots = ST.dot(w, a)
+    else:
+        w = T.matrix("w", dtype=floatX)
+        slots = T.dot(w, a)
+    return theano.function([theano.In(w, borrow=True), theano.In(a, borrow=True)], slots)
+
+
+def get_calculate_inputs(floatX, ensemble=False):
+    """
+    Returns a dict of the symbolic inputs of the calculate graph, by the names in CALCULATE_INPUTS.
+    For ensembles, activations and gate parameters are ( elements x members ) matrices, and the selectors
+    are columns broadcasting across all members.
+    """
+    if ensemble:
+        vector = T.matrix
+        bvector = T.bcol
+    else:
+        vector = T.vector
+        bvector = T.bvector
+    return dict(
+        a=vector("a", dtype=floatX),
+        n_node_porlinked=bvector("porlinked"),
+        n_node_retlinked=bvector("retlinked"),
+        n_function_selector=bvector("nodefunction_per_gate"),
+        g_factor=vector("g_factor", dtype=floatX),
+        g_function_selector=bvector("gatefunction"),
+        g_theta=vector("theta", dtype=floatX),
+        g_threshold=vector("g_threshold", dtype=floatX),
+        g_amplification=vector("g_amplification", dtype=floatX),
+        g_min=vector("g_min", dtype=floatX),
+        g_max=vector("g_max", dtype=floatX))
+
+
+def compile_calculate_function(features, floatX, inputs=()):
+    """
+    Compiles the calculate graph for nodenets with the given features, updating a, and returns the function with its
+    placeholders. The function takes the variables named in inputs as arguments, for nodenets that don't hold them
+    in shared variables, see theano_gateparameters.
+    """
+    graph_inputs = get_calculate_inputs(floatX)
+    placeholders = get_placeholders([name for name in CALCULATE_INPUTS if name not in inputs], floatX)
+    graph_inputs.update(placeholders)
+    gatefunctions = build_calculate_graph(features, graph_inputs)
+    # only the placeholders the graph reads are part of the function, and can be swapped
+    used = set(theano.gof.graph.inputs([gatefunctions]))
+    placeholders = dict((name, placeholder) for name, placeholder in placeholders.items() if placeholder in used)
+
+    return theano.function([theano.In(graph_inputs[name], borrow=True) for name in inputs], None,
+                           updates={graph_inputs['a']: gatefunctions}, on_unused_input='ignore'), placeholders
+
+
+def compile_element_calculate_function(features, floatX):
+    """
+    Compiles the calculate graph for some of the elements of a nodenet, taking all CALCULATE_INPUTS for these
+    elements, and returning their activations
+    """
+    inputs = get_calculate_inputs(floatX)
+    gatefunctions = build_calculate_graph(features, inputs)
+
+    return theano.function([theano.In(inputs[name], borrow=True) for name in CALCULATE_INPUTS],
+                           gatefunctions, on_unused_input='ignore')
+
+
+def compile_ensemble_calculate_function(features, floatX):
+    inputs = get_calculate_inputs(floatX, ensemble=True)
+    gatefunctions = build_calculate_graph(features, inputs)
+
+    return theano.function([theano.In(inputs[name], borrow=True) for name in CALCULATE_INPUTS],
+                           gatefunctions, on_unused_input='ignore')
+
+
+def compile_step_many_function(features, sparse, floatX, inputs=()):
+    """
+    Compiles a scan over propagate and calculate for a number of steps, given by the rows of datasource_values,
+    updating a, and returns the function with its placeholders. The function takes the STEP_MANY_INPUTS, and the
+    variables named in inputs as the calculate function does.
+    Every step, the actuators are summed up into a row of number_of_datatargets values after propagation, and the
+    sensors are set to their columns in the row of datasource_values for the step.
+    The function returns a list holding the ( steps x datatargets ) matrix of these rows.
+    """
+    has = dict(zip(CALCULATE_FEATURES, features))
+    graph_inputs = get_calculate_inputs(floatX)
+    graph_inputs.update(
+        datasource_values=T.matrix("datasource_values", dtype=floatX),
+        sensor_elements=T.ivector("sensor_elements"),
+        sensor_columns=T.ivector("sensor_columns"),
+        actuator_elements=T.ivector("actuator_elements"),
+        actuator_columns=T.ivector("actuator_columns"),
+        number_of_datatargets=T.iscalar("number_of_datatargets"),
+        allocated_elements_to_activators=T.ivector("elements_to_activators"))
+    placeholders = get_placeholders(
+        ['w'] + [name for name in CALCULATE_INPUTS if name not in inputs and name != 'g_factor'], floatX, sparse)
+    graph_inputs.update(placeholders)
+
+    # everything but the activation vector and the data source values stays the same for all steps
+    non_sequence_names = [name for name in STEP_MANY_INPUTS + CALCULATE_INPUTS + ('w',)
+                          if name not in ('datasource_values', 'a', 'g_factor')]
+
+    def step(datasource_row, a, *non_sequences):
+        step_inputs = dict(zip(non_sequence_names, non_sequences))
+        if sparse:
+            slots = ST.dot(step_inputs['w'], a)
+        else:
+            slots = T.dot(step_inputs['w'], a)
+        datatarget_row = T.zeros((step_inputs['number_of_datatargets'],), dtype=floatX)
+        datatarget_row = T.inc_subtensor(datatarget_row[step_inputs['actuator_columns']],
+                                         slots[step_inputs['actuator_elements']])
+        slots = T.set_subtensor(slots[step_inputs['sensor_elements']], datasource_row[step_inputs['sensor_columns']])
+        if has['has_directional_activators']:
+            slots = T.set_subtensor(slots[0], 1)
+            step_inputs['g_factor'] = slots[step_inputs['allocated_elements_to_activators']]
+        step_inputs['a'] = slots
+        return build_calculate_graph(features, step_inputs), datatarget_row
+
+    (activations, datatarget_values), updates = theano.scan(
+        step,
+        sequences=[graph_inputs['datasource_values']],
+        outputs_info=[graph_inputs['a'], None],
+        non_sequences=[graph_inputs[name] for name in non_sequence_names])
+    updates[graph_inputs['a']] = activations[-1]
+
+    # only the placeholders the graph reads are part of the function, and can be swapped
+    used = set(theano.gof.graph.inputs([activations[-1], datatarget_values]))
+    placeholders = dict((name, placeholder) for name, placeholder in placeholders.items() if placeholder in used)
+
+    return theano.function([theano.In(graph_inputs[name], borrow=True) for name in STEP_MANY_INPUTS + inputs],
+                           [datatarget_values], updates=updates, on_unused_input='ignore'), placeholders
+
+
+def build_calculate_graph(features, inputs):
+    """
+    Returns the gate activations calculated from the given symbolic inputs, for nodenets with the given features
+    """
+    has = dict(zip(CALCULATE_FEATURES, features))
+    por_linked = inputs['n_node_porlinked']
+    ret_linked = inputs['n_node_retlinked']
+
+    # node functions implemented with identity by default (native modules are calculated by python)
+    nodefunctions = inputs['a']
+
+    # pipe logic
+
+    ###############################################################
+    # lookup table for source activation in slots
+    # when calculating the gate on the y axis...
+    # ... find the slot at the given index on the x axis
+    #
+    #       0   1   2   3   4   5   6   7   8   9   10  11  12  13
+    # gen                               gen por ret sub sur cat exp
+    # por                           gen por ret sub sur cat exp
+    # ret                       gen por ret sub sur cat exp
+    # sub                   gen por ret sub sur cat exp
+    # sur               gen por ret sub sur cat exp
+    # cat           gen por ret sub sur cat exp
+    # exp       gen por ret sub sur cat exp
+    #
+    # slots(x) holds the activation of the element at a distance of x - 7 for every element. the columns are
+    # slices of the activation vector, padded with 7 elements ( wrapping around ) at both ends, so that
+    # shifting the activation vector doesn't need a rolled copy or a strided matrix per step
+
+    padded = T.concatenate([nodefunctions[-7:], nodefunctions, nodefunctions[:7]])
+
+    def slots(x):
+        return padded[x:x + nodefunctions.shape[0]]
+
+    ### gen plumbing
+    pipe_gen_sur_exp = slots(11) + slots(13)                                    # sum of sur and exp as default
+    pipe_gen = slots(7) * slots(10)                                             # gen * sub
+    pipe_gen = T.switch(abs(pipe_gen) > 0.1, pipe_gen, pipe_gen_sur_exp)        # drop to def. if below 0.1
+                                                                                # drop to def. if por == 0 and por slot is linked
+    pipe_gen = T.switch(T.eq(slots(8), 0) * T.eq(por_linked, 1), pipe_gen_sur_exp, pipe_gen)
+
+    ### por plumbing
+    pipe_por_cond = T.switch(T.eq(por_linked, 1), T.gt(slots(7), 0), 1)         # (if linked, por must be > 0)
+    pipe_por_cond = pipe_por_cond * T.gt(slots(9), 0)                           # and (sub > 0)
+
+    pipe_por = slots(10)                                                        # start with sur
+    pipe_por = pipe_por + T.gt(slots(6), 0.1)                                   # add gen-loop 1 if por > 0
+    pipe_por = pipe_por * pipe_por_cond                                         # apply conditions
+                                                                                # add por (for search) if sub=sur=0
+    pipe_por = pipe_por + (slots(7) * T.eq(slots(9), 0) * T.eq(slots(10), 0))
+
+    ### ret plumbing
+    pipe_ret = -slots(8) * T.ge(slots(6), 0)                                    # start with -sub if por >= 0
+                                                                                # add ret (for search) if sub=sur=0
+    pipe_ret = pipe_ret + (slots(7) * T.eq(slots(8), 0) * T.eq(slots(9), 0))
+
+    ### sub plumbing
+    pipe_sub_cond = T.switch(T.eq(por_linked, 1), T.gt(slots(5), 0), 1)         # (if linked, por must be > 0)
+    pipe_sub_cond = pipe_sub_cond * T.eq(slots(4), 0)                           # and (gen == 0)
+
+    pipe_sub = T.clip(slots(8), 0, 1)                                           # bubble: start with sur if sur > 0
+    pipe_sub = pipe_sub + slots(7)                                              # add sub
+    pipe_sub = pipe_sub + slots(9)                                              # add cat
+    pipe_sub = pipe_sub * pipe_sub_cond                                         # apply conditions
+
+    ### sur plumbing
+    pipe_sur_cond = T.switch(T.eq(por_linked, 1), T.gt(slots(4), 0), 1)         # (if linked, por must be > 0)
+                                                                                # and we aren't first in a script
+    pipe_sur_cond = pipe_sur_cond * T.switch(T.eq(ret_linked, 1), T.eq(por_linked, 1), 1)
+    pipe_sur_cond = pipe_sur_cond * T.ge(slots(5), 0)                           # and (ret >= 0)
+
+    pipe_sur = slots(7)                                                         # start with sur
+    pipe_sur = pipe_sur + T.gt(slots(3), 0.2)                                   # add gen-loop 1
+    pipe_sur = pipe_sur + slots(9)                                              # add exp
+    pipe_sur = pipe_sur * pipe_sur_cond                                         # apply conditions
+
+    ### cat plumbing
+    pipe_cat_cond = T.switch(T.eq(por_linked, 1), T.gt(slots(3), 0), 1)         # (if linked, por must be > 0)
+    pipe_cat_cond = pipe_cat_cond * T.eq(slots(2), 0)                           # and (gen == 0)
+
+    pipe_cat = T.clip(slots(6), 0, 1)                                           # bubble: start with sur if sur > 0
+    pipe_cat = pipe_cat + slots(5)                                              # add sub
+    pipe_cat = pipe_cat + slots(7)                                              # add cat
+    pipe_cat = pipe_cat * pipe_cat_cond                                         # apply conditions
+                                                                                # add cat (for search) if sub=sur=0
+    pipe_cat = pipe_cat + (slots(7) * T.eq(slots(5), 0) * T.eq(slots(6), 0))
+
+    ### exp plumbing
+    pipe_exp = slots(5)                                                         # start with sur
+    pipe_exp = pipe_exp + slots(7)                                              # add exp
+
+    if has['has_pipes']:
+        nodefunctions = T.switch(T.eq(inputs['n_function_selector'], NFPG_PIPE_GEN), pipe_gen, nodefunctions)
+        nodefunctions = T.switch(T.eq(inputs['n_function_selector'], NFPG_PIPE_POR), pipe_por, nodefunctions)
+        nodefunctions = T.switch(T.eq(inputs['n_function_selector'], NFPG_PIPE_RET), pipe_ret, nodefunctions)
+        nodefunctions = T.switch(T.eq(inputs['n_function_selector'], NFPG_PIPE_SUB), pipe_sub, nodefunctions)
+        nodefunctions = T.switch(T.eq(inputs['n_function_selector'], NFPG_PIPE_SUR), pipe_sur, nodefunctions)
+        nodefunctions = T.switch(T.eq(inputs['n_function_selector'], NFPG_PIPE_CAT), pipe_cat, nodefunctions)
+        nodefunctions = T.switch(T.eq(inputs['n_function_selector'], NFPG_PIPE_EXP), pipe_exp, nodefunctions)
+
+    # gate logic
+
+    # multiply with gate factor for the node space
+    if has['has_directional_activators']:
+        nodefunctions = nodefunctions * inputs['g_factor']
+
+    # apply actual gate functions
+    gate_function_output = nodefunctions
+
+    # apply GATE_FUNCTION_ABS to masked gates
+    if has['has_gatefunction_absolute']:
+        gate_function_output = T.switch(T.eq(inputs['g_function_selector'], GATE_FUNCTION_ABSOLUTE), abs(gate_function_output), gate_function_output)
+    # apply GATE_FUNCTION_SIGMOID to masked gates
+    if has['has_gatefunction_sigmoid']:
+        gate_function_output = T.switch(T.eq(inputs['g_function_selector'], GATE_FUNCTION_SIGMOID), N.sigmoid(gate_function_output + inputs['g_theta']), gate_function_output)
+    # apply GATE_FUNCTION_TANH to masked gates
+    if has['has_gatefunction_tanh']:
+        gate_function_output = T.switch(T.eq(inputs['g_function_selector'], GATE_FUNCTION_TANH), T.tanh(gate_function_output - inputs['g_theta']), gate_function_output)
+    # apply GATE_FUNCTION_RECT to masked gates
+    if has['has_gatefunction_rect']:
+        gate_function_output = T.switch(T.eq(inputs['g_function_selector'], GATE_FUNCTION_RECT), T.switch(gate_function_output - inputs['g_theta'] >0, gate_function_output - inputs['g_theta'], 0), gate_function_output)
+    # apply GATE_FUNCTION_DIST to masked gates
+    if has['has_gatefunction_one_over_x']:
+        gate_function_output = T.switch(T.eq(inputs['g_function_selector'], GATE_FUNCTION_DIST), T.switch(T.neq(0, gate_function_output), 1/gate_function_output, 0), gate_function_output)
+
+    # apply threshold
+    thresholded_gate_function_output = \
+        T.switch(T.ge(gate_function_output, inputs['g_threshold']), gate_function_output, 0)
+
+    # apply amplification
+    amplified_gate_function_output = thresholded_gate_function_output * inputs['g_amplification']
+
+    # apply minimum and maximum
+    limited_gate_function_output = T.clip(amplified_gate_function_output, inputs['g_min'], inputs['g_max'])
+
+    return limited_gate_function_output
+
+
+class NodespaceActivity(object):
+    """
+        Skips the nodespaces that are dormant in a step.
+
+        A nodespace is dormant if all of its elements had zero activation in the last step, no active element links
+        to it, it holds no sensors or actuators, and all of its gates are zero for zero input. The slots and gates of
+        dormant nodespaces stay zero, so propagation only needs the columns of the active elements, and calculate
+        only the elements of the nodespaces that aren't dormant. As long as most of the nodenet is active, both run
+        on the whole nodenet instead.
+    """
+
+    # largest share of active elements for which propagation skips the others
+    max_active_share = 0.25
+    # largest share of live elements for which calculate skips the others
+    max_live_share = 0.5
+
+    def __init__(self):
+        self.w_version = None
+        self.columns = None
+        self.resting_key = None
+        self.always_live = None
+        self.live = None
+        self.elements = None
+        self.a_version = None
+
+    def get_columns(self, nodenet, w):
+        """Returns the weight matrix in a format that is fast to slice by columns"""
+        version = nodenet.w.version
+        if version != self.w_version:
+            self.columns = w.tocsc() if sp.issparse(w) else w
+            self.w_version = version
+        return self.columns
+
+    def get_always_live(self, nodenet, calculate_function):
+        """
+        Returns which nodespaces have to be calculated every step: the ones holding sensors or actuators,
+        and the ones with gates that aren't zero for zero input
+        """
+        element_nodespaces, nodespace_elements = nodenet.get_nodespace_elements()
+        key = (nodenet.nodespace_elements_version,) + \
+            tuple(getattr(nodenet, name).version for name in CALCULATE_INPUTS if name not in ('a', 'g_factor'))
+        if key != self.resting_key:
+            inputs = [getattr(nodenet, name).get_value(borrow=True) for name in CALCULATE_INPUTS]
+            inputs[CALCULATE_INPUTS.index('a')] = np.zeros_like(inputs[0])
+            inputs[CALCULATE_INPUTS.index('g_factor')] = np.ones_like(inputs[0])
+            resting = calculate_function(*inputs)
+            always_live = np.zeros(nodenet.NoNS, dtype=bool)
+            always_live[element_nodespaces[resting != 0]] = True
+            bound = np.in1d(nodenet.allocated_nodes, (tnode.SENSOR, tnode.ACTUATOR))
+            always_live[nodenet.allocated_node_parents[bound]] = True
+            self.always_live = always_live
+            self.resting_key = key
+        return self.always_live
+
+    def propagate(self, nodenet, w, a):
+        """
+        Returns the slot activations, propagated from the active elements only, and notes the nodespaces that
+        aren't dormant in this step. Returns None if too many elements are active.
+        """
+        self.live = None
+        if self.elements is not None and nodenet.a.version == self.a_version:
+            # only the elements calculated in the last step can be active
+            active = self.elements[a[self.elements] != 0]
+        else:
+            active = np.flatnonzero(a)
+        if len(active) > self.max_active_share * len(a):
+            return None
+        columns = self.get_columns(nodenet, w)
+        if sp.issparse(columns):
+            # gather the entries of the active columns straight from the CSC arrays, slicing is a lot slower
+            starts = columns.indptr[active]
+            lengths = columns.indptr[active + 1] - starts
+            entries = np.arange(lengths.sum()) + np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+            targets = columns.indices[entries]
+            weighted = columns.data[entries] * np.repeat(a[active], lengths)
+            slots = np.bincount(targets, weights=weighted, minlength=len(a)).astype(a.dtype)
+        else:
+            columns = columns[:, active]
+            slots = np.dot(columns, a[active])
+            targets = np.flatnonzero(columns.any(axis=1))
+
+        element_nodespaces, nodespace_elements = nodenet.get_nodespace_elements()
+        self.live = np.zeros(nodenet.NoNS, dtype=bool)
+        self.live[element_nodespaces[active]] = True
+        self.live[element_nodespaces[targets]] = True
+        return slots
+
+    def get_live_elements(self, nodenet, calculate_function):
+        """
+        Returns the elements to calculate in this step, or None if the whole nodenet has to be calculated
+        """
+        self.elements = None
+        if self.live is None:
+            return None
+        live = self.live | self.get_always_live(nodenet, calculate_function)
+        # the elements of no node ( nodespace 0 ) stay zero, but for element 0, holding the factor for gates
+        # without activators
+        live[0] = False
+        element_nodespaces, nodespace_elements = nodenet.get_nodespace_elements()
+        elements = [np.zeros(1, dtype=nodespace_elements[0].dtype)]
+        elements.extend(nodespace_elements[id] for id in np.flatnonzero(live))
+        if sum(len(part) for part in elements) > self.max_live_share * nodenet.NoE:
+            return None
+        self.elements = np.concatenate(elements)
+        return self.elements
+
+    def set_calculated(self, nodenet):
+        """
+        Notes that the activations were calculated for the elements returned by get_live_elements only, and all
+        others are zero until the activations are set otherwise
+        """
+        self.a_version = nodenet.a.version
+
+    def set_stepped(self):
+        """
+        Notes that steps ran on the whole nodenet, without get_live_elements, as TheanoNodenet.step_many runs them
+        """
+        self.elements = None
+
 
 class TheanoPropagate(Propagate):
     """
@@ -36,16 +607,29 @@ class TheanoPropagate(Propagate):
 
     """
 
-    propagate = None
+    propagate_function = None
+    variables = ()
 
     def __init__(self, nodenet):
-        if nodenet.sparse:
-            self.propagate = theano.function([], None, updates={nodenet.a: ST.dot(nodenet.w, nodenet.a)})
-        else:
-            self.propagate = theano.function([], None, updates={nodenet.a: T.dot(nodenet.w, nodenet.a)})
+        self.bind(nodenet)
+
+    def bind(self, nodenet):
+        self.propagate_function = bind_theano_function(get_propagate_function(nodenet.sparse, nodenet.floatX), nodenet)
+        self.variables = (nodenet.w, nodenet.a)
 
     def execute(self, nodenet, nodes, netapi):
-        self.propagate()
+        # loading replaces the shared variables of the nodenet
+        if nodenet.w is not self.variables[0] or nodenet.a is not self.variables[1]:
+            self.bind(nodenet)
+        slots = None
+        if nodenet.nodespace_activity is not None:
+            slots = nodenet.nodespace_activity.propagate(nodenet,
+                                                         nodenet.w.get_value(borrow=True, return_internal_type=True),
+                                                         nodenet.a.get_value(borrow=True, return_internal_type=True))
+        if slots is None:
+            self.propagate_function()
+        else:
+            nodenet.a.set_value(slots, borrow=True)
 
 
 class TheanoCalculate(Calculate):
@@ -58,159 +642,141 @@ class TheanoCalculate(Calculate):
 
     worldadapter = None
     nodenet = None
-    calculate = None
+    calculate_function = None
+    calculate_features = None
+    calculate_inputs = ()
+    calculate_variables = ()
+    element_calculate_function = None
+    step_many_function = None
+    native_module_gate_activations = None
+
+    # data source values given to TheanoNodenet.step_many, read instead of the world adapter's
+    datasource_values = None
+    # data target values collected for TheanoNodenet.step_many, instead of writing them to the world adapter
+    datatarget_values = None
 
     def __init__(self, nodenet):
         self.nodenet = nodenet
         self.worldadapter = nodenet.world
+        # the values of the CALCULATE_INPUTS for the live elements, by name, see gather_inputs
+        self.gather_buffers = {}
 
     def compile_theano_functions(self, nodenet):
-        slots = nodenet.a_shifted
-        por_linked = nodenet.n_node_porlinked
-        ret_linked = nodenet.n_node_retlinked
-
-        # node functions implemented with identity by default (native modules are calculated by python)
-        nodefunctions = nodenet.a
-
-        # pipe logic
-
-        ###############################################################
-        # lookup table for source activation in a_shifted
-        # when calculating the gate on the y axis...
-        # ... find the slot at the given index on the x axis
-        #
-        #       0   1   2   3   4   5   6   7   8   9   10  11  12  13
-        # gen                               gen por ret sub sur cat exp
-        # por                           gen por ret sub sur cat exp
-        # ret                       gen por ret sub sur cat exp
-        # sub                   gen por ret sub sur cat exp
-        # sur               gen por ret sub sur cat exp
-        # cat           gen por ret sub sur cat exp
-        # exp       gen por ret sub sur cat exp
-        #
-
-        ### gen plumbing
-        pipe_gen_sur_exp = slots[:, 11] + slots[:, 13]                              # sum of sur and exp as default
-        pipe_gen = slots[:, 7] * slots[:, 10]                                       # gen * sub
-        pipe_gen = T.switch(abs(pipe_gen) > 0.1, pipe_gen, pipe_gen_sur_exp)        # drop to def. if below 0.1
-                                                                                    # drop to def. if por == 0 and por slot is linked
-        pipe_gen = T.switch(T.eq(slots[:, 8], 0) * T.eq(por_linked, 1), pipe_gen_sur_exp, pipe_gen)
-
-        ### por plumbing
-        pipe_por_cond = T.switch(T.eq(por_linked, 1), T.gt(slots[:, 7], 0), 1)      # (if linked, por must be > 0)
-        pipe_por_cond = pipe_por_cond * T.gt(slots[:, 9], 0)                        # and (sub > 0)
-
-        pipe_por = slots[:, 10]                                                     # start with sur
-        pipe_por = pipe_por + T.gt(slots[:, 6], 0.1)                                # add gen-loop 1 if por > 0
-        pipe_por = pipe_por * pipe_por_cond                                         # apply conditions
-                                                                                    # add por (for search) if sub=sur=0
-        pipe_por = pipe_por + (slots[:, 7] * T.eq(slots[:, 9], 0) * T.eq(slots[:, 10], 0))
-
-        ### ret plumbing
-        pipe_ret = -slots[:, 8] * T.ge(slots[:, 6], 0)                              # start with -sub if por >= 0
-                                                                                    # add ret (for search) if sub=sur=0
-        pipe_ret = pipe_ret + (slots[:, 7] * T.eq(slots[:, 8], 0) * T.eq(slots[:, 9], 0))
-
-        ### sub plumbing
-        pipe_sub_cond = T.switch(T.eq(por_linked, 1), T.gt(slots[:, 5], 0), 1)      # (if linked, por must be > 0)
-        pipe_sub_cond = pipe_sub_cond * T.eq(slots[:, 4], 0)                        # and (gen == 0)
-
-        pipe_sub = T.clip(slots[:, 8], 0, 1)                                        # bubble: start with sur if sur > 0
-        pipe_sub = pipe_sub + slots[:, 7]                                           # add sub
-        pipe_sub = pipe_sub + slots[:, 9]                                           # add cat
-        pipe_sub = pipe_sub * pipe_sub_cond                                         # apply conditions
-
-        ### sur plumbing
-        pipe_sur_cond = T.switch(T.eq(por_linked, 1), T.gt(slots[:, 4], 0), 1)      # (if linked, por must be > 0)
-                                                                                    # and we aren't first in a script
-        pipe_sur_cond = pipe_sur_cond * T.switch(T.eq(ret_linked, 1), T.eq(por_linked, 1), 1)
-        pipe_sur_cond = pipe_sur_cond * T.ge(slots[:, 5], 0)                        # and (ret >= 0)
-
-        pipe_sur = slots[:, 7]                                                      # start with sur
-        pipe_sur = pipe_sur + T.gt(slots[:, 3], 0.2)                                # add gen-loop 1
-        pipe_sur = pipe_sur + slots[:, 9]                                           # add exp
-        pipe_sur = pipe_sur * pipe_sur_cond                                         # apply conditions
-
-        ### cat plumbing
-        pipe_cat_cond = T.switch(T.eq(por_linked, 1), T.gt(slots[:, 3], 0), 1)      # (if linked, por must be > 0)
-        pipe_cat_cond = pipe_cat_cond * T.eq(slots[:, 2], 0)                        # and (gen == 0)
-
-        pipe_cat = T.clip(slots[:, 6], 0, 1)                                        # bubble: start with sur if sur > 0
-        pipe_cat = pipe_cat + slots[:, 5]                                           # add sub
-        pipe_cat = pipe_cat + slots[:, 7]                                           # add cat
-        pipe_cat = pipe_cat * pipe_cat_cond                                         # apply conditions
-                                                                                    # add cat (for search) if sub=sur=0
-        pipe_cat = pipe_cat + (slots[:, 7] * T.eq(slots[:, 5], 0) * T.eq(slots[:, 6], 0))
-
-        ### exp plumbing
-        pipe_exp = slots[:, 5]                                                      # start with sur
-        pipe_exp = pipe_exp + slots[:, 7]                                           # add exp
-
-        if nodenet.has_pipes:
-            nodefunctions = T.switch(T.eq(nodenet.n_function_selector, NFPG_PIPE_GEN), pipe_gen, nodefunctions)
-            nodefunctions = T.switch(T.eq(nodenet.n_function_selector, NFPG_PIPE_POR), pipe_por, nodefunctions)
-            nodefunctions = T.switch(T.eq(nodenet.n_function_selector, NFPG_PIPE_RET), pipe_ret, nodefunctions)
-            nodefunctions = T.switch(T.eq(nodenet.n_function_selector, NFPG_PIPE_SUB), pipe_sub, nodefunctions)
-            nodefunctions = T.switch(T.eq(nodenet.n_function_selector, NFPG_PIPE_SUR), pipe_sur, nodefunctions)
-            nodefunctions = T.switch(T.eq(nodenet.n_function_selector, NFPG_PIPE_CAT), pipe_cat, nodefunctions)
-            nodefunctions = T.switch(T.eq(nodenet.n_function_selector, NFPG_PIPE_EXP), pipe_exp, nodefunctions)
-
-        # gate logic
-
-        # multiply with gate factor for the node space
-        if nodenet.has_directional_activators:
-            nodefunctions = nodefunctions * nodenet.g_factor
-
-        # apply actual gate functions
-        gate_function_output = nodefunctions
-
-        # apply GATE_FUNCTION_ABS to masked gates
-        if nodenet.has_gatefunction_absolute:
-            gate_function_output = T.switch(T.eq(nodenet.g_function_selector, GATE_FUNCTION_ABSOLUTE), abs(gate_function_output), gate_function_output)
-        # apply GATE_FUNCTION_SIGMOID to masked gates
-        if nodenet.has_gatefunction_sigmoid:
-            gate_function_output = T.switch(T.eq(nodenet.g_function_selector, GATE_FUNCTION_SIGMOID), N.sigmoid(gate_function_output + nodenet.g_theta), gate_function_output)
-        # apply GATE_FUNCTION_TANH to masked gates
-        if nodenet.has_gatefunction_tanh:
-            gate_function_output = T.switch(T.eq(nodenet.g_function_selector, GATE_FUNCTION_TANH), T.tanh(gate_function_output - nodenet.g_theta), gate_function_output)
-        # apply GATE_FUNCTION_RECT to masked gates
-        if nodenet.has_gatefunction_rect:
-            gate_function_output = T.switch(T.eq(nodenet.g_function_selector, GATE_FUNCTION_RECT), T.switch(gate_function_output - nodenet.g_theta >0, gate_function_output - nodenet.g_theta, 0), gate_function_output)
-        # apply GATE_FUNCTION_DIST to masked gates
-        if nodenet.has_gatefunction_one_over_x:
-            gate_function_output = T.switch(T.eq(nodenet.g_function_selector, GATE_FUNCTION_DIST), T.switch(T.neq(0, gate_function_output), 1/gate_function_output, 0), gate_function_output)
-
-        # apply threshold
-        thresholded_gate_function_output = \
-            T.switch(T.ge(gate_function_output, nodenet.g_threshold), gate_function_output, 0)
-
-        # apply amplification
-        amplified_gate_function_output = thresholded_gate_function_output * nodenet.g_amplification
-
-        # apply minimum and maximum
-        limited_gate_function_output = T.clip(amplified_gate_function_output, nodenet.g_min, nodenet.g_max)
-
-        gatefunctions = limited_gate_function_output
-
-        # put the theano graph into a callable function to be executed
-        self.calculate = theano.function([], None, updates={nodenet.a: gatefunctions})
-
+        # compact gate parameters are no shared variables, and are passed to the calculate function in every step
+        inputs = tuple(name for name in CALCULATE_INPUTS if not isinstance(getattr(nodenet, name), theano.compile.SharedVariable))
+        features = get_calculate_features(nodenet)
+        if not is_theano_function_compiled(get_calculate_key(features, nodenet.floatX, inputs)) and \
+                is_theano_function_compiled(get_calculate_key(ALL_FEATURES, nodenet.floatX, inputs)):
+            # don't wait for compilation, if the function for all features was precompiled
+            features = ALL_FEATURES
+        self.calculate_function = bind_theano_function(get_calculate_function(features, nodenet.floatX, inputs), nodenet)
+        self.calculate_features = features
+        self.calculate_inputs = inputs
+        self.calculate_variables = tuple(getattr(nodenet, name) for name in CALCULATE_INPUTS)
+        self.element_calculate_function = None
+        self.step_many_function = None
+
+    def is_bound(self, nodenet):
+        """
+        Returns whether the calculate function reads the current variables of the nodenet, which loading replaces
+        """
+        return all(getattr(nodenet, name) is variable for name, variable in zip(CALCULATE_INPUTS, self.calculate_variables))
+
+    def get_ensemble_functions(self, nodenet):
+        """
+        Returns the propagate and calculate functions for ensembles of the nodenet, see TheanoEnsemble
+        """
+        return (get_ensemble_propagate_function(nodenet.sparse, nodenet.floatX),
+                get_ensemble_calculate_function(get_calculate_features(nodenet), nodenet.floatX))
+
+    def step_many(self, inputs):
+        """
+        Runs propagate and calculate for every row of the data source values, given a dict of the STEP_MANY_INPUTS.
+        Returns the matrix of the values the actuators wrote in every step, see compile_step_many_function
+        """
+        nodenet = self.nodenet
+        if self.step_many_function is None:
+            compiled = get_step_many_function(get_calculate_features(nodenet), nodenet.sparse, nodenet.floatX,
+                                              self.calculate_inputs)
+            self.step_many_function = bind_theano_function(compiled, nodenet)
+        return self.step_many_function(*([inputs[name] for name in STEP_MANY_INPUTS] +
+                                         [getattr(nodenet, name).get_value(borrow=True) for name in self.calculate_inputs]))[0]
+
+    def get_element_calculate_function(self):
+        """
+        Returns a function calculating some of the elements of the nodenet, that takes the values of all
+        CALCULATE_INPUTS for these elements, and returns their activations
+        """
+        if self.element_calculate_function is None:
+            self.element_calculate_function = get_element_calculate_function(self.calculate_features,
+                                                                             self.nodenet.floatX)
+        return self.element_calculate_function
+
+    def calculate_all(self):
+        nodenet = self.nodenet
+        self.calculate_function(*[getattr(nodenet, name).get_value(borrow=True) for name in self.calculate_inputs])
+
+    def gather_inputs(self, elements):
+        """
+        Returns the values of all CALCULATE_INPUTS for the given elements, gathered into buffers that are kept from
+        step to step, and only reallocated when they grow
+        """
+        nodenet = self.nodenet
+        inputs = []
+        for name in CALCULATE_INPUTS:
+            values = getattr(nodenet, name).get_value(borrow=True)
+            buffer = self.gather_buffers.get(name)
+            if buffer is None or len(buffer) < len(elements) or buffer.dtype != values.dtype:
+                buffer = np.empty(min(len(values), 2 * len(elements)), dtype=values.dtype)
+                self.gather_buffers[name] = buffer
+            # the elements are valid, and clipping doesn't buffer the output as raising does
+            inputs.append(np.take(values, elements, out=buffer[:len(elements)], mode='clip'))
+        return inputs
+
+    def calculate(self):
+        """
+        Calculates the nodespaces that aren't dormant, or all of them, see NodespaceActivity
+        """
+        nodenet = self.nodenet
+        activity = nodenet.nodespace_activity
+        live_elements = None
+        if activity is not None:
+            live_elements = activity.get_live_elements(nodenet, self.get_element_calculate_function())
+        if live_elements is None:
+            self.calculate_all()
+            return
+        inputs = self.gather_inputs(live_elements)
+        a = np.zeros(nodenet.NoE, dtype=inputs[0].dtype)
+        a[live_elements] = self.get_element_calculate_function()(*inputs)
+        nodenet.a.set_value(a, borrow=True)
+        activity.set_calculated(nodenet)
 
     def read_sensors_and_actuator_feedback(self):
+        if self.datasource_values is not None:
+            self.nodenet.set_sensors_and_actuator_feedback_to_values(self.datasource_values, {})
+            return
         if self.worldadapter is None:
             return
 
+        # only read the data sources and targets that sensors and actuators are bound to
         datasource_to_value_map = {}
-        for datasource in self.worldadapter.get_available_datasources(self.nodenet.uid):
-            datasource_to_value_map[datasource] = self.worldadapter.get_datasource(self.nodenet.uid, datasource)
+        available_datasources = set(self.worldadapter.get_available_datasources(self.nodenet.uid))
+        for datasource in self.nodenet.get_sensor_index()[0]:
+            if datasource in available_datasources:
+                datasource_to_value_map[datasource] = self.worldadapter.get_datasource(self.nodenet.uid, datasource)
 
         datatarget_to_value_map = {}
-        for datatarget in self.worldadapter.get_available_datatargets(self.nodenet.uid):
-            datatarget_to_value_map[datatarget] = self.worldadapter.get_datatarget_feedback(self.nodenet.uid, datatarget)
+        available_datatargets = set(self.worldadapter.get_available_datatargets(self.nodenet.uid))
+        for datatarget in self.nodenet.get_actuator_index()[0]:
+            if datatarget in available_datatargets:
+                datatarget_to_value_map[datatarget] = self.worldadapter.get_datatarget_feedback(self.nodenet.uid, datatarget)
 
         self.nodenet.set_sensors_and_actuator_feedback_to_values(datasource_to_value_map, datatarget_to_value_map)
 
     def write_actuators(self):
+        if self.datatarget_values is not None:
+            self.datatarget_values.update(self.nodenet.read_actuators())
+            return
         if self.worldadapter is None:
             return
 
@@ -219,12 +785,46 @@ class TheanoCalculate(Calculate):
             self.worldadapter.add_to_datatarget(self.nodenet.uid, datatarget, values_to_write[datatarget])
 
     def take_native_module_slot_snapshots(self):
-        for uid, instance in self.nodenet.native_module_instances.items():
-            instance.take_slot_activation_snapshot()
+        instances, elements = self.nodenet.get_native_module_index()
+        if len(elements) == 0:
+            return
+        a = self.nodenet.a.get_value(borrow=True, return_internal_type=True)
+        np.take(a, elements, out=self.nodenet.native_module_slot_activations)
 
     def calculate_native_modules(self):
-        for uid, instance in self.nodenet.native_module_instances.items():
-            instance.node_function()
+        instances, elements = self.nodenet.get_native_module_index()
+        if len(elements) == 0:
+            return
+
+        # node functions write the gates of native modules into a gathered copy, scattered back when all are done
+        a = self.nodenet.a.get_value(borrow=True, return_internal_type=True)
+        if self.native_module_gate_activations is None or self.native_module_gate_activations.shape != elements.shape:
+            self.native_module_gate_activations = np.empty(elements.shape, dtype=a.dtype)
+        np.take(a, elements, out=self.native_module_gate_activations)
+        self.nodenet.native_module_gate_activations = self.native_module_gate_activations
+        try:
+            for instance in instances:
+                # node functions may delete native modules
+                if self.nodenet.native_module_instances.get(instance.uid) is instance:
+                    instance.node_function()
+        finally:
+            self.nodenet.native_module_gate_activations = None
+
+        # the elements of native modules deleted by node functions may belong to nodes created since,
+        # their gates are not written back
+        gate_activations = self.native_module_gate_activations
+        alive = [self.nodenet.native_module_instances.get(instance.uid) is instance for instance in instances]
+        if not all(alive):
+            positions = [instance.native_module_position for instance in instances] + [len(elements)]
+            written = np.ones(len(elements), dtype=bool)
+            for index in np.flatnonzero(np.logical_not(alive)):
+                written[positions[index]:positions[index + 1]] = False
+            elements = elements[written]
+            gate_activations = gate_activations[written]
+
+        a = self.nodenet.a.get_value(borrow=True, return_internal_type=True)
+        a[elements] = gate_activations
+        self.nodenet.a.set_value(a, borrow=True)
 
     def calculate_g_factors(self):
         a = self.nodenet.a.get_value(borrow=True, return_internal_type=True)
@@ -234,15 +834,13 @@ class TheanoCalculate(Calculate):
 
     def execute(self, nodenet, nodes, netapi):
 
-        if nodenet.has_new_usages:
+        if nodenet.has_new_usages or self.calculate_function is None or not self.is_bound(nodenet):
             self.compile_theano_functions(nodenet)
             nodenet.has_new_usages = False
 
         self.take_native_module_slot_snapshots()
         self.write_actuators()
         self.read_sensors_and_actuator_feedback()
-        if nodenet.has_pipes:
-            self.nodenet.rebuild_shifted()
         if nodenet.has_directional_activators:
             self.calculate_g_factors()
         self.calculate()
@@ -8,11 +8,12 @@ maintains a set of users, worlds (up to one per user), and nodenets, and provide
 
 from micropsi_core._runtime_api_world import *
 from micropsi_core._runtime_api_monitors import *
+from micropsi_core._runtime_api_push import *
 
 __author__ = 'joscha'
 __date__ = '10.05.12'
 
-from configuration import RESOURCE_PATH, SERVER_SETTINGS_PATH, LOGGING
+from configuration import RESOURCE_PATH, SERVER_SETTINGS_PATH, LOGGING, config as settings
 
 from micropsi_core.nodenet.node import Node, Nodetype
 from micropsi_core.nodenet.nodenet import Nodenet
@@ -103,6 +104,7 @@ class MicropsiRunner(threading.Thread):
                     try:
                         nodenets[uid].step()
                         nodenets[uid].update_monitors()
+                        publish_step(uid)
                     except:
                         nodenets[uid].is_active = False
                         logging.getLogger("nodenet").error("Exception in NodenetRunner:", exc_info=1)
@@ -259,6 +261,12 @@ def load_nodenet(nodenet_uid):
                     name=data.name, worldadapter=worldadapter,
                     world=world, owner=data.owner, uid=data.uid,
                     native_modules=filter_native_modules(engine))
+            elif engine == 'numpy_engine':
+                from micropsi_core.nodenet.numpy_engine.numpy_nodenet import NumpyNodenet
+                nodenets[nodenet_uid] = NumpyNodenet(
+                    name=data.name, worldadapter=worldadapter,
+                    world=world, owner=data.owner, uid=data.uid,
+                    native_modules=filter_native_modules(engine))
             # Add additional engine types here
             else:
                 nodenet_lock.release()
@@ -312,6 +320,7 @@ def unload_nodenet(nodenet_uid):
     if nodenets[nodenet_uid].world:
         nodenets[nodenet_uid].world.unregister_nodenet(nodenet_uid)
     del nodenets[nodenet_uid]
+    close_push_channel(nodenet_uid)
     return True
 
 
@@ -445,6 +454,7 @@ def step_nodenet(nodenet_uid):
     """
     nodenets[nodenet_uid].step()
     nodenets[nodenet_uid].update_monitors()
+    publish_step(nodenet_uid)
     if nodenets[nodenet_uid].world and nodenets[nodenet_uid].current_step % configs['runner_factor'] == 0:
         nodenets[nodenet_uid].world.step()
     return nodenets[nodenet_uid].current_step
@@ -971,9 +981,13 @@ def run_recipe(nodenet_uid, name, parameters):
 # --- end of API
 
 def filter_native_modules(engine=None):
+    # the numpy engine runs the native modules written for the theano engine
+    engines = [engine]
+    if engine == 'numpy_engine':
+        engines.append('theano_engine')
     data = {}
     for key in native_modules:
-        if native_modules[key].get('engine') is None or engine is None or engine == native_modules[key]['engine']:
+        if native_modules[key].get('engine') is None or engine is None or native_modules[key]['engine'] in engines:
             data[key] = native_modules[key].copy()
     return data
 
@@ -1114,6 +1128,11 @@ load_definitions()
 init_worlds(world_data)
 load_user_files()
 
+# optionally compile the theano step functions in the background, so that theano nodenets don't have to wait for it
+if settings.has_option('theano', 'precompile_functions') and settings['theano']['precompile_functions'] == "True":
+    from micropsi_core.nodenet.theano_engine.theano_nodenet import precompile_step_functions
+    precompile_step_functions()
+
 # initialize runners
 # Initialize the threads for the continuous simulation of nodenets and worlds
 if 'runner_timestep' not in configs:
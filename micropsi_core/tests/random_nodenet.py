@@ -0,0 +1,70 @@
+"""
+Builders of random node nets for the engine tests, and helpers to compare them
+"""
+
+import random
+
+
+def create_random_nodes(netapi, rand, nodetypes, nodespaces, number_of_nodes, first=0):
+    """
+    Creates nodes of random types, named n<first>, n<first + 1> ..., spread over the given nodespace uids in turn
+    """
+    return [netapi.create_node(rand.choice(nodetypes), nodespaces[i % len(nodespaces)], "n%d" % (first + i))
+            for i in range(number_of_nodes)]
+
+
+def link_randomly(netapi, rand, nodes, number_of_links):
+    """
+    Links random gates of the given nodes to random slots of them, with random weights
+    """
+    for i in range(number_of_links):
+        source, target = rand.choice(nodes), rand.choice(nodes)
+        netapi.link(source, rand.choice(source.get_gate_types()), target, rand.choice(target.get_slot_types()),
+                    rand.uniform(-1, 1))
+
+
+def build_random_nodenet(nodenet, nodetypes, nodespaces, number_of_nodes, number_of_links, seed=42):
+    """
+    Fills the given nodenet with randomly typed and linked nodes, the first of them with different gate functions
+    and gate parameters, and the first five with a random activation.
+    Returns the nodes and the random generator, to go on building with.
+    """
+    netapi = nodenet.netapi
+    rand = random.Random(seed)
+    nodes = create_random_nodes(netapi, rand, nodetypes, nodespaces, number_of_nodes)
+    nodes[0].set_gatefunction_name("gen", "absolute")
+    nodes[1].set_gatefunction_name("gen", "sigmoid")
+    nodes[2].set_gate_parameter("gen", "threshold", 0.2)
+    nodes[3].set_gate_parameter("gen", "amplification", 1.5)
+    link_randomly(netapi, rand, nodes, number_of_links)
+    for node in nodes[:5]:
+        node.activation = rand.uniform(-1, 1)
+    return nodes, rand
+
+
+def add_activator(netapi, nodes, nodespace, activator_type):
+    """
+    Adds an activator of the given type to the given nodespace uid, driven by the fifth of the given nodes
+    """
+    activator = netapi.create_node("Activator", nodespace, "Activator")
+    activator.set_parameter("type", activator_type)
+    netapi.link(nodes[4], "gen", activator, "gen", 0.5)
+    return activator
+
+
+def get_activations(nodenet):
+    """
+    Returns the activations of all nodes of the nodenet, with those of their gates and slots, by node name
+    """
+    activations = {}
+    for uid in nodenet.get_node_uids():
+        node = nodenet.get_node(uid)
+        activations[node.name] = (
+            node.activation,
+            dict((gate_type, node.get_gate(gate_type).activation) for gate_type in node.get_gate_types()),
+            dict((slot_type, node.get_slot(slot_type).activation) for slot_type in node.get_slot_types()))
+    return activations
+
+
+def get_node_by_name(netapi, name):
+    return [node for node in netapi.get_nodes(node_name_prefix=name) if node.name == name][0]
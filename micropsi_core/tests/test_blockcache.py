@@ -0,0 +1,122 @@
+#!/usr/local/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the block cache of the minecraft world
+"""
+
+import numpy as np
+from micropsi_core.world.minecraft.blockcache import BlockCache, CHUNK_SIZE
+
+
+class FakeBlockData(object):
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeChunk(object):
+    def __init__(self, data):
+        self.block_data = FakeBlockData(data)
+
+
+class FakeColumn(object):
+    def __init__(self, sections):
+        self.chunks = [None] * 16
+        for index, block_types in sections.items():
+            self.chunks[index] = FakeChunk([block_type << 4 for block_type in block_types])
+
+
+class FakeWorld(object):
+    """Holds chunk columns the way spock's world does, and lets a test run code while the world changes"""
+
+    def __init__(self):
+        self.columns = {}
+        self.while_changing = None
+
+    def changing(self):
+        if self.while_changing is not None:
+            self.while_changing()
+
+    def unpack_column(self, data):
+        self.changing()
+        self.columns[(data['chunk_x'], data['chunk_z'])] = FakeColumn(data['sections'])
+
+    def unpack_bulk(self, data):
+        self.changing()
+        for meta in data['metadata']:
+            self.columns[(meta['chunk_x'], meta['chunk_z'])] = FakeColumn(meta['sections'])
+
+    def set_block(self, x, y, z, block_id=None, meta=None, data=None):
+        self.changing()
+        chunk = self.columns[(x // CHUNK_SIZE, z // CHUNK_SIZE)].chunks[y // CHUNK_SIZE]
+        rx, ry, rz = x % CHUNK_SIZE, y % CHUNK_SIZE, z % CHUNK_SIZE
+        chunk.block_data.data[(ry * CHUNK_SIZE + rz) * CHUNK_SIZE + rx] = block_id << 4
+
+    def new_dimension(self, dimension):
+        self.columns = {}
+
+
+def section(seed):
+    return np.random.RandomState(seed).randint(0, 100, CHUNK_SIZE ** 3).tolist()
+
+
+def make_world():
+    world = FakeWorld()
+    cache = BlockCache(world)
+    world.unpack_column({'chunk_x': 0, 'chunk_z': 0, 'sections': {0: section(0), 1: section(1)}})
+    world.unpack_bulk({'metadata': [
+        {'chunk_x': -1, 'chunk_z': 0, 'sections': {0: section(2)}},
+        {'chunk_x': 0, 'chunk_z': -1, 'sections': {0: section(3)}}]})
+    return world, cache
+
+
+def get_block_type(world, x, y, z):
+    """Looks up a block in the fake world directly"""
+    column = world.columns.get((x // CHUNK_SIZE, z // CHUNK_SIZE))
+    if column is None or not 0 <= y < 256 or column.chunks[y // CHUNK_SIZE] is None:
+        return -1
+    rx, ry, rz = x % CHUNK_SIZE, y % CHUNK_SIZE, z % CHUNK_SIZE
+    return column.chunks[y // CHUNK_SIZE].block_data.data[(ry * CHUNK_SIZE + rz) * CHUNK_SIZE + rx] >> 4
+
+
+def test_lookups_match_the_world():
+    world, cache = make_world()
+    rand = np.random.RandomState(4)
+    x, y, z = rand.randint(-20, 20, 500), rand.randint(-4, 40, 500), rand.randint(-20, 20, 500)
+    expected = [get_block_type(world, *voxel) for voxel in zip(x.tolist(), y.tolist(), z.tolist())]
+    assert list(cache.get_block_types(x, y, z)) == expected
+    assert [cache.get_block_type(*voxel) for voxel in zip(x, y, z)] == expected
+    assert -1 in expected
+
+
+def test_single_block_changes_are_patched():
+    world, cache = make_world()
+    blocks, loaded = cache.get_column(0, 0)
+    world.set_block(3, 17, 5, block_id=42)
+    assert cache.get_block_type(3, 17, 5) == 42
+    # the column was patched, not rebuilt
+    assert cache.get_column(0, 0)[0] is blocks
+
+
+def test_new_chunks_replace_cached_columns():
+    world, cache = make_world()
+    assert cache.get_block_type(-3, 40, 2) == -1
+    world.unpack_column({'chunk_x': -1, 'chunk_z': 0, 'sections': {2: [7] * CHUNK_SIZE ** 3}})
+    assert cache.get_block_type(-3, 40, 2) == 7
+    assert cache.get_block_type(-3, 2, 2) == -1
+    world.new_dimension(0)
+    assert cache.get_block_type(-3, 40, 2) == -1
+
+
+def test_lookups_while_the_world_changes():
+    world, cache = make_world()
+    cache.get_column(0, 0)
+    # the micropsi thread looks up the changing column after spock received the packet, but before it applied it
+    world.while_changing = lambda: cache.get_block_types(np.array([3]), np.array([17]), np.array([5]))
+    world.unpack_column({'chunk_x': 0, 'chunk_z': 0, 'sections': {1: [9] * CHUNK_SIZE ** 3}})
+    assert cache.get_block_type(3, 17, 5) == 9
+    world.set_block(3, 17, 5, block_id=11)
+    assert cache.get_block_type(3, 17, 5) == 11
+    world.while_changing = None
+    world.set_block(4, 17, 5, block_id=12)
+    assert list(cache.get_block_types([3, 4], [17, 17], [5, 5])) == [11, 12]
@@ -0,0 +1,116 @@
+#!/usr/local/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the activity-driven stepping of the dict engine
+"""
+
+from micropsi_core.nodenet.dict_engine.dict_nodenet import DictNodenet
+from micropsi_core.tests.random_nodenet import add_activator, build_random_nodenet, get_activations, get_node_by_name
+
+
+def build_nodenet(activity_driven, seed=42, native_modules=None):
+    nodenet = DictNodenet(name="Activity", uid="activity_test_nodenet", native_modules=native_modules or {})
+    nodenet.activity_driven = activity_driven
+    netapi = nodenet.netapi
+    spaces = [netapi.create_node("Nodespace", "Root", "Space%d" % i).uid for i in range(3)]
+    # sparse links, so that most of the node net stays quiet
+    nodes, rand = build_random_nodenet(
+        nodenet, ["Register", "Concept", "Concept", "Pipe", "Pipe", "Script", "Trigger"], spaces + ["Root"], 60, 50,
+        seed)
+    nodes[1].parent_nodespace = spaces[0]
+    add_activator(netapi, nodes, spaces[0], "gen")
+    actor = netapi.create_node("Actor", spaces[1], "Actor")
+    actor.set_parameter("datatarget", "engine")
+    for source, target in zip(nodes[10:20], nodes[11:21]):
+        netapi.link_with_reciprocal(source, target, "porret") if source.type == target.type == "Pipe" else \
+            netapi.link(source, "gen", target, "gen", 0.9)
+    netapi.link(nodes[20], "gen", actor, "gen", 1)
+    return nodenet
+
+
+def step_both(nodenet, reference, steps):
+    for i in range(steps):
+        nodenet.step()
+        reference.step()
+        assert get_activations(nodenet) == get_activations(reference)
+
+
+def test_activity_driven_steps_equal_full_steps():
+    nodenet = build_nodenet(True)
+    reference = build_nodenet(False)
+    assert reference.get_activity() is None
+    step_both(nodenet, reference, 5)
+    activity = nodenet.get_activity()
+    assert activity.propagated
+    assert len(activity.frontier) < len(nodenet.get_node_uids()) / 2
+    for net in (nodenet, reference):
+        get_node_by_name(net.netapi, "n10").activation = 1
+    step_both(nodenet, reference, 15)
+
+
+def test_activity_driven_steps_follow_activations_set_between_steps():
+    nodenet = build_nodenet(True)
+    reference = build_nodenet(False)
+    step_both(nodenet, reference, 5)
+    for name in ("n30", "n41", "n55"):
+        get_node_by_name(nodenet.netapi, name).activation = 0.7
+        get_node_by_name(reference.netapi, name).activation = 0.7
+    step_both(nodenet, reference, 5)
+
+
+def test_activity_driven_steps_follow_structure_changes():
+    nodenet = build_nodenet(True)
+    reference = build_nodenet(False)
+    step_both(nodenet, reference, 3)
+    for net in (nodenet, reference):
+        net.netapi.link(get_node_by_name(net.netapi, "n1"), "gen", get_node_by_name(net.netapi, "n33"), "gen", 0.5)
+        get_node_by_name(net.netapi, "n2").set_gate_parameter("gen", "threshold", 0)
+    assert not nodenet.get_activity().valid
+    step_both(nodenet, reference, 3)
+    assert nodenet.get_activity().valid
+    for net in (nodenet, reference):
+        net.netapi.delete_node(get_node_by_name(net.netapi, "n11"))
+        get_node_by_name(net.netapi, "n12").get_gate("gen").get_links()[0].set_weight(-0.3)
+    step_both(nodenet, reference, 3)
+
+
+def test_activity_driven_steps_fall_back_for_sheaves():
+    nodenet = build_nodenet(True)
+    reference = build_nodenet(False)
+    step_both(nodenet, reference, 3)
+    for net in (nodenet, reference):
+        get_node_by_name(net.netapi, "n1").get_gate("gen").open_sheaf(1)
+    nodenet.step()
+    reference.step()
+    assert not nodenet.get_activity().propagated
+    assert get_activations(nodenet) == get_activations(reference)
+
+
+def test_activity_driven_steps_run_native_modules():
+    native_modules = {
+        "Poke": {"name": "Poke", "slottypes": ["gen"], "gatetypes": ["gen"]}
+    }
+
+    def poke(netapi, node=None, **_):
+        # native modules may set the activation of any node
+        if netapi.step % 3 == 0:
+            get_node_by_name(netapi, "n50").activation = 1
+
+    nodenets = []
+    for activity_driven in (True, False):
+        nodenet = build_nodenet(activity_driven, native_modules=native_modules)
+        nodenet.get_nodetype("Poke").nodefunction = poke
+        nodenet.netapi.create_node("Poke", "Root", "Poke")
+        nodenets.append(nodenet)
+    step_both(nodenets[0], nodenets[1], 10)
+
+
+def test_activity_driven_is_saved(tmpdir):
+    nodenet = build_nodenet(True)
+    filename = str(tmpdir.join("activity_test_nodenet.json"))
+    nodenet.save(filename)
+    loaded = DictNodenet(name="Activity", uid="activity_test_nodenet")
+    assert not loaded.activity_driven
+    loaded.load(filename)
+    assert loaded.activity_driven
@@ -0,0 +1,63 @@
+#!/usr/local/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the compiled propagation of the dict engine
+"""
+
+import pytest
+
+from micropsi_core.nodenet.dict_engine import dict_compiled
+from micropsi_core.nodenet.dict_engine.dict_nodenet import DictNodenet
+from micropsi_core.tests.random_nodenet import add_activator, build_random_nodenet, get_activations
+
+pytestmark = pytest.mark.skipif(not dict_compiled.is_available(), reason="numpy and scipy are not installed")
+
+
+def build_nodenet(seed=42):
+    nodenet = DictNodenet(name="Compiled", uid="compiled_test_nodenet")
+    netapi = nodenet.netapi
+    space = netapi.create_node("Nodespace", "Root", "Space")
+    nodes, rand = build_random_nodenet(
+        nodenet, ["Register", "Concept", "Concept", "Pipe"], ["Root", space.uid, space.uid], 40, 200, seed)
+    add_activator(netapi, nodes, space.uid, "por")
+    return nodenet, nodes
+
+
+def test_compiled_propagation_equals_dict_propagation(monkeypatch):
+    compiled, nodes = build_nodenet()
+    for i in range(10):
+        compiled.step()
+    assert compiled.get_compiled_net(build=False).node_uids
+    monkeypatch.setattr(dict_compiled, "is_available", lambda: False)
+    reference, nodes = build_nodenet()
+    for i in range(10):
+        reference.step()
+    assert reference.get_compiled_net() is None
+    assert get_activations(compiled) == get_activations(reference)
+
+
+def test_compiled_net_follows_structure_changes():
+    nodenet, nodes = build_nodenet()
+    netapi = nodenet.netapi
+    nodenet.step()
+    compiled_net = nodenet.get_compiled_net(build=False)
+    netapi.link(nodes[0], "gen", nodes[5], "gen", 0.3)
+    assert nodenet.get_compiled_net(build=False) is None
+    nodenet.step()
+    compiled_net = nodenet.get_compiled_net(build=False)
+    link = nodes[0].get_gate("gen").get_links()[0]
+    link.set_weight(0.7)
+    assert nodenet.get_compiled_net(build=False) is compiled_net
+    assert compiled_net.weights.data[compiled_net.link_positions[link]] == 0.7
+    netapi.delete_node(nodes[5])
+    assert nodenet.get_compiled_net(build=False) is None
+
+
+def test_sheaves_fall_back_to_dict_propagation():
+    nodenet, nodes = build_nodenet()
+    nodenet.step()
+    gate = nodes[0].get_gate("gen")
+    gate.open_sheaf(1)
+    nodenet.step()
+    assert nodenet.get_compiled_net(build=False).step is None
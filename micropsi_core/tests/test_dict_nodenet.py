@@ -0,0 +1,168 @@
+#!/usr/local/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the node partitions, gate factors and memory layout of the dict engine
+"""
+
+import gc
+import tracemalloc
+
+from micropsi_core.nodenet.stepoperators import StepOperator
+from micropsi_core.nodenet.dict_engine.dict_nodenet import DictNodenet
+
+
+class NodeCreatingOperator(StepOperator):
+
+    @property
+    def priority(self):
+        return 500
+
+    def execute(self, nodenet, nodes, netapi):
+        self.seen = []
+        for uid, node in nodes.items():
+            self.seen.append(uid)
+            if node.type == "Register":
+                netapi.create_node("Register", "Root", "created")
+                netapi.delete_node(node)
+
+
+def test_partitions_follow_node_creation_and_deletion():
+    nodenet = DictNodenet(name="Partitions")
+    netapi = nodenet.netapi
+    register = netapi.create_node("Register", "Root", "register")
+    pipe = netapi.create_node("Pipe", "Root", "pipe")
+    sensor = netapi.create_node("Sensor", "Root", "sensor")
+    sensor.set_parameter("datasource", "brightness")
+    activator = netapi.create_node("Activator", "Root", "activator")
+    assert list(nodenet.get_partition("plain").keys()) == [register.uid]
+    assert list(nodenet.get_partition("pipes").keys()) == [pipe.uid]
+    assert list(nodenet.get_sensors().keys()) == [sensor.uid]
+    assert list(nodenet.get_sensors("Root", "brightness").keys()) == [sensor.uid]
+    assert nodenet.get_sensors(datasource="temperature") == {}
+    assert list(nodenet.get_activators().keys()) == [activator.uid]
+    netapi.delete_node(pipe)
+    assert nodenet.get_partition("pipes") == {}
+
+
+def test_step_operators_iterate_nodes_while_they_change():
+    nodenet = DictNodenet(name="Partitions")
+    netapi = nodenet.netapi
+    register = netapi.create_node("Register", "Root", "register")
+    concept = netapi.create_node("Concept", "Root", "concept")
+    operator = NodeCreatingOperator()
+    nodenet.stepoperators.append(operator)
+    nodenet.step()
+    assert operator.seen == [register.uid, concept.uid]
+    assert not nodenet.is_node(register.uid)
+    plain = nodenet.get_partition("plain")
+    assert len(plain) == 2 and concept.uid in plain
+    nodenet.step()
+    assert len(operator.seen) == 2
+
+
+def test_gate_factors_follow_activators():
+    nodenet = DictNodenet(name="Partitions")
+    netapi = nodenet.netapi
+    space = netapi.create_node("Nodespace", "Root", "space")
+    register = netapi.create_node("Register", space.uid, "register")
+    assert nodenet.get_gate_factors() == {}
+    nodenet.get_nodespace(space.uid).set_activator_value("gen", 0.5)
+    assert nodenet.get_gate_factors() == {space.uid: {"gen": 0.5}}
+    register.get_gate("gen").gate_function(1)
+    assert register.get_gate("gen").activation == 0.5
+    nodenet.get_nodespace(space.uid).unset_activator_value("gen")
+    register.get_gate("gen").gate_function(1)
+    assert register.get_gate("gen").activation == 1
+
+
+def test_sensors_and_actors_are_indexed_by_binding():
+    nodenet = DictNodenet(name="Partitions")
+    netapi = nodenet.netapi
+    space = netapi.create_node("Nodespace", "Root", "space")
+    sensor = netapi.create_node("Sensor", "Root", "sensor")
+    sensor.set_parameter("datasource", "brightness")
+    other = netapi.create_node("Sensor", space.uid, "other")
+    other.set_parameter("datasource", "brightness")
+    actor = netapi.create_node("Actor", "Root", "actor")
+    actor.set_parameter("datatarget", "engine")
+    assert set(nodenet.get_sensors(datasource="brightness").keys()) == {sensor.uid, other.uid}
+    assert list(nodenet.get_sensors(space.uid, "brightness").keys()) == [other.uid]
+    assert list(nodenet.get_actors(datatarget="engine").keys()) == [actor.uid]
+    sensor.set_parameter("datasource", "temperature")
+    assert list(nodenet.get_sensors(datasource="brightness").keys()) == [other.uid]
+    assert list(nodenet.get_sensors(datasource="temperature").keys()) == [sensor.uid]
+    other.clear_parameter("datasource")
+    assert nodenet.get_sensors(datasource="brightness") == {}
+    netapi.delete_node(actor)
+    assert nodenet.get_actors(datatarget="engine") == {}
+
+
+def test_default_sheaves_are_created_on_demand():
+    nodenet = DictNodenet(name="Sheaves")
+    netapi = nodenet.netapi
+    source = netapi.create_node("Pipe", "Root", "source")
+    target = netapi.create_node("Pipe", "Root", "target")
+    netapi.link(source, "gen", target, "gen")
+    gate = source.get_gate("gen")
+    slot = target.get_slot("gen")
+
+    # reading and writing the default sheaf does not create the sheaf dicts
+    for sheaves in (gate, slot):
+        assert sheaves.activation == 0
+        assert sheaves.activations == {"default": 0}
+        sheaves.set_sheaf_activation(0.5)
+        assert sheaves.get_default_activation() == 0.5
+        assert sheaves._DictSheaves__sheaves is None
+        clone = sheaves.clone_sheaves()
+        assert clone == {"default": {"uid": "default", "name": "default", "activation": 0.5}}
+        clone["default"]["activation"] = 1
+        assert sheaves.activation == 0.5
+    assert slot.get_activation() == 0.5
+    assert slot.get_activation("other") == 0
+
+    # accessing the sheaves creates them from the default activation, and they stay in sync
+    assert slot.sheaves["default"]["activation"] == 0.5
+    slot.sheaves["default"]["activation"] = 0.25
+    assert slot.activation == 0.25
+    assert slot.get_default_activation() == 0.25
+    slot.set_default_activation(0)
+    assert slot._DictSheaves__sheaves is None
+
+    # opening a sheaf keeps the default sheaf, and the activations of both
+    gate.open_sheaf(0.7)
+    sheaf_uid = "default-" + source.uid
+    assert set(gate.sheaves.keys()) == {"default", sheaf_uid}
+    assert gate.activation == 0.5
+    assert gate.activations == {"default": 0.5, sheaf_uid: 0.7}
+    assert gate.get_default_activation() is None
+    gate.set_sheaf_activation(0.1, sheaf_uid)
+    assert gate.sheaves[sheaf_uid]["activation"] == 0.1
+    gate.set_default_activation(0.3)
+    assert gate.activations == {"default": 0.3}
+
+
+def test_nodes_are_compact():
+    nodenet = DictNodenet(name="Memory")
+    netapi = nodenet.netapi
+    node = netapi.create_node("Concept", "Root", "node")
+    netapi.link(node, "gen", node, "gen")
+    for item in (node.get_gate("gen"), node.get_slot("gen"), node.get_gate("gen").get_links()[0]):
+        assert not hasattr(item, "__dict__")
+
+    number_of_nodes = 1000
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        nodes = [netapi.create_node("Concept", "Root", "n%d" % i) for i in range(number_of_nodes)]
+        for source, target in zip(nodes, nodes[1:]):
+            netapi.link(source, "gen", target, "gen", 0.5)
+        gc.collect()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    # about 9.6 kB per concept node with its ten gates and slots and one link, 15.5 kB with dicts of attributes and
+    # a sheaf dict for every gate and slot
+    assert size / number_of_nodes < 12000
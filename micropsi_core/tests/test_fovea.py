@@ -0,0 +1,100 @@
+#!/usr/local/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the fovea patch features of the minecraft graph locomotion world adapter
+"""
+
+import pytest
+import numpy as np
+from micropsi_core.world.minecraft import fovea
+
+NUM_FOV = 16
+
+
+def loop_features(patch, patch_width, patch_height, supported):
+    """The per-patch loops fovea replaced, with the patch given as flat list of block types"""
+    normalizer = patch_width * patch_height
+    histogram = dict((name, 0.) for name in supported)
+    for bt in set(patch):
+        name = "fov_hist__%03d" % bt
+        if name in histogram:
+            histogram[name] = patch.count(bt) / normalizer
+
+    if patch[1:] == patch[:-1]:
+        patch_resc = [0.0] * patch_width * patch_height
+    else:
+        patch_ = [0.0 if v <= 0 else 1.0 for v in patch]
+        mean = float(sum(patch_)) / len(patch_)
+        patch_avg = [x - mean for x in patch_]
+        var = [x ** 2.0 for x in patch_avg]
+        std = (sum(var) / len(var)) ** 0.5
+        pstd = 3.0 * std
+        if pstd == 0.0:
+            patch_std = [0.0 for x in patch_avg]
+        else:
+            patch_std = [max(min(x, pstd), -pstd) / pstd for x in patch_avg]
+        patch_resc = [(1.0 + x) * 0.4 + 0.1 for x in patch_std]
+    return histogram, patch_resc
+
+
+def loop_window(patch, patch_width, patch_height):
+    """The loop that wrote the fov__ datasources. It took rows of patch_height values"""
+    left_margin = max(0, (int(patch_width - NUM_FOV) // 2) - 1)
+    top_margin = max(0, (int(patch_height - NUM_FOV) // 4 * 3) - 1)
+    window = np.zeros((NUM_FOV, NUM_FOV))
+    for i in range(NUM_FOV):
+        for j in range(NUM_FOV):
+            window[i, j] = patch[(patch_height * (i + top_margin)) + j + left_margin]
+    return window
+
+
+def random_patch(width, height, seed=23):
+    rand = np.random.RandomState(seed)
+    return rand.choice([-1, 0, 0, 1, 2, 3, 12, 17], size=(height, width))
+
+
+def histogram_datasources():
+    names = ["fov_hist__%03d" % bt for bt in (-1, 0, 1, 2, 3, 17)]
+    return dict((int(name[len('fov_hist__'):]), name) for name in names), names
+
+
+def test_features_equal_loops():
+    datasources, names = histogram_datasources()
+    for width, height in ((32, 32), (40, 24)):
+        block_types = random_patch(width, height)
+        histogram, patch_resc = loop_features(block_types.ravel().tolist(), width, height, names)
+        assert fovea.block_type_histogram(block_types, datasources) == histogram
+        assert np.allclose(fovea.normalize_patch(block_types).ravel(), patch_resc)
+
+
+def test_uniform_patches():
+    datasources, names = histogram_datasources()
+    for value in (-1, 0, 3):
+        block_types = np.full((32, 32), value)
+        histogram, patch_resc = loop_features(block_types.ravel().tolist(), 32, 32, names)
+        assert fovea.block_type_histogram(block_types, datasources) == histogram
+        assert np.array_equal(fovea.normalize_patch(block_types).ravel(), patch_resc)
+    # air and nothingness only: the patch has no variance after binarization
+    block_types = random_patch(32, 32) % 2 - 1
+    histogram, patch_resc = loop_features(block_types.ravel().tolist(), 32, 32, names)
+    assert np.array_equal(fovea.normalize_patch(block_types).ravel(), patch_resc)
+
+
+def test_fovea_window_takes_rows_of_patch_width():
+    for width, height in ((32, 32), (NUM_FOV, NUM_FOV), (40, 24), (20, 48)):
+        patch = np.arange(width * height, dtype=float)
+        window = fovea.fovea_window(patch, width, height, NUM_FOV)
+        if width == height:
+            assert np.array_equal(window, loop_window(patch.tolist(), width, height))
+        elif width > height:
+            # the loop mixed up the rows of wide patches
+            assert not np.array_equal(window, loop_window(patch.tolist(), width, height))
+        else:
+            # and read past the end of tall ones
+            with pytest.raises(IndexError):
+                loop_window(patch.tolist(), width, height)
+        # the window is a block of the patch, rows stay rows
+        assert window.shape == (NUM_FOV, NUM_FOV)
+        assert np.all(np.diff(window, axis=1) == 1)
+        assert np.all(np.diff(window, axis=0) == width)
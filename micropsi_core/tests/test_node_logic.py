@@ -177,3 +177,21 @@ def test_node_logic_actor(fixed_nodenet):
     assert world.test_target_value == 0.5
     net.step()
     assert register.get_gate("gen").activation == 0.3
+
+
+def test_node_logic_sheaf_propagation(fixed_nodenet):
+    # spread a sheaf opened by a pipe to its child, and have the child report back in the parent's sheaf
+    net, netapi, source = prepare(fixed_nodenet)
+    parent = netapi.create_node("Pipe", "Root", "Parent")
+    child = netapi.create_node("Pipe", "Root", "Child")
+    netapi.link(parent, "sub", child, "sub", 0.5)
+    netapi.link(child, "sur", parent, "sur", 0.25)
+    parent.set_gate_parameter("sub", "spreadsheaves", 1)
+    sheaf = "default-" + parent.uid
+    parent.get_gate("sub").sheaves[sheaf] = dict(uid=sheaf, name="Parent", activation=1)
+    child.get_gate("sur").sheaves[sheaf] = dict(uid=sheaf, name="Parent", activation=1)
+    net.step()
+    assert child.get_slot("sub").get_activation(sheaf) == 0.5
+    assert sheaf in child.get_slot("gen").sheaves
+    assert parent.get_slot("sur").get_activation("default") == 0.25
+    assert sheaf not in parent.get_slot("sur").sheaves
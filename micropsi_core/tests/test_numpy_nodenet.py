@@ -0,0 +1,567 @@
+#!/usr/local/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the numpy engine
+"""
+
+import numpy as np
+import pytest
+
+from micropsi_core import runtime as micropsi
+from micropsi_core.nodenet.dict_engine.dict_nodenet import DictNodenet
+from micropsi_core.nodenet.node import Nodetype
+from micropsi_core.nodenet.numpy_engine.numpy_nodenet import NumpyNodenet
+from micropsi_core.nodenet.numpy_engine.numpy_stepoperators import NumpyCalculate
+from micropsi_core.nodenet.theano_engine import theano_node as tnode
+from micropsi_core.nodenet.theano_engine import theano_nodespace as nodespace
+from micropsi_core.nodenet.theano_engine.theano_stepoperators import CALCULATE_INPUTS
+from micropsi_core.tests.random_nodenet import build_random_nodenet, create_random_nodes, get_node_by_name, link_randomly
+
+from configuration import config as settings
+
+
+def build_chain(nodenet):
+    netapi = nodenet.netapi
+    root = netapi.get_nodespace(None).uid
+    nodes = [netapi.create_node("Register", root, "r%d" % i) for i in range(4)]
+    for source, target, weight in zip(nodes, nodes[1:], (0.5, -1, 2)):
+        netapi.link(source, "gen", target, "gen", weight)
+    netapi.link(nodes[2], "gen", nodes[0], "gen", 0.25)
+    nodes[1].set_gate_parameter("gen", "threshold", 0.1)
+    nodes[2].set_gatefunction_name("gen", "absolute")
+    nodes[3].set_gate_parameter("gen", "maximum", 1.5)
+    return nodes
+
+
+def test_numpy_nodenet_propagates_like_dict_nodenet():
+    numpy_nodenet = NumpyNodenet(name="Numpy", uid="numpy_test_nodenet")
+    dict_nodenet = DictNodenet(name="Dict", uid="dict_test_nodenet")
+    numpy_nodes = build_chain(numpy_nodenet)
+    dict_nodes = build_chain(dict_nodenet)
+    for nodes in (numpy_nodes, dict_nodes):
+        nodes[0].activation = 1
+    for i in range(6):
+        numpy_nodenet.step()
+        dict_nodenet.step()
+        for numpy_node, dict_node in zip(numpy_nodes, dict_nodes):
+            assert numpy_node.get_gate("gen").activation == pytest.approx(dict_node.get_gate("gen").activation)
+
+
+def test_numpy_nodenet_gate_functions():
+    nodenet = NumpyNodenet(name="Numpy", uid="numpy_test_nodenet")
+    netapi = nodenet.netapi
+    root = netapi.get_nodespace(None).uid
+    source = netapi.create_node("Register", root, "source")
+    targets = {}
+    for gatefunction in ("sigmoid", "tanh", "rect", "one_over_x"):
+        targets[gatefunction] = netapi.create_node("Register", root, gatefunction)
+        targets[gatefunction].set_gatefunction_name("gen", gatefunction)
+        targets[gatefunction].set_gate_parameter("gen", "maximum", 10)
+        netapi.link(source, "gen", targets[gatefunction], "gen", 1)
+    source.activation = 0.5
+    nodenet.step()
+    assert targets["sigmoid"].get_gate("gen").activation == pytest.approx(0.6224593)
+    assert targets["tanh"].get_gate("gen").activation == pytest.approx(0.4621172)
+    assert targets["rect"].get_gate("gen").activation == pytest.approx(0.5)
+    assert targets["one_over_x"].get_gate("gen").activation == pytest.approx(2)
+
+
+def test_numpy_nodenet_pipes():
+    nodenet = NumpyNodenet(name="Numpy", uid="numpy_test_nodenet")
+    netapi = nodenet.netapi
+    root = netapi.get_nodespace(None).uid
+    source = netapi.create_node("Register", root, "source")
+    parent = netapi.create_node("Pipe", root, "parent")
+    first = netapi.create_node("Pipe", root, "first")
+    second = netapi.create_node("Pipe", root, "second")
+    netapi.link_with_reciprocal(parent, first, "subsur")
+    netapi.link_with_reciprocal(parent, second, "subsur")
+    netapi.link_with_reciprocal(first, second, "porret")
+    netapi.link(source, "gen", parent, "sub", 1)
+    source.activation = 1
+    nodenet.step()
+    assert parent.get_gate("sub").activation == 1
+    nodenet.step()
+    assert first.get_gate("sub").activation == 1
+    assert second.get_gate("sub").activation == 0
+    assert first.get_gate("por").activation == 0
+    assert second.get_gate("ret").activation == -1
+
+
+def test_numpy_nodenet_save_and_load(tmpdir):
+    nodenet = NumpyNodenet(name="Numpy", uid="numpy_test_nodenet")
+    nodes = build_chain(nodenet)
+    nodes[0].activation = 1
+    nodenet.step()
+    filename = str(tmpdir.join("numpy_test_nodenet.json"))
+    nodenet.save(filename)
+    loaded = NumpyNodenet(name="Numpy", uid="numpy_test_nodenet")
+    loaded.load(filename)
+    for node in nodes:
+        loaded_node = loaded.get_node(node.uid)
+        assert loaded_node.get_gate("gen").activation == node.get_gate("gen").activation
+        assert loaded_node.get_gate_parameters()["gen"] == node.get_gate_parameters()["gen"]
+    nodenet.step()
+    loaded.step()
+    assert [loaded.get_node(node.uid).activation for node in nodes] == [node.activation for node in nodes]
+
+
+def test_numpy_engine_runs_theano_native_modules(monkeypatch):
+    monkeypatch.setattr(micropsi, "native_modules", {
+        "Theano": {"engine": "theano_engine"},
+        "Dict": {"engine": "dict_engine"},
+        "Any": {}
+    })
+    assert set(micropsi.filter_native_modules("numpy_engine").keys()) == {"Theano", "Any"}
+    assert set(micropsi.filter_native_modules("theano_engine").keys()) == {"Theano", "Any"}
+
+
+def double_gen(netapi, node=None, **_):
+    node.get_gate("gen").gate_function(2 * node.get_slot("gen").activation)
+    node.get_gate("bar").gate_function(node.get_gate("gen").activation + node.get_slot("foo").activation)
+
+
+def test_numpy_nodenet_native_modules_read_snapshots_and_write_gates():
+    native_modules = {
+        "Doubler": {"name": "Doubler", "slottypes": ["gen", "foo"], "gatetypes": ["gen", "bar"]}
+    }
+    nodenet = NumpyNodenet(name="Numpy", uid="numpy_test_nodenet", native_modules=native_modules)
+    nodenet.native_modules["Doubler"].nodefunction = double_gen
+    netapi = nodenet.netapi
+    root = netapi.get_nodespace(None).uid
+    source = netapi.create_node("Register", root, "source")
+    doubler = netapi.create_node("Doubler", root, "doubler")
+    target = netapi.create_node("Register", root, "target")
+    netapi.link(source, "gen", doubler, "gen", 1)
+    netapi.link(source, "gen", doubler, "foo", 0.5)
+    netapi.link(doubler, "bar", target, "gen", 1)
+    source.activation = 0.25
+    nodenet.step()
+    assert doubler.get_slot("gen").activation == 0.25
+    assert doubler.get_gate("gen").activation == 0.5
+    assert doubler.get_gate("bar").activation == 0.625
+    nodenet.step()
+    assert target.activation == 0.625
+    netapi.delete_node(doubler)
+    nodenet.step()
+    assert target.activation == 0
+
+
+def test_numpy_nodenet_native_modules_create_and_delete_native_modules():
+    native_modules = {
+        "Doubler": {"name": "Doubler", "slottypes": ["gen", "foo"], "gatetypes": ["gen", "bar"]},
+        "Spawner": {"name": "Spawner", "slottypes": ["gen"], "gatetypes": ["gen"]}
+    }
+    nodenet = NumpyNodenet(name="Numpy", uid="numpy_test_nodenet", native_modules=native_modules)
+    calculated = []
+
+    def count_double_gen(netapi, node=None, **_):
+        calculated.append(node)
+        double_gen(netapi, node)
+
+    nodenet.native_modules["Doubler"].nodefunction = count_double_gen
+    netapi = nodenet.netapi
+    root = netapi.get_nodespace(None).uid
+    spawned = []
+    freed = []
+
+    def spawn(netapi, node=None, **_):
+        # replaces the first doubler in the first step, before its node function ran
+        if not spawned:
+            netapi.delete_node(netapi.get_nodes(node_name_prefix="first")[0])
+            freed.append(nodenet.a.get_value()[offset:offset + 2])
+            spawned.append(netapi.create_node("Doubler", root, "spawned"))
+            netapi.link(source, "gen", spawned[0], "gen", 1)
+        node.get_gate("gen").gate_function(1)
+
+    nodenet.native_modules["Spawner"].nodefunction = spawn
+    source = netapi.create_node("Register", root, "source")
+    spawner = netapi.create_node("Spawner", root, "spawner")
+    first = netapi.create_node("Doubler", root, "first")
+    second = netapi.create_node("Doubler", root, "second")
+    netapi.link(source, "gen", source, "gen", 1)
+    for doubler in (first, second):
+        netapi.link(source, "gen", doubler, "gen", 1)
+    source.activation = 0.25
+    offset = nodenet.allocated_node_offsets[tnode.from_id(first.uid)]
+    nodenet.step()
+    # the deleted doubler is not calculated, and its gates are not written back to its former elements
+    assert calculated == [second]
+    assert np.array_equal(nodenet.a.get_value()[offset:offset + 2], freed[0])
+    # the new doubler is calculated from the next step on
+    assert spawned[0].get_gate("gen").activation == 0
+    assert spawned[0].get_gate("bar").activation == 0
+    assert second.get_gate("gen").activation == 0.5
+    assert spawner.get_gate("gen").activation == 1
+    nodenet.step()
+    for doubler in (spawned[0], second):
+        assert doubler.get_slot("gen").activation == 0.25
+        assert doubler.get_gate("gen").activation == 0.5
+    assert spawner.get_gate("gen").activation == 1
+
+
+def build_sensor_chain(nodenet):
+    netapi = nodenet.netapi
+    root = netapi.get_nodespace(None).uid
+    sensor = netapi.create_node("Sensor", root, "sensor")
+    sensor.set_parameter("datasource", "brightness")
+    register = netapi.create_node("Register", root, "register")
+    actor = netapi.create_node("Actor", root, "actor")
+    actor.set_parameter("datatarget", "engine")
+    netapi.link(sensor, "gen", register, "gen", 0.5)
+    netapi.link(register, "gen", actor, "gen", 1)
+    return sensor, register, actor
+
+
+@pytest.mark.parametrize("native_modules", [False, True])
+def test_numpy_nodenet_step_many_equals_single_steps(native_modules):
+    nodenet = NumpyNodenet(name="Numpy", uid="numpy_test_nodenet")
+    nodenet.native_modules["Doubler"] = Nodetype(nodenet=nodenet, name="Doubler", slottypes=["gen"], gatetypes=["gen"])
+    nodenet.native_modules["Doubler"].nodefunction = lambda netapi, node=None, **_: None
+    sensor, register, actor = build_sensor_chain(nodenet)
+    if native_modules:
+        nodenet.netapi.create_node("Doubler", nodenet.netapi.get_nodespace(None).uid, "doubler")
+    values = nodenet.step_many(4, ["brightness"], [[1], [0.5], [0], [0]], ["engine", "unbound"])
+    assert values.tolist() == [[0, 0], [0, 0], [0.5, 0], [0.25, 0]]
+    assert register.activation == 0
+    assert nodenet.current_step == 4
+    assert nodenet.step_many(1, ["brightness"], [[1]]).shape == (1, 0)
+    assert sensor.activation == 1
+
+
+def test_numpy_nodenet_step_many_needs_a_calculate_operator():
+    nodenet = NumpyNodenet(name="Numpy", uid="numpy_test_nodenet")
+    build_sensor_chain(nodenet)
+    nodenet.stepoperators = [operator for operator in nodenet.stepoperators if not isinstance(operator, NumpyCalculate)]
+    with pytest.raises(ValueError):
+        nodenet.step_many(2, ["brightness"], [[1], [0]])
+
+
+def test_numpy_nodenet_ensemble_members_equal_single_nodenets():
+    thetas = [0, 0.5, -1]
+    nodenets = []
+    for theta in thetas:
+        nodenet = NumpyNodenet(name="Numpy", uid="numpy_test_nodenet")
+        sensor, register, actor = build_sensor_chain(nodenet)
+        register.set_gatefunction_name("gen", "sigmoid")
+        register.set_gate_parameter("gen", "theta", theta)
+        nodenets.append(nodenet)
+    ensemble = NumpyNodenet(name="Numpy", uid="numpy_test_nodenet")
+    sensor, register, actor = build_sensor_chain(ensemble)
+    register.set_gatefunction_name("gen", "sigmoid")
+    ensemble = ensemble.create_ensemble(len(thetas))
+    ensemble.set_gate_parameter(register.uid, "gen", "theta", thetas)
+    ensemble.add_monitor(register.uid)
+    for step, brightness in enumerate([1, 0.5, 0.25]):
+        values = [brightness * (member + 1) for member in range(len(thetas))]
+        ensemble.set_datasource_values("brightness", values)
+        ensemble.step()
+        for member, nodenet in enumerate(nodenets):
+            assert nodenet.step_many(1, ["brightness"], [[values[member]]], ["engine"])[0, 0] == \
+                pytest.approx(ensemble.get_datatarget_values("engine")[member])
+            assert nodenet.get_node(register.uid).activation == \
+                pytest.approx(ensemble.get_gate_activations(register.uid)[member])
+    assert sorted(ensemble.get_monitor_values(register.uid).keys()) == [1, 2, 3]
+    assert list(ensemble.get_gate_parameter(register.uid, "gen", "theta")) == thetas
+
+
+def build_nodespaces(seed=42):
+    nodenet = NumpyNodenet(name="Numpy", uid="numpy_test_nodenet")
+    netapi = nodenet.netapi
+    root = netapi.get_nodespace(None).uid
+    spaces = [netapi.create_node("Nodespace", root, "space%d" % i).uid for i in range(6)]
+    nodetypes = ["Register", "Register", "Pipe"]
+    nodes, rand = build_random_nodenet(nodenet, nodetypes, spaces[:4], 40, 60, seed)
+    # the last two nodespaces only link among themselves, and stay dormant
+    dormant = create_random_nodes(netapi, rand, nodetypes, spaces[4:], 20, first=40)
+    link_randomly(netapi, rand, dormant, 20)
+    nodes[1].set_gate_parameter("gen", "theta", 0.5)
+    activator = netapi.create_node("Activator", spaces[2], "activator")
+    activator.set_parameter("type", "por")
+    sensor = netapi.create_node("Sensor", spaces[3], "sensor")
+    sensor.set_parameter("datasource", "brightness")
+    netapi.link(sensor, "gen", nodes[6], "gen", 1)
+    netapi.link(nodes[0], "gen", activator, "gen", 0.5)
+    for node in nodes[:5]:
+        node.activation = 1
+    return nodenet
+
+
+def test_numpy_nodenet_skips_dormant_nodespaces():
+    nodenet = build_nodespaces()
+    reference = build_nodespaces()
+    reference.nodespace_activity = None
+    for step in range(10):
+        nodenet.step()
+        reference.step()
+        assert np.allclose(nodenet.a.get_value(), reference.a.get_value())
+    live = nodenet.nodespace_activity.live
+    assert live is not None and not live.all()
+    # the inputs of the live elements are gathered into the same buffers every step
+    calculate = [operator for operator in nodenet.stepoperators if isinstance(operator, NumpyCalculate)][0]
+    buffers = dict(calculate.gather_buffers)
+    assert len(buffers) == len(CALCULATE_INPUTS)
+    scratch = calculate.calculate_function.scratch
+    nodenet.step()
+    reference.step()
+    assert nodenet.nodespace_activity.elements is not None
+    assert all(calculate.gather_buffers[name] is buffer for name, buffer in buffers.items())
+    assert calculate.calculate_function.scratch is scratch
+    # activation set from outside wakes up a dormant nodespace
+    for net in (nodenet, reference):
+        net.netapi.get_nodes(node_name_prefix="n59")[0].activation = 1
+    for step in range(3):
+        nodenet.step()
+        reference.step()
+        assert np.allclose(nodenet.a.get_value(), reference.a.get_value())
+    # a sensor moved to a dormant nodespace keeps it live
+    version = nodenet.nodespace_elements_version
+    space = [space for space in nodenet.netapi.get_nodespaces() if space.name == "space5"][0]
+    sensor = get_node_by_name(nodenet.netapi, "sensor")
+    sensor.parent_nodespace = space.uid
+    assert nodenet.nodespace_elements_version > version
+    nodenet.step()
+    assert nodenet.nodespace_activity.always_live[nodespace.from_id(space.uid)]
+
+
+def build_groups(nodenet):
+    netapi = nodenet.netapi
+    root = netapi.get_nodespace(None).uid
+    inputs = [netapi.create_node("Register", root, "in%d" % i) for i in range(3)]
+    outputs = [netapi.create_node("Register", root, "out%d" % i) for i in range(2)]
+    netapi.link(inputs[0], "gen", outputs[0], "gen", 0.5)
+    netapi.link(inputs[2], "gen", outputs[0], "gen", -1)
+    netapi.link(inputs[1], "gen", outputs[1], "gen", 2)
+    netapi.group_nodes_by_names(node_name_prefix="in")
+    netapi.group_nodes_by_names(node_name_prefix="out")
+    for node, activation in zip(inputs + outputs, (1, 0.5, -1, 0.25, 2)):
+        node.activation = activation
+    return inputs, outputs
+
+
+@pytest.mark.parametrize("sparse", ["True", "False"])
+def test_numpy_nodenet_group_link_weights(monkeypatch, sparse):
+    monkeypatch.setitem(settings['theano'], 'sparse_weight_matrix', sparse)
+    nodenet = NumpyNodenet(name="Numpy", uid="numpy_test_nodenet")
+    netapi = nodenet.netapi
+    inputs, outputs = build_groups(nodenet)
+    weights = [[0.5, 0, -1], [0, 2, 0]]
+    assert netapi.get_link_weights("in", "out").tolist() == weights
+    assert netapi.get_link_weights("in", "out", sparse=True).nnz == 3
+    assert netapi.get_link_weights("in", "out", sparse=True).toarray().tolist() == weights
+
+    netapi.set_link_weights("in", "out", [[1, 1, 1], [1, 1, 1]], existing_only=True)
+    assert netapi.get_link_weights("in", "out").tolist() == [[1, 0, 1], [0, 1, 0]]
+    netapi.set_link_weights("in", "out", [[0.5, 0.25, -1], [0, 2, 0]])
+    assert netapi.get_link_weights("in", "out").tolist() == [[0.5, 0.25, -1], [0, 2, 0]]
+    assert len(inputs[1].get_gate("gen").get_links()) == 2
+
+    # activations of in are ( 1, 0.5, -1 ), of out ( 0.25, 2 )
+    netapi.learn_hebbian("in", "out", 0.5)
+    expected = np.array([[0.5 + 0.125, 0.25 + 0.0625, -1 - 0.125], [0, 2 + 0.5, 0]])
+    assert np.allclose(netapi.get_link_weights("in", "out"), expected)
+    netapi.learn_delta("in", "out", [1, 0], 0.5)
+    expected += 0.5 * np.outer([0.75, -2], [1, 0.5, -1]) * (expected != 0)
+    assert np.allclose(netapi.get_link_weights("in", "out"), expected)
+    netapi.decay_link_weights("in", "out", 0.1)
+    assert np.allclose(netapi.get_link_weights("in", "out"), expected * 0.9)
+    assert netapi.get_link_weights("in", "out", sparse=True).nnz == 4
+    nodenet.step()
+    assert outputs[1].activation == pytest.approx(0.9 * (expected[1, 1] * 0.5))
+
+
+def test_numpy_nodenet_groups_follow_node_changes(tmpdir):
+    nodenet = NumpyNodenet(name="Numpy", uid="numpy_test_nodenet")
+    netapi = nodenet.netapi
+    root = netapi.get_nodespace(None).uid
+    inputs, outputs = build_groups(nodenet)
+    assert netapi.is_contiguous_group("in")
+    activations = netapi.get_activations("in")
+    assert activations.tolist() == [1, 0.5, -1]
+    assert np.shares_memory(activations, nodenet.a.get_value(borrow=True))
+
+    pipes = [netapi.create_node("Pipe", root, "pipe%d" % i) for i in range(3)]
+    netapi.group_nodes_by_ids([node.uid for node in pipes], "pipes", gate="por")
+    assert netapi.is_contiguous_group("pipes")
+    pipes[1].get_gate("por").gate_function(0.3)
+    assert netapi.get_activations("pipes").tolist() == pytest.approx([0, 0.3, 0])
+    netapi.group_nodes_by_ids([node.uid for node in pipes], "pipe_slots", slot="sub")
+    assert nodenet.nodegroups["pipe_slots"].tolist() == [nodenet.nodegroups["pipes"][i] + 2 for i in range(3)]
+
+    # created nodes join groups defined by names, deleted nodes leave all groups
+    netapi.delete_node(inputs[1])
+    assert netapi.get_activations("in").tolist() == [1, -1]
+    created = netapi.create_node("Register", root, "in3")
+    netapi.create_node("Register", root, "other")
+    created.activation = 0.75
+    # the new node takes the id of the deleted one
+    assert netapi.get_activations("in").tolist() == [1, 0.75, -1]
+    assert not netapi.is_contiguous_group("in")
+    assert not np.shares_memory(netapi.get_activations("in"), nodenet.a.get_value(borrow=True))
+    netapi.delete_node(pipes[0])
+    assert len(netapi.get_activations("pipes")) == 2
+    # group values are read-only, views or not
+    for values in (netapi.get_activations("out"), netapi.get_activations("in"), netapi.get_thetas("in")):
+        with pytest.raises(ValueError):
+            values[0] = 1
+
+    # renamed and moved nodes join and leave the groups defined by names
+    outputs[1].name = "in_renamed"
+    assert nodenet.nodegroup_definitions["in"]["node_ids"][-1] == outputs[1].uid
+    assert len(netapi.get_activations("in")) == 4
+    outputs[1].name = "out1"
+    assert outputs[1].uid not in nodenet.nodegroup_definitions["in"]["node_ids"]
+    space = netapi.create_node("Nodespace", root, "space").uid
+    netapi.group_nodes_by_names(space, node_name_prefix="pipe")
+    assert len(netapi.get_activations("pipe")) == 0
+    pipes[1].parent_nodespace = space
+    assert nodenet.nodegroup_definitions["pipe"]["node_ids"] == [pipes[1].uid]
+    pipes[1].parent_nodespace = root
+    assert len(netapi.get_activations("pipe")) == 0
+    netapi.ungroup_nodes("pipe")
+
+    # unnamed nodes go by their uids, which don't join groups defined by names
+    space = netapi.create_node("Nodespace", root, "unnamed").uid
+    unnamed = netapi.create_node("Register", space)
+    assert unnamed.name == unnamed.uid
+    netapi.group_nodes_by_names(space, node_name_prefix="n")
+    assert len(netapi.get_activations("n")) == 0
+    netapi.create_node("Register", space)
+    assert len(netapi.get_activations("n")) == 0
+    netapi.ungroup_nodes("n")
+
+    filename = str(tmpdir.join("numpy_test_nodenet.json"))
+    nodenet.save(filename)
+    loaded = NumpyNodenet(name="Numpy", uid="numpy_test_nodenet")
+    loaded.load(filename)
+    for group in ("in", "out", "pipes", "pipe_slots"):
+        assert loaded.nodegroups[group].tolist() == nodenet.nodegroups[group].tolist()
+    assert loaded.netapi.get_activations("in").tolist() == [1, 0.75, -1]
+    loaded.netapi.create_node("Register", root, "in4")
+    assert len(loaded.netapi.get_activations("in")) == 4
+    loaded.netapi.ungroup_nodes("in")
+    assert "in" not in loaded.nodegroup_definitions
+
+
+def build_deletable(nodenet, doomed):
+    netapi = nodenet.netapi
+    root = netapi.get_nodespace(None).uid
+    source = netapi.create_node("Register", root, "source")
+    parent = netapi.create_node("Pipe", root, "parent")
+    first = netapi.create_node("Pipe", root, "first")
+    second = netapi.create_node("Pipe", root, "second")
+    netapi.link_with_reciprocal(parent, first, "subsur")
+    netapi.link_with_reciprocal(parent, second, "subsur")
+    netapi.link(source, "gen", parent, "sub", 1)
+    if doomed:
+        space = netapi.create_node("Nodespace", root, "doomed")
+        inner = netapi.create_node("Nodespace", space.uid, "inner")
+        helper = netapi.create_node("Pipe", inner.uid, "helper")
+        register = netapi.create_node("Register", space.uid, "register")
+        # the only por link of second comes from the doomed nodespace
+        netapi.link_with_reciprocal(helper, second, "porret")
+        netapi.link(source, "gen", register, "gen", 1)
+        netapi.link(register, "gen", parent, "sub", 0.5)
+        netapi.link(helper, "sur", parent, "sur", 0.5)
+    source.activation = 1
+    return nodenet
+
+
+@pytest.mark.parametrize("sparse", ["True", "False"])
+def test_numpy_nodenet_deletes_nodespaces_in_one_pass(monkeypatch, sparse):
+    monkeypatch.setitem(settings['theano'], 'sparse_weight_matrix', sparse)
+    nodenet = build_deletable(NumpyNodenet(name="Numpy", uid="numpy_test_nodenet"), True)
+    reference = build_deletable(NumpyNodenet(name="Numpy", uid="numpy_reference_nodenet"), False)
+    doomed = [uid for uid in nodenet.get_nodespace_uids() if nodenet.get_nodespace(uid).name == "doomed"]
+    nodenet.netapi.delete_nodespace(nodenet.get_nodespace(doomed[0]))
+    assert len(nodenet.get_node_uids()) == len(reference.get_node_uids())
+    assert len(nodenet.get_nodespace_uids()) == 1
+    w = nodenet.w.get_value(borrow=True)
+    if nodenet.sparse:
+        assert w.nnz == reference.w.get_value(borrow=True).nnz
+        assert np.all(w.data != 0)
+    for name in ("second", "parent"):
+        node = nodenet.netapi.get_nodes(node_name_prefix=name)[0]
+        reference_node = reference.netapi.get_nodes(node_name_prefix=name)[0]
+        for porlinked in ("n_node_porlinked", "n_node_retlinked"):
+            offsets = [net.allocated_node_offsets[tnode.from_id(n.uid)] for net, n in ((nodenet, node), (reference, reference_node))]
+            assert getattr(nodenet, porlinked).get_value()[offsets[0]] == getattr(reference, porlinked).get_value()[offsets[1]]
+    for step in range(4):
+        nodenet.step()
+        reference.step()
+        for uid in reference.get_node_uids():
+            reference_node = reference.get_node(uid)
+            node = nodenet.netapi.get_nodes(node_name_prefix=reference_node.name)[0]
+            for gate_type in node.get_gate_types():
+                assert node.get_gate(gate_type).activation == pytest.approx(reference_node.get_gate(gate_type).activation)
+
+
+def test_numpy_nodenet_deletes_many_nodes(monkeypatch):
+    nodenet = NumpyNodenet(name="Numpy", uid="numpy_test_nodenet")
+    netapi = nodenet.netapi
+    nodes = build_chain(nodenet)
+    netapi.group_nodes_by_ids([node.uid for node in nodes], "chain")
+    built = []
+    build_nodegroup = nodenet.build_nodegroup
+    monkeypatch.setattr(nodenet, "build_nodegroup", lambda group: built.append(group) or build_nodegroup(group))
+    netapi.delete_nodes(nodes[1:3])
+    assert nodenet.get_node_uids() == [nodes[0].uid, nodes[3].uid]
+    # the group is rebuilt once for all deleted nodes
+    assert built == ["chain"]
+    assert nodenet.nodegroup_definitions["chain"]["node_ids"] == [nodes[0].uid, nodes[3].uid]
+    assert nodenet.w.get_value(borrow=True).nnz == 0
+    assert nodes[0].get_gate("gen").get_links() == []
+
+
+def test_numpy_nodenet_compact_gate_parameters(monkeypatch, tmpdir):
+    nodenet = NumpyNodenet(name="Numpy", uid="numpy_test_nodenet")
+    nodes = build_chain(nodenet)
+    monkeypatch.setitem(settings['theano'], 'compact_gate_parameters', "True")
+    compact = NumpyNodenet(name="Numpy", uid="numpy_compact_nodenet")
+    compact_nodes = build_chain(compact)
+    compact_nodes[0].set_gate_parameter("gen", "theta", 0.5)
+    compact_nodes[0].set_gate_parameter("gen", "theta", 0)
+    # only the three parameters set by build_chain deviate from the gate defaults
+    assert sum(len(getattr(compact, name).overrides) for name in ("g_theta", "g_threshold", "g_max")) == 2
+    assert compact.gate_parameter_rows.rows.dtype == np.int16
+    for name in ("g_theta", "g_threshold", "g_amplification", "g_min", "g_max"):
+        assert np.array_equal(getattr(compact, name).get_value(), getattr(nodenet, name).get_value())
+    # the expanded values are kept until the vector changes
+    value = compact.g_theta.get_value(borrow=True)
+    assert compact.g_theta.get_value(borrow=True) is value
+    assert compact.g_theta.get_value() is not value
+    compact_nodes[2].set_gate_parameter("gen", "theta", 0.25)
+    assert compact.g_theta.get_value(borrow=True) is not value
+    compact_nodes[2].set_gate_parameter("gen", "theta", 0)
+    for node, compact_node in zip(nodes, compact_nodes):
+        assert compact_node.get_gate_parameters() == node.get_gate_parameters()
+        node.activation = compact_node.activation = 1
+    for i in range(4):
+        nodenet.step()
+        compact.step()
+        assert np.array_equal(compact.a.get_value(), nodenet.a.get_value())
+
+    compact.delete_node(compact_nodes[1].uid)
+    assert len(compact.g_threshold.overrides) == 0
+
+    # both representations load what the other saved, and compact files only hold the deviating values
+    for saved, loading in ((nodenet, "False"), (compact, "True"), (compact, "False"), (nodenet, "True")):
+        filename = str(tmpdir.join("%s.json" % saved.uid))
+        saved.save(filename)
+        datafile = np.load(str(tmpdir.join("%s-data.npz" % saved.uid)))
+        if saved is nodenet:
+            assert 'g_threshold_elements' not in datafile
+            assert len(datafile['g_threshold']) == nodenet.NoE
+        else:
+            assert 'g_threshold' not in datafile
+            thresholds = [uid for uid in saved.get_node_uids() if 'threshold' in saved.get_node(uid).get_gate_parameters()['gen']]
+            assert len(datafile['g_threshold_elements']) == len(thresholds)
+        monkeypatch.setitem(settings['theano'], 'compact_gate_parameters', loading)
+        loaded = NumpyNodenet(name="Numpy", uid=saved.uid)
+        loaded.load(filename)
+        assert (loaded.gate_parameter_rows is not None) == (loading == "True")
+        for name in ("g_theta", "g_threshold", "g_amplification", "g_min", "g_max"):
+            assert np.array_equal(getattr(loaded, name).get_value(), getattr(saved, name).get_value())
+        for uid in saved.get_node_uids():
+            assert loaded.get_node(uid).get_gate_parameters() == saved.get_node(uid).get_gate_parameters()
@@ -0,0 +1,119 @@
+#!/usr/local/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the voxel raytracer used for minecraft vision
+"""
+
+import math
+import numpy as np
+from micropsi_core.world.minecraft import raytracing
+
+
+class VoxelGrid(object):
+    """A small world of air, with the blocks given by position, and nothingness outside of it"""
+
+    def __init__(self, blocks, size=16):
+        self.size = size
+        self.grid = np.zeros((size, raytracing.WORLD_HEIGHT, size), dtype=np.int64)
+        for (x, y, z), block_type in blocks.items():
+            self.grid[x, y, z] = block_type
+        self.lookups = 0
+
+    def get_block_types(self, x, y, z):
+        self.lookups += 1
+        inside = (x >= 0) & (x < self.size) & (y >= 0) & (y < raytracing.WORLD_HEIGHT) & (z >= 0) & (z < self.size)
+        block_types = np.full(len(x), -1, dtype=np.int64)
+        block_types[inside] = self.grid[x[inside], y[inside], z[inside]]
+        return block_types
+
+
+def wall(z):
+    """A wall of blocks filling the plane at z, of block type 10 + x"""
+    return dict(((x, y, z), 10 + x) for x in range(16) for y in range(8))
+
+
+def test_axis_aligned_rays():
+    world = VoxelGrid({(2, 1, 5): 3, (2, 4, 0): 7})
+    block_types, distances = raytracing.cast_rays(
+        world.get_block_types,
+        [(2.5, 1.5, 0.5), (2.5, 1.5, 0.5), (2.5, 1.5, 0.5)],
+        [(0, 0, 1), (0, 1, 0), (1, 0, 0)],
+        max_dist=32)
+    assert block_types[0] == 3
+    assert distances[0] == 4.5
+    # along y, the ray enters the block at (2, 4, 0) after 2.5
+    assert block_types[1] == 7
+    assert distances[1] == 2.5
+    # along x, the ray leaves the grid into nothingness and travels on up to max_dist
+    assert block_types[2] == -1
+    assert distances[2] == 32
+
+
+def test_diagonal_rays():
+    world = VoxelGrid(wall(4))
+    direction = np.array([1., 0., 2.]) / math.sqrt(5)
+    block_types, distances = raytracing.cast_rays(world.get_block_types, [(0.2, 1.5, 0.5)], [direction], 32)
+    # the ray crosses z=4 after 3.5 along z, at x = 0.2 + 3.5 / 2
+    assert distances[0] == np.float64(3.5 * math.sqrt(5) / 2)
+    assert block_types[0] == 11
+
+    # a ray through the edge between two voxels visits one of them first, and does not slip through the wall
+    world = VoxelGrid({(3, 1, 2): 5, (2, 1, 3): 6, (3, 1, 3): 7})
+    block_types, distances = raytracing.cast_rays(
+        world.get_block_types, [(0.5, 1.5, 0.5)], [np.array([1., 0., 1.]) / math.sqrt(2)], 32)
+    assert block_types[0] in (5, 6)
+    assert np.isclose(distances[0], 2.5 * math.sqrt(2))
+
+
+def test_rays_that_miss():
+    world = VoxelGrid(wall(12))
+    block_types, distances = raytracing.cast_rays(
+        world.get_block_types,
+        [(4.5, 1.5, 4.5), (4.5, 254.5, 4.5), (4.5, 1.5, 4.5)],
+        [(0, 0, -1), (0, 1, 0), (0, 0, 1)],
+        max_dist=5)
+    # into nothingness, into the sky, and towards a wall beyond max_dist, which is not seen
+    assert list(block_types) == [-1, -1, 0]
+    assert list(distances) == [5, 5, 5]
+
+
+def test_rays_leaving_the_world_stop():
+    world = VoxelGrid({})
+    block_types, distances = raytracing.cast_rays(
+        world.get_block_types, [(4.5, 250.5, 4.5)], [(0, 1, 0)], max_dist=1000)
+    assert block_types[0] == -1
+    assert distances[0] == 1000
+    # the ray is dropped once it left the world, instead of being traced for all of max_dist
+    assert world.lookups < 10
+
+
+def test_rays_are_traversed_together():
+    world = VoxelGrid(wall(9))
+    rand = np.random.RandomState(1)
+    origins = rand.uniform(1, 7, (20, 3))
+    directions = rand.normal(size=(20, 3))
+    directions /= np.sqrt((directions ** 2).sum(axis=1))[:, np.newaxis]
+    block_types, distances = raytracing.cast_rays(world.get_block_types, origins, directions, 24)
+    for i in range(20):
+        single_type, single_distance = raytracing.cast_rays(world.get_block_types, origins[i], directions[i], 24)
+        assert block_types[i] == single_type[0]
+        assert distances[i] == single_distance[0]
+
+
+def test_step_counts():
+    distances = np.array([0., 0.4, 1., 2.5, 40.])
+    assert list(raytracing.step_counts(distances, 32)) == [1, 1, 1, 3, 32]
+
+
+def test_project_looks_along_yaw():
+    world = VoxelGrid(dict(list(wall(10).items()) + [((12, y, 2), 9) for y in range(8)]))
+    offsets = raytracing.image_plane(4, 2, 0.1, 0.1, 1)
+    assert offsets.shape == (2, 4, 3)
+    block_types, distances = raytracing.project(world.get_block_types, (2.5, 2.5, 2.5), 0, 0, offsets, 32)
+    assert block_types.shape == (2, 4)
+    assert set(block_types.ravel()) == {12}
+    # looking along x instead of z
+    block_types, distances = raytracing.project(world.get_block_types, (2.5, 2.5, 2.5), 90, 0, offsets, 32)
+    assert set(block_types.ravel()) == {9}
+    assert np.all(distances < 9.5)
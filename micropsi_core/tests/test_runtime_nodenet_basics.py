@@ -42,7 +42,7 @@ def test_nodenet_data_gate_parameters(fixed_nodenet):
     micropsi.set_gate_parameters(fixed_nodenet, 'S', 'gen', {'threshold': 1})
     data = micropsi.nodenets[fixed_nodenet].data
     assert data['nodes']['S']['gate_parameters'] == {'gen': {'threshold': 1}}
-    defaults = Nodetype.GATE_DEFAULTS
+    defaults = Nodetype.GATE_DEFAULTS.copy()
     defaults.update({'threshold': 1})
     data = micropsi.nodenets[fixed_nodenet].get_node('S').data['gate_parameters']
     assert data == {'gen': defaults}
@@ -0,0 +1,58 @@
+#!/usr/local/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for pushing the state of nodenets to subscribers
+"""
+import threading
+
+from micropsi_core import runtime as micropsi
+
+
+def test_subscribers_share_updates(fixed_nodenet):
+    first = micropsi.subscribe(fixed_nodenet, monitors=True)
+    second = micropsi.subscribe(fixed_nodenet, monitors=True)
+    other = micropsi.subscribe(fixed_nodenet, include_links=False)
+    try:
+        update = micropsi.get_update(first, timeout=0)
+        assert update['current_nodenet_step'] == 0
+        assert 'monitors' in update
+        assert micropsi.get_update(first, timeout=0) is None
+        micropsi.step_nodenet(fixed_nodenet)
+        update = micropsi.get_update(first, timeout=0)
+        assert update['current_nodenet_step'] == 1
+        # put together once per step and setting
+        assert micropsi.get_update(second, timeout=0) is update
+        other_update = micropsi.get_update(other, timeout=0)
+        assert 'monitors' not in other_update
+        assert other_update['nodenet']['links'] == {}
+    finally:
+        for subscription in (first, second, other):
+            micropsi.unsubscribe(subscription)
+
+
+def test_slow_subscribers_get_the_newest_update(fixed_nodenet):
+    subscription = micropsi.subscribe(fixed_nodenet)
+    try:
+        micropsi.get_update(subscription, timeout=0)
+        for i in range(3):
+            micropsi.step_nodenet(fixed_nodenet)
+        update = micropsi.get_update(subscription, timeout=0)
+        assert update['current_nodenet_step'] == 3
+        assert subscription.skipped == 2
+    finally:
+        micropsi.unsubscribe(subscription)
+
+
+def test_subscribers_wait_for_steps(fixed_nodenet):
+    subscription = micropsi.subscribe(fixed_nodenet)
+    micropsi.get_update(subscription, timeout=0)
+    updates = []
+    waiting = threading.Thread(target=lambda: updates.append(micropsi.get_update(subscription, timeout=10)))
+    waiting.start()
+    micropsi.step_nodenet(fixed_nodenet)
+    waiting.join()
+    assert updates[0]['current_nodenet_step'] == 1
+    micropsi.unload_nodenet(fixed_nodenet)
+    assert subscription.closed
+    assert micropsi.get_update(subscription, timeout=0) is None
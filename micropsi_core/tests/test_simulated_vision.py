@@ -0,0 +1,53 @@
+#!/usr/local/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the memory-mapped dataset used to simulate minecraft vision
+"""
+
+import os
+import pytest
+from micropsi_core.world.minecraft import simulated_vision
+
+
+def create_datafile(tmpdir, rows=5, columns=4):
+    path = str(tmpdir.join('vision.csv'))
+    with open(path, 'w') as fp:
+        for i in range(rows):
+            fp.write(",".join(str(i + j / 10) for j in range(columns)) + "\n")
+    return path
+
+
+def test_dataset_converts_csv_once(tmpdir):
+    path = create_datafile(tmpdir)
+    dataset = simulated_vision.SimulatedVisionDataset(path)
+    assert os.path.isfile(str(tmpdir.join('vision.npy')))
+    assert len(dataset) == 5
+    assert list(dataset.sample(2)) == [2, 2.1, 2.2, 2.3]
+    mtime = os.path.getmtime(str(tmpdir.join('vision.npy')))
+    simulated_vision.SimulatedVisionDataset(path)
+    assert os.path.getmtime(str(tmpdir.join('vision.npy'))) == mtime
+
+
+def test_dataset_sequential_wraps_around(tmpdir):
+    dataset = simulated_vision.SimulatedVisionDataset(create_datafile(tmpdir))
+    assert [dataset.sample(i)[0] for i in range(7)] == [0, 1, 2, 3, 4, 0, 1]
+
+
+def test_dataset_shuffled_visits_every_entry_per_epoch(tmpdir):
+    dataset = simulated_vision.SimulatedVisionDataset(create_datafile(tmpdir))
+    first = [dataset.sample(i, 'shuffled')[0] for i in range(5)]
+    second = [dataset.sample(i, 'shuffled')[0] for i in range(5, 10)]
+    assert sorted(first) == sorted(second) == [0, 1, 2, 3, 4]
+    assert first == [dataset.sample(i, 'shuffled')[0] for i in range(5)]
+
+
+def test_dataset_unknown_order(tmpdir):
+    dataset = simulated_vision.SimulatedVisionDataset(create_datafile(tmpdir))
+    with pytest.raises(ValueError):
+        dataset.sample(0, 'backwards')
+
+
+def test_datasets_are_shared(tmpdir):
+    path = create_datafile(tmpdir)
+    assert simulated_vision.get_dataset(path) is simulated_vision.get_dataset(path)
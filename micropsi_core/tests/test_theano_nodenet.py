@@ -0,0 +1,199 @@
+#!/usr/local/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the theano engine, run only where theano is installed
+"""
+
+import numpy as np
+import pytest
+
+theano = pytest.importorskip("theano")
+
+from micropsi_core.nodenet.node import Nodetype
+from micropsi_core.nodenet.numpy_engine.numpy_nodenet import NumpyNodenet
+from micropsi_core.nodenet.theano_engine import theano_stepoperators
+from micropsi_core.nodenet.theano_engine.theano_nodenet import TheanoNodenet
+from micropsi_core.tests.random_nodenet import add_activator, build_random_nodenet, create_random_nodes, link_randomly, \
+    get_node_by_name
+
+from configuration import config as settings
+
+
+def build_nodenet(nodenet_class, seed=42):
+    nodenet = nodenet_class(name="Theano", uid="theano_test_nodenet")
+    netapi = nodenet.netapi
+    root = netapi.get_nodespace(None).uid
+    space = netapi.create_node("Nodespace", root, "space").uid
+    nodes, rand = build_random_nodenet(nodenet, ["Register", "Register", "Pipe"], [root, space], 40, 120, seed)
+    add_activator(netapi, nodes, space, "por")
+    return nodenet
+
+
+def assert_steps_equal(nodenet, reference, steps):
+    for i in range(steps):
+        nodenet.step()
+        reference.step()
+        assert np.allclose(nodenet.a.get_value(), reference.a.get_value(), atol=1e-5)
+
+
+def test_theano_nodenet_holds_shared_variables():
+    nodenet = build_nodenet(TheanoNodenet)
+    assert isinstance(nodenet.a, theano.compile.SharedVariable)
+    assert isinstance(nodenet.w, theano.compile.SharedVariable)
+    nodenet.step()
+    assert nodenet.current_step == 1
+
+
+def test_theano_steps_equal_numpy_steps():
+    nodenet = build_nodenet(TheanoNodenet)
+    reference = build_nodenet(NumpyNodenet)
+    assert np.array_equal(nodenet.a.get_value(), reference.a.get_value())
+    assert_steps_equal(nodenet, reference, 10)
+    assert np.any(nodenet.a.get_value())
+
+
+def test_theano_nodenet_skips_dormant_nodespaces():
+    nodenets = []
+    for i in range(2):
+        nodenet = build_nodenet(TheanoNodenet)
+        netapi = nodenet.netapi
+        root = netapi.get_nodespace(None).uid
+        spaces = [netapi.create_node("Nodespace", root, "dormant%d" % i).uid for i in range(3)]
+        rand = np.random.RandomState(23)
+        dormant = create_random_nodes(netapi, rand, ["Register", "Pipe"], spaces, 200, first=40)
+        link_randomly(netapi, rand, dormant, 200)
+        nodenets.append(nodenet)
+    nodenet, reference = nodenets
+    reference.nodespace_activity = None
+    skipped = False
+    for step in range(10):
+        nodenet.step()
+        reference.step()
+        assert np.allclose(nodenet.a.get_value(), reference.a.get_value(), atol=1e-5)
+        skipped = skipped or nodenet.nodespace_activity.elements is not None
+    assert skipped
+    assert not nodenet.nodespace_activity.live.all()
+
+
+def get_calculate(nodenet):
+    return [operator for operator in nodenet.stepoperators if isinstance(operator, theano_stepoperators.TheanoCalculate)][0]
+
+
+def test_theano_functions_are_compiled_once_and_bound_to_every_nodenet():
+    nodenet = build_nodenet(TheanoNodenet)
+    nodenet.step()
+    compiled = len(theano_stepoperators.theano_functions)
+    other = build_nodenet(TheanoNodenet)
+    reference = build_nodenet(NumpyNodenet)
+    reference.step()
+    other.step()
+    assert len(theano_stepoperators.theano_functions) == compiled
+    # the functions update the shared variables of their nodenet, and take no inputs
+    function = get_calculate(other).calculate_function
+    assert [item.variable for item in function.maker.inputs if item.update is not None] == [other.a]
+    assert not [item for item in function.maker.inputs if not item.implicit]
+    assert_steps_equal(other, reference, 5)
+    assert not np.allclose(nodenet.a.get_value(), other.a.get_value())
+
+
+def test_theano_functions_follow_loading(tmpdir):
+    nodenet = build_nodenet(TheanoNodenet)
+    reference = build_nodenet(NumpyNodenet)
+    assert_steps_equal(nodenet, reference, 3)
+    filename = str(tmpdir.join("theano_test_nodenet.json"))
+    nodenet.save(filename)
+    loaded = TheanoNodenet(name="Theano", uid="theano_test_nodenet")
+    loaded.step()
+    loaded.load(filename)
+    assert_steps_equal(loaded, reference, 3)
+
+
+def test_theano_nodenet_compact_gate_parameters(monkeypatch):
+    monkeypatch.setitem(settings['theano'], 'compact_gate_parameters', "True")
+    nodenet = build_nodenet(TheanoNodenet)
+    reference = build_nodenet(NumpyNodenet)
+    assert_steps_equal(nodenet, reference, 5)
+    assert get_calculate(nodenet).calculate_inputs == ('g_theta', 'g_threshold', 'g_amplification', 'g_min', 'g_max')
+
+
+def test_precompiled_theano_functions_are_used(monkeypatch):
+    monkeypatch.setattr(theano_stepoperators, "theano_functions", {})
+    nodenet = build_nodenet(TheanoNodenet)
+    theano_stepoperators.precompile_theano_functions(nodenet.sparse, nodenet.floatX, background=False)
+    assert len(theano_stepoperators.theano_functions) == 3
+    reference = build_nodenet(NumpyNodenet)
+    assert_steps_equal(nodenet, reference, 5)
+    assert len(theano_stepoperators.theano_functions) == 3
+
+
+def build_bound_nodenet(nodenet_class):
+    nodenet = build_nodenet(nodenet_class)
+    netapi = nodenet.netapi
+    root = netapi.get_nodespace(None).uid
+    for index, datasource in enumerate(("brightness", "temperature")):
+        sensor = netapi.create_node("Sensor", root, datasource)
+        sensor.set_parameter("datasource", datasource)
+        netapi.link(sensor, "gen", get_node_by_name(netapi, "n%d" % (10 + index)), "gen", 1)
+    for index, datatarget in enumerate(("engine", "light")):
+        actor = netapi.create_node("Actor", root, datatarget)
+        actor.set_parameter("datatarget", datatarget)
+        netapi.link(get_node_by_name(netapi, "n%d" % (20 + index)), "gen", actor, "gen", 1)
+    return nodenet
+
+
+def test_theano_step_many_equals_single_steps():
+    nodenet = build_bound_nodenet(TheanoNodenet)
+    reference = build_bound_nodenet(TheanoNodenet)
+    # an unlinked native module makes the reference fall back to single steps
+    reference.native_modules["Noop"] = Nodetype(nodenet=reference, name="Noop", slottypes=["gen"], gatetypes=["gen"])
+    reference.native_modules["Noop"].nodefunction = lambda netapi, node=None, **_: None
+    reference.netapi.create_node("Noop", reference.netapi.get_nodespace(None).uid, "noop")
+    datasource_values = np.random.RandomState(3).uniform(-1, 1, (6, 2))
+    datasources, datatargets = ["brightness", "temperature"], ["engine", "light", "unbound"]
+    values = nodenet.step_many(6, datasources, datasource_values, datatargets)
+    assert values.shape == (6, 3)
+    assert np.allclose(values, reference.step_many(6, datasources, datasource_values, datatargets), atol=1e-5)
+    assert values[:, :2].any() and not values[:, 2].any()
+    assert nodenet.current_step == reference.current_step == 6
+    for uid in nodenet.get_node_uids():
+        assert nodenet.get_node(uid).activation == pytest.approx(reference.get_node(uid).activation, abs=1e-5)
+    # the fused steps go on where single steps left off
+    nodenet.step()
+    reference.step()
+    assert np.allclose(nodenet.step_many(2, datatargets=datatargets), reference.step_many(2, datatargets=datatargets), atol=1e-5)
+
+
+def test_theano_ensemble_members_equal_single_nodenets():
+    thetas = [0, 0.5, -1]
+    nodenets = []
+    for theta in thetas:
+        nodenet = build_bound_nodenet(TheanoNodenet)
+        get_node_by_name(nodenet.netapi, "n1").set_gate_parameter("gen", "theta", theta)
+        nodenets.append(nodenet)
+    ensemble = build_bound_nodenet(TheanoNodenet)
+    uid = get_node_by_name(ensemble.netapi, "n1").uid
+    ensemble = ensemble.create_ensemble(len(thetas))
+    ensemble.set_gate_parameter(uid, "gen", "theta", thetas)
+    rand = np.random.RandomState(5)
+    for step in range(5):
+        datasource_values = rand.uniform(-1, 1, (len(thetas), 2))
+        ensemble.set_datasource_values("brightness", datasource_values[:, 0])
+        ensemble.set_datasource_values("temperature", datasource_values[:, 1])
+        ensemble.step()
+        for member, nodenet in enumerate(nodenets):
+            values = nodenet.step_many(1, ["brightness", "temperature"], datasource_values[member:member + 1],
+                                       ["engine", "light"])
+            assert np.allclose(values[0], [ensemble.get_datatarget_values("engine")[member],
+                                           ensemble.get_datatarget_values("light")[member]], atol=1e-5)
+            assert np.allclose(nodenet.a.get_value(), ensemble.a[:, member], atol=1e-5)
+    assert not np.allclose(ensemble.a[:, 0], ensemble.a[:, 1])
+
+
+def test_theano_ensemble_needs_a_calculate_operator():
+    nodenet = build_nodenet(TheanoNodenet)
+    ensemble = nodenet.create_ensemble(2)
+    nodenet.stepoperators = [operator for operator in nodenet.stepoperators
+                             if not isinstance(operator, theano_stepoperators.TheanoCalculate)]
+    with pytest.raises(ValueError):
+        ensemble.step()
@@ -0,0 +1,164 @@
+"""
+Caches the block types of loaded chunk columns as NumPy arrays.
+
+Spock stores every 16x16x16 chunk section as a flat array of block ids and metadata, which makes
+looking up a single voxel cheap, but looking up many voxels ( e.g. for raytracing ) slow. The cache
+converts every chunk column into one contiguous array of block types, indexed by (y, z, x), once,
+and keeps it in sync with spock's world: after spock unpacked a chunk column, the column is rebuilt
+lazily on the next lookup, and after spock changed a single block, that block is copied into the
+cached column.
+
+The cache hooks into the methods of spock's world that change it, instead of handling the packets
+that lead to the changes, so that it only ever acts once spock's world is up to date, no matter in
+which order spock runs the event handlers for a packet, or when the micropsi thread looks up blocks.
+"""
+
+import threading
+
+import numpy as np
+
+WORLD_HEIGHT = 256
+CHUNK_SIZE = 16
+COLUMN_KEY_OFFSET = 1 << 31
+
+
+class BlockCache(object):
+
+    def __init__(self, world):
+        """
+        world is spock's World, which holds the chunk columns addressed by (x, z)
+        """
+        self.world = world
+        self.columns = {}
+        self.lock = threading.Lock()
+        self.observe('unpack_column', self.on_unpack_column)
+        self.observe('unpack_bulk', self.on_unpack_bulk)
+        self.observe('set_block', self.on_set_block)
+        self.observe('new_dimension', self.on_new_dimension)
+
+    def observe(self, method_name, callback):
+        """ Calls callback with the arguments of the given method of the world, after each call of the method """
+        method = getattr(self.world, method_name)
+
+        def observed(*args, **kwargs):
+            result = method(*args, **kwargs)
+            callback(*args, **kwargs)
+            return result
+
+        setattr(self.world, method_name, observed)
+
+    def invalidate(self, column_x, column_z):
+        """ Drops a chunk column, so that it is rebuilt on its next lookup """
+        with self.lock:
+            self.columns.pop((column_x, column_z), None)
+
+    def invalidate_all(self):
+        with self.lock:
+            self.columns = {}
+
+    def on_unpack_column(self, data, *args, **kwargs):
+        self.invalidate(data['chunk_x'], data['chunk_z'])
+
+    def on_unpack_bulk(self, data, *args, **kwargs):
+        for meta in data['metadata']:
+            self.invalidate(meta['chunk_x'], meta['chunk_z'])
+
+    def on_new_dimension(self, *args, **kwargs):
+        self.invalidate_all()
+
+    def on_set_block(self, x, y, z, *args, **kwargs):
+        """ Copies the block spock just changed into the cached column """
+        x, y, z = int(x), int(y), int(z)
+        if not 0 <= y < WORLD_HEIGHT:
+            return
+        column_x, rx = divmod(x, CHUNK_SIZE)
+        column_z, rz = divmod(z, CHUNK_SIZE)
+        key = (column_x, column_z)
+        with self.lock:
+            cached = self.columns.get(key)
+            if cached is None:
+                return
+            column = self.world.columns.get(key)
+            chunk = column.chunks[y // CHUNK_SIZE] if column is not None else None
+            if chunk is None or not chunk.block_data.data or not cached[1][y // CHUNK_SIZE]:
+                # the section was not loaded, or is gone
+                del self.columns[key]
+                return
+            ry = y % CHUNK_SIZE
+            cached[0][y, rz, rx] = chunk.block_data.data[(ry * CHUNK_SIZE + rz) * CHUNK_SIZE + rx] >> 4
+
+    def get_column(self, column_x, column_z):
+        """
+        Returns a tuple ( blocks, loaded ) for the given chunk column, where blocks is a uint16 array
+        of shape (256, 16, 16) holding the block types indexed by (y, z, x), and loaded is a boolean
+        array telling which of the 16 chunk sections are loaded.
+        Returns None if the column is not loaded.
+        """
+        key = (column_x, column_z)
+        with self.lock:
+            if key not in self.columns:
+                self.columns[key] = self.build_column(self.world.columns.get(key))
+            return self.columns[key]
+
+    def build_column(self, column):
+        if column is None:
+            return None
+        blocks = np.zeros((WORLD_HEIGHT, CHUNK_SIZE, CHUNK_SIZE), dtype=np.uint16)
+        loaded = np.zeros(WORLD_HEIGHT // CHUNK_SIZE, dtype=bool)
+        for index, chunk in enumerate(column.chunks):
+            if chunk is None:
+                continue
+            loaded[index] = True
+            data = chunk.block_data.data
+            if data:
+                section = np.array(data, dtype=np.uint16).reshape(CHUNK_SIZE, CHUNK_SIZE, CHUNK_SIZE)
+                blocks[index * CHUNK_SIZE:(index + 1) * CHUNK_SIZE] = section >> 4
+        return blocks, loaded
+
+    def get_block_type(self, x, y, z):
+        """
+        Get the block type of a particular voxel, or -1 if it is out of the world or not loaded.
+        """
+        x, y, z = int(x), int(y), int(z)
+        if not 0 <= y < WORLD_HEIGHT:
+            return -1
+        column_x, rx = divmod(x, CHUNK_SIZE)
+        column_z, rz = divmod(z, CHUNK_SIZE)
+        column = self.get_column(column_x, column_z)
+        if column is None or not column[1][y // CHUNK_SIZE]:
+            return -1
+        return int(column[0][y, rz, rx])
+
+    def get_block_types(self, x, y, z):
+        """
+        Get the block types of many voxels at once, given as equally shaped arrays of x, y and z coordinates.
+        Voxels that are out of the world or not loaded get the block type -1.
+        """
+        x = np.asarray(x).astype(np.int64)
+        y = np.asarray(y).astype(np.int64)
+        z = np.asarray(z).astype(np.int64)
+        block_types = np.full(x.shape, -1, dtype=np.int64)
+
+        in_world = np.nonzero((y >= 0) & (y < WORLD_HEIGHT))
+        x, y, z = x[in_world], y[in_world], z[in_world]
+        column_x, rx = np.divmod(x, CHUNK_SIZE)
+        column_z, rz = np.divmod(z, CHUNK_SIZE)
+
+        # look up the voxels column by column, grouping them by a combined column key
+        keys, inverse = np.unique((column_x << 32) + (column_z + COLUMN_KEY_OFFSET), return_inverse=True)
+        order = np.argsort(inverse, kind='mergesort')
+        bounds = np.searchsorted(inverse[order], np.arange(len(keys) + 1))
+        found = np.full(len(x), -1, dtype=np.int64)
+        for index, key in enumerate(keys.tolist()):
+            column = self.get_column(key >> 32, (key & 0xFFFFFFFF) - COLUMN_KEY_OFFSET)
+            if column is None:
+                continue
+            blocks, loaded = column
+            selected = order[bounds[index]:bounds[index + 1]]
+            ys = y[selected]
+            found[selected] = np.where(
+                loaded[ys // CHUNK_SIZE],
+                blocks[ys, rz[selected], rx[selected]],
+                -1)
+        block_types[in_world] = found
+        return block_types
@@ -0,0 +1,57 @@
+"""
+Features of fovea patches for MinecraftGraphLocomotion.
+
+A fovea patch is an array of block types of shape (patch_height, patch_width), as returned by
+raytracing.project. The functions below turn it into the values of the fov_hist__ and fov__
+datasources.
+"""
+
+import numpy as np
+
+
+def block_type_histogram(block_types, histogram_datasources):
+    """
+    Returns the normalized frequency of every block type in the patch that has a datasource,
+    by datasource name, given a dict mapping block types to datasource names.
+    Datasources of block types not seen in the patch get 0.
+    """
+    histogram = dict.fromkeys(histogram_datasources.values(), 0.)
+    seen_types, counts = np.unique(block_types, return_counts=True)
+    for bt, count in zip(seen_types.tolist(), counts.tolist()):
+        if bt in histogram_datasources:
+            histogram[histogram_datasources[bt]] = count / block_types.size
+    return histogram
+
+
+def normalize_patch(block_types):
+    """
+    Maps air and nothingness to 0, all other blocks to 1, subtracts the mean, truncates to
+    +/- 3 standard deviations and scales the result to [0.1, 0.9].
+    Returns zeros if all block types of the patch are the same.
+    """
+    block_types = np.asarray(block_types)
+    if np.all(block_types == block_types.flat[0]):
+        return np.zeros(block_types.shape)
+
+    patch = (block_types > 0).astype(float)
+    patch -= patch.mean()
+    pstd = 3.0 * np.sqrt(np.mean(patch ** 2))
+    # if block types are all air or all solid, std will be 0, therefore
+    if pstd == 0.0:
+        patch[:] = 0.
+    else:
+        np.clip(patch, -pstd, pstd, out=patch)
+        patch /= pstd
+    return (1.0 + patch) * 0.4 + 0.1
+
+
+def fovea_window(patch, patch_width, patch_height, num_fov):
+    """
+    Returns the num_fov x num_fov window of the given patch that is fed to the fov__ datasources:
+    horizontally centered and vertically 3/4 lower, if num_fov is less than patch height and width.
+    patch is given row by row, as array of shape (patch_height, patch_width) or flat.
+    """
+    left_margin = max(0, (int(patch_width - num_fov) // 2) - 1)
+    top_margin = max(0, (int(patch_height - num_fov) // 4 * 3) - 1)
+    patch = np.asarray(patch, dtype=float).reshape(patch_height, patch_width)
+    return patch[top_margin:top_margin + num_fov, left_margin:left_margin + num_fov]
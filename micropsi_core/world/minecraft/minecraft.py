@@ -11,6 +11,7 @@ from spock.plugins.helpers.reconnect import ReConnectPlugin
 from micropsi_core.world.world import World
 from micropsi_core.world.worldadapter import WorldAdapter
 from micropsi_core.world.minecraft.spockplugin import MicropsiPlugin
+from micropsi_core.world.minecraft import raytracing
 from micropsi_core.world.minecraft.minecraft_graph_locomotion import MinecraftGraphLocomotion
 
 
@@ -152,7 +153,6 @@ class Minecraft2D(Minecraft):
     def get_perspective_projection(self, agent_info):
         """
         """
-        from math import sqrt
         from micropsi_core.world.minecraft import structs
 
         # specs
@@ -194,121 +194,25 @@ class Minecraft2D(Minecraft):
         # 180 - upside down straight backwards
         # 270 - straight up
 
-        # span viewport
-        tick_w = cam_width / im_width / resolution
-        tick_h = cam_height / im_height / resolution
-        # the horizontal plane is split half-half, the vertical plane is shifted upwards wrt the agent's position
-        h_line = [i for i in self.frange(position[0] - 0.5 * cam_width, position[0] + 0.5 * cam_width, tick_w)]
-        v_line = [i for i in self.frange(position[1] - 0.05 * cam_height, position[1] + 0.95 * cam_height, tick_h)]
-
-        # compute pixel values of image plane
-        projection = tuple()
-
-        x0, y0, z0 = position   # agent's position aka projective point
-        zi = z0 + focal_length
-
-        for xi in reversed(h_line):
-            for yi in reversed(v_line):
-
-                distance = 0    # just a counter
-                block_type = 0
-                xb, yb, zb = xi, yi, zi
-
-                # compute difference vector between projective point and image point
-                diff = (xi - x0, yi - y0, zi - z0)
-
-                # normalize difference vector
-                magnitude = sqrt(diff[0] ** 2 + diff[1] ** 2 + diff[2] ** 2)
-                if magnitude == 0.:
-                    magnitude = 1.
-                norm = (diff[0] / magnitude, diff[1] / magnitude, diff[2] / magnitude)
-
-                # rotate norm vector
-                norm = self.rotate_around_x_axis(norm, pitch)
-                norm = self.rotate_around_y_axis(norm, yaw)
-
-                # rotate diff vector
-                diff = self.rotate_around_x_axis(diff, pitch)
-                diff = self.rotate_around_y_axis(diff, yaw)
-
-                # add diff to projection point aka agent's position
-                xb, yb, zb = x0 + diff[0], y0 + diff[1], z0 + diff[2]
-
-                while block_type <= 0:  # which is air
-
-                    # check block type of next distance point along ray
-                    # aka add normalized difference vector to image point
-                    xb = xb + norm[0]
-                    yb = yb + norm[1]
-                    zb = zb + norm[2]
-
-                    block_type = self.spockplugin.get_block_type(
-                        int(xb),
-                        int(yb),
-                        int(zb),
-                    )
-
-                    distance += 1
-                    if distance >= max_dist:
-                        break
-
-                # add block name, distance to projection plane
-                # hm, if block_type unknown, expect an exception
-                if structs.block_names.get(str(block_type)):
-                    block_name = structs.block_names[str(block_type)]
-                projection += (block_name, distance)
-
-        self.data['projection'] = projection
-
-    def rotate_around_x_axis(self, pos, angle):
-        """ Rotate a 3D point around the x-axis given a specific angle. """
-        from math import radians, cos, sin
-
-        # convert angle in degrees to radians
-        theta = radians(angle)
-
-        # rotate vector
-        x = pos[0]
-        y = pos[1] * cos(theta) - pos[2] * sin(theta)
-        z = pos[1] * sin(theta) + pos[2] * cos(theta)
-
-        return (x, y, z)
-
-    def rotate_around_y_axis(self, pos, angle):
-        """ Rotate a 3D point around the y-axis given a specific angle. """
-        from math import radians, cos, sin
-
-        # convert angle in degrees to radians
-        theta = radians(angle)
-
-        # rotate vector
-        x = pos[0] * cos(theta) + pos[2] * sin(theta)
-        y = pos[1]
-        z = - pos[0] * sin(theta) + pos[2] * cos(theta)
-
-        return (x, y, z)
-
-    def rotate_around_z_axis(self, pos, angle):
-        """ Rotate a 3D point around the z-axis given a specific angle. """
-        from math import radians, cos, sin
-
-        # convert angle in degrees to radians
-        theta = radians(angle)
-
-        # rotate vector
-        x = pos[0] * cos(theta) - pos[1] * sin(theta)
-        y = pos[0] * sin(theta) + pos[1] * cos(theta)
-        z = pos[2]
-
-        return (x, y, z)
-
-    def frange(self, start, end, step):
-        """
-        Range for floats.
-        """
-        while start < end:
-            yield start
-            start += step
+        # span viewport, and cast a ray through every pixel
+        offsets = raytracing.image_plane(
+            im_width * resolution, im_height * resolution, cam_width, cam_height, focal_length)
+        block_types, distances = raytracing.project(
+            self.spockplugin.get_block_types, position, yaw, pitch, offsets, max_dist)
+
+        # the projection is walked right to left, top to bottom, as expected by the frontend
+        block_types = block_types.T[::-1].ravel()
+        distances = raytracing.step_counts(distances.T[::-1].ravel(), max_dist)
+
+        # add block name, distance to projection plane
+        projection = []
+        block_name = structs.block_names["-1"]
+        for block_type, distance in zip(block_types.tolist(), distances.tolist()):
+            if structs.block_names.get(str(block_type)):
+                block_name = structs.block_names[str(block_type)]
+            projection.extend((block_name, distance))
+
+        self.data['projection'] = tuple(projection)
 
 
 class MinecraftWorldAdapter(WorldAdapter):
@@ -5,8 +5,11 @@ import random
 import logging
 import time
 from functools import partial
-from math import sqrt, radians, cos, sin, tan
+import numpy as np
 from spock.mcp.mcpacket import Packet
+from micropsi_core.world.minecraft import raytracing
+from micropsi_core.world.minecraft import fovea
+from micropsi_core.world.minecraft import simulated_vision
 
 
 class MinecraftGraphLocomotion(WorldAdapter):
@@ -244,19 +247,33 @@ class MinecraftGraphLocomotion(WorldAdapter):
         self.spockplugin.event.reg_event_handler('PLAY<Player Position and Look', self.server_set_position)
         self.spockplugin.event.reg_event_handler('PLAY<Chat Message', self.server_chat_message)
 
-        # add datasources for fovea
-        for i in range(self.num_fov):
-            for j in range(self.num_fov):
-                name = "fov__%02d_%02d" % (i, j)
-                self.datasources[name] = 0.
+        # span the image plane once; fovea patches are slices of it
+        self.image_plane = raytracing.image_plane(
+            int(self.im_width * self.resolution_w),
+            int(self.im_height * self.resolution_h),
+            self.cam_width,
+            self.cam_height,
+            self.focal_length)
+
+        # add datasources for fovea, and the preallocated fovea they are written from, row by row
+        self.fovea = np.zeros((self.num_fov, self.num_fov))
+        self.fovea_datasources = ["fov__%02d_%02d" % (i, j) for i in range(self.num_fov) for j in range(self.num_fov)]
+        for name in self.fovea_datasources:
+            self.datasources[name] = 0.
+
+        # map block types to their histogram datasources
+        self.fov_hist_datasources = {}
+        for name in self.supported_datasources:
+            if name.startswith('fov_hist__'):
+                self.fov_hist_datasources[int(name[len('fov_hist__'):])] = name
 
         self.simulated_vision = False
         if 'simulate_vision' in cfg['minecraft']:
             self.simulated_vision = True
             self.simulated_vision_datafile = cfg['minecraft']['simulate_vision']
+            self.simulated_vision_order = cfg['minecraft'].get('simulate_vision_order', 'sequential')
             self.logger.info("Setting up minecraft_graph_locomotor to simulate vision from data file %s", self.simulated_vision_datafile)
-            import csv
-            self.simulated_vision_datareader = csv.reader(open(self.simulated_vision_datafile))
+            self.simulated_vision_data = simulated_vision.get_dataset(self.simulated_vision_datafile)
 
     def server_chat_message(self, event, data):
         if data.data and 'json_data' in data.data:
@@ -521,78 +538,26 @@ class MinecraftGraphLocomotion(WorldAdapter):
         # consider setting yaw to a random value between 0 and 359
         pitch = self.spockplugin.clientinfo.position['pitch']
 
-        # compute ticks per dimension
-        tick_w = self.cam_width / self.im_width / self.resolution_w
-        tick_h = self.cam_height / self.im_height / self.resolution_h
-
-        # span image plane
-        # the horizontal plane is split half-half, the vertical plane is shifted upwards
-        h_line = [i for i in self.frange(pos_x - 0.5 * self.cam_width, pos_x + 0.5 * self.cam_width, tick_w)]
-        v_line = [i for i in self.frange(pos_y - 0.05 * self.cam_height, pos_y + 0.95 * self.cam_height, tick_h)]
-
         # scale up fov_x, fov_y
         fov_x = round(fov_x * (self.im_width * self.resolution_w - self.patch_width))
         fov_y = round(fov_y * (self.im_height * self.resolution_h - self.patch_height))
 
-        x0, y0, z0 = pos_x, pos_y, pos_z  # agent's position aka projective point
-        zi = z0 + self.focal_length
-
-        v_line.reverse()
-
         # compute block type values for the whole patch /fovea
-        patch = []
-        for i in range(self.patch_height):
-            for j in range(self.patch_width):
-                try:
-                    block_type, distance = self.project(h_line[fov_x + j], v_line[fov_y + i], zi, x0, y0, z0, yaw, pitch)
-                except IndexError:
-                    block_type, distance = -1, -1
-                    self.logger.warning("IndexError at (%d,%d)" % (fov_x + j, fov_y + i))
-                patch.append(block_type)
+        offsets = self.image_plane[fov_y:fov_y + self.patch_height, fov_x:fov_x + self.patch_width]
+        block_types, distances = raytracing.project(
+            self.spockplugin.get_block_types, (pos_x, pos_y, pos_z), yaw, pitch, offsets, self.max_dist)
+        if block_types.shape != (self.patch_height, self.patch_width):
+            self.logger.warning("fovea patch at (%d,%d) exceeds the image plane" % (fov_x, fov_y))
+            padded = np.full((self.patch_height, self.patch_width), -1, dtype=block_types.dtype)
+            padded[:block_types.shape[0], :block_types.shape[1]] = block_types
+            block_types = padded
 
         # write block type histogram values to self.datasources['fov_hist__*']
         # for every block type seen in patch, if there's a datasource for it, fill it with its normalized frequency
-        normalizer = self.patch_width * self.patch_height
-        # reset fov_hist sensors, then fill them with new values
-        for k in self.datasources.keys():
-            if k.startswith('fov_hist__'):
-                self.datasources[k] = 0.
-        for bt in set(patch):
-            name = "fov_hist__%03d" % bt
-            if name in self.datasources:
-                self.datasources[name] = patch.count(bt) / normalizer
-
-        # COMPUTE VALUES FOR fov__%02d_%02d SENSORS
-        # if all values in the patch are the same, write zeros
-        if patch[1:] == patch[:-1]:
-
-            zero_patch = True
-            patch_resc = [0.0] * self.patch_width * self.patch_height
-
-        else:
-
-            zero_patch = False
-            # convert block types into binary values: map air and emptiness to black (0), everything else to white (1)
-            patch_ = [0.0 if v <= 0 else 1.0 for v in patch]
-
-            # normalize block type values
-            # subtract patch mean
-            mean = float(sum(patch_)) / len(patch_)
-            patch_avg = [x - mean for x in patch_]  # TODO: throws error in ipython - why not here !?
-
-            # truncate to +/- 3 standard deviations and scale to -1 and +1
-            var = [x ** 2.0 for x in patch_avg]
-            std = (sum(var) / len(var)) ** 0.5
-            pstd = 3.0 * std
-            # if block types are all the same number, eg. -1, std will be 0, therefore
-            if pstd == 0.0:
-                patch_std = [0.0 for x in patch_avg]
-            else:
-                patch_std = [max(min(x, pstd), -pstd) / pstd for x in patch_avg]
-
-            # scale from [-1,+1] to [0.1,0.9] and write values to sensors
-            patch_resc = [(1.0 + x) * 0.4 + 0.1 for x in patch_std]
+        self.datasources.update(fovea.block_type_histogram(block_types, self.fov_hist_datasources))
 
+        # compute values for fov__%02d_%02d sensors
+        patch_resc = fovea.normalize_patch(block_types)
         self.write_visual_input_to_datasources(patch_resc, self.patch_width, self.patch_height)
 
     def simulate_visual_input(self):
@@ -602,122 +567,16 @@ class MinecraftGraphLocomotion(WorldAdapter):
             self.datatarget_feedback['vision_simulator'] = 1.0
         # change visual input
         elif self.world.current_step % 4 == 1:
-            line = next(self.simulated_vision_datareader, None)
-            if line is None:
-                self.logger.info("Simulating vision from data file, starting over...")
-                import csv
-                self.simulated_vision_datareader = csv.reader(open(self.simulated_vision_datafile))
-                line = next(self.simulated_vision_datareader)
-            line = [float(entry) for entry in line]
-            self.write_visual_input_to_datasources(line, self.num_fov, self.num_fov)
-
-        # if self.world.current_step % 4 == 0:
-        #    entry_index = (self.world.current_step / 4) % len(self.simulated_vision_data)
-        #    if entry_index == 0:
-        #        self.logger.info("Simulating vision from data file with %i entries...", len(self.simulated_vision_data))
-        #    self.write_visual_input_to_datasources(self.simulated_vision_data[entry_index], self.num_fov, self.num_fov)
+            sample = self.world.current_step // 4
+            if sample % len(self.simulated_vision_data) == 0:
+                self.logger.info("Simulating vision from data file with %i entries...", len(self.simulated_vision_data))
+            entry = self.simulated_vision_data.sample(sample, self.simulated_vision_order)
+            self.write_visual_input_to_datasources(entry, self.num_fov, self.num_fov)
 
     def write_visual_input_to_datasources(self, patch, patch_width, patch_height):
         """
         Write a patch of the size self.num_fov times self.num_fov to self.datasourcesp['fov__*_*'].
         If num_fov is less than patch height and width, chose the horizontally centered , vertically 3/4 lower patch.
         """
-        left_margin = max(0, (int(patch_width - self.num_fov) // 2) - 1)
-        top_margin = max(0, (int(patch_height - self.num_fov) // 4 * 3) - 1)
-        for i in range(self.num_fov):
-            for j in range(self.num_fov):
-                name = 'fov__%02d_%02d' % (i, j)
-                self.datasources[name] = patch[(patch_height * (i + top_margin)) + j + left_margin]
-
-    def project(self, xi, yi, zi, x0, y0, z0, yaw, pitch):
-        """
-        Given a point on the projection plane and the agent's position, cast a
-        ray to find the nearest block type that isn't air and its distance from
-        the projective plane.
-        """
-        distance = 0    # just a counter
-        block_type = -1  # consider mapping nothingness to air, ie. -1 to 0
-
-        # compute difference vector between projective point and image point
-        diff = (xi - x0, yi - y0, zi - z0)
-
-        # normalize difference vector
-        magnitude = sqrt(diff[0] ** 2 + diff[1] ** 2 + diff[2] ** 2)
-        if magnitude == 0.:
-            magnitude = 1.
-        norm = (diff[0] / magnitude, diff[1] / magnitude, diff[2] / magnitude)
-
-        # rotate norm vector
-        norm = self.rotate_around_x_axis(norm, pitch)
-        norm = self.rotate_around_y_axis(norm, yaw)
-
-        # rotate diff vector
-        diff = self.rotate_around_x_axis(diff, pitch)
-        diff = self.rotate_around_y_axis(diff, yaw)
-
-        # add diff to projection point aka agent's position
-        xb, yb, zb = x0 + diff[0], y0 + diff[1], z0 + diff[2]
-
-        while block_type <= 0:  # which is air and nothingness
-
-            # check block type of next distance point along ray
-            # aka add normalized difference vector to image point
-            # TODO: consider a more efficient way to move on the ray, eg. a log scale
-            xb += norm[0]
-            yb += norm[1]
-            zb += norm[2]
-
-            block_type = self.spockplugin.get_block_type(xb, yb, zb)
-
-            distance += 1
-            if distance >= self.max_dist:
-                break
-
-        return block_type, distance
-
-    def rotate_around_x_axis(self, pos, angle):
-        """ Rotate a 3D point around the x-axis given a specific angle. """
-
-        # convert angle in degrees to radians
-        theta = radians(angle)
-
-        # rotate vector
-        xx, y, z = pos
-        yy = y * cos(theta) - z * sin(theta)
-        zz = y * sin(theta) + z * cos(theta)
-
-        return (xx, yy, zz)
-
-    def rotate_around_y_axis(self, pos, angle):
-        """ Rotate a 3D point around the y-axis given a specific angle. """
-
-        # convert angle in degrees to radians
-        theta = radians(angle)
-
-        # rotate vector
-        x, yy, z = pos
-        xx = x * cos(theta) + z * sin(theta)
-        zz = - x * sin(theta) + z * cos(theta)
-
-        return (xx, yy, zz)
-
-    def rotate_around_z_axis(self, pos, angle):
-        """ Rotate a 3D point around the z-axis given a specific angle. """
-
-        # convert angle in degrees to radians
-        theta = radians(angle)
-
-        # rotate vector
-        x, y, zz = pos
-        xx = x * cos(theta) - y * sin(theta)
-        yy = x * sin(theta) + y * cos(theta)
-
-        return (xx, yy, zz)
-
-    def frange(self, start, end, step):
-        """
-        Range for floats.
-        """
-        while start < end:
-            yield start
-            start += step
+        self.fovea[:] = fovea.fovea_window(patch, patch_width, patch_height, self.num_fov)
+        self.datasources.update(zip(self.fovea_datasources, self.fovea.ravel().tolist()))
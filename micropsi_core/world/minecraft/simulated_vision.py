@@ -0,0 +1,80 @@
+"""
+Indexed access to recorded visual input, used to simulate vision offline.
+
+The recorded data is a CSV file with one fovea patch per line. It is converted once into a binary .npy
+file next to it ( and again whenever the CSV file is newer ), which is then memory-mapped, so that
+entries can be read by index without parsing, and all agents in a process share one mapping.
+"""
+
+import os
+import threading
+
+import numpy as np
+
+ORDERS = ('sequential', 'shuffled', 'random')
+
+_datasets = {}
+_datasets_lock = threading.Lock()
+
+
+def get_dataset(path):
+    """ Returns the dataset for the given data file, shared by all agents in this process """
+    path = os.path.abspath(os.path.expanduser(path))
+    with _datasets_lock:
+        if path not in _datasets:
+            _datasets[path] = SimulatedVisionDataset(path)
+        return _datasets[path]
+
+
+def convert(path):
+    """
+    Converts the given CSV file into a .npy file next to it, unless that exists and is up to date.
+    Returns the path of the .npy file.
+    """
+    if path.endswith('.npy'):
+        return path
+    npy_path = os.path.splitext(path)[0] + '.npy'
+    if not os.path.isfile(npy_path) or os.path.getmtime(npy_path) < os.path.getmtime(path):
+        data = np.loadtxt(path, delimiter=',', ndmin=2)
+        # write to a temporary file first, so that concurrent readers never see a partial file
+        tmp_path = "%s.%d.tmp.npy" % (os.path.splitext(path)[0], os.getpid())
+        np.save(tmp_path, data)
+        os.replace(tmp_path, npy_path)
+    return npy_path
+
+
+class SimulatedVisionDataset(object):
+
+    def __init__(self, path):
+        self.path = path
+        self.data = np.load(convert(path), mmap_mode='r')
+        self._permutation = (None, None)
+
+    def __len__(self):
+        return len(self.data)
+
+    def sample(self, number, order='sequential', seed=0):
+        """
+        Returns the entry presented as the number-th sample.
+        order is one of
+            sequential: entries in file order, starting over at the end
+            shuffled: every pass over the data visits all entries once, in a different order
+            random: entries are drawn independently and uniformly
+        The same number, order and seed always give the same entry.
+        """
+        if order not in ORDERS:
+            raise ValueError("Unknown order %s, must be one of %s" % (order, ", ".join(ORDERS)))
+        epoch, index = divmod(number, len(self.data))
+        if order == 'shuffled':
+            index = self.get_permutation(epoch, seed)[index]
+        elif order == 'random':
+            index = np.random.RandomState([seed, number]).randint(len(self.data))
+        return self.data[index]
+
+    def get_permutation(self, epoch, seed):
+        key, permutation = self._permutation
+        if key != (epoch, seed):
+            permutation = np.random.RandomState([seed, epoch]).permutation(len(self.data))
+            # agents may share this dataset, so replace key and permutation together
+            self._permutation = ((epoch, seed), permutation)
+        return permutation
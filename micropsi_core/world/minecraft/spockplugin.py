@@ -3,6 +3,7 @@ from spock.mcmap import smpmap
 from spock.mcp import mcdata, mcpacket
 from spock.mcp.mcpacket import Packet
 from spock.utils import pl_announce
+from micropsi_core.world.minecraft.blockcache import BlockCache
 
 
 STANCE_ADDITION = 1.620
@@ -30,6 +31,9 @@ class MicropsiPlugin(object):
             self.update_inventory
         )
 
+        # the block cache follows the changes of spock's world
+        self.block_cache = BlockCache(self.world)
+
         # make references between micropsi world and MicropsiPlugin
         self.micropsi_world = settings['micropsi_world']
         self.micropsi_world.spockplugin = self
@@ -73,19 +77,13 @@ class MicropsiPlugin(object):
         """
         Get the block type of a particular voxel.
         """
-        x, y, z = int(x), int(y), int(z)
-        x, rx = divmod(x, 16)
-        y, ry = divmod(y, 16)
-        z, rz = divmod(z, 16)
-
-        if (x, z) not in self.world.columns or y > 0x0F:
-            return -1  # was 0
-        column = self.world.columns[(x, z)]
-        chunk = column.chunks[y]
-        if chunk is None:
-            return -1  # was 0
-
-        return chunk.block_data.get(rx, ry, rz) >> 4
+        return self.block_cache.get_block_type(x, y, z)
+
+    def get_block_types(self, x, y, z):
+        """
+        Get the block types of many voxels at once, given as equally long arrays of x, y and z coordinates.
+        """
+        return self.block_cache.get_block_types(x, y, z)
 
     def get_biome_info(self, pos=None):
         from spock.mcmap.mapdata import biomes
@@ -24,9 +24,15 @@ from micropsi_server.bottle import Bottle, route, post, run, request, response,
 import argparse
 import os
 import json
+import gzip
+import zlib
+import functools
+import hashlib
 import inspect
+import threading
 from micropsi_server import minidoc
-from configuration import DEFAULT_HOST, DEFAULT_PORT, VERSION, APPTITLE
+from configuration import DEFAULT_HOST, DEFAULT_PORT, VERSION, APPTITLE, SERVER_THREADS, QUEUED_REQUESTS_PER_NODENET, \
+    PUSH_STREAMS
 
 APP_PATH = os.path.dirname(__file__)
 
@@ -41,7 +47,77 @@ bottle.TEMPLATE_PATH.insert(1, os.path.join(APP_PATH, 'static', ''))
 usermanager = usermanagement.UserManager()
 
 
-def rpc(command, route_prefix="/rpc/", method="GET", permission_required=None):
+class NodenetQueue(object):
+    """Lets the requests for one nodenet run one after the other, in the order they arrived, so that they don't
+    compete for the nodenet's netlock, and no more than a given number of worker threads wait for the nodenet"""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.next_ticket = 0
+        self.serving = 0
+
+    def acquire(self, limit):
+        """Waits until all requests that arrived earlier are done. Returns False without waiting if the given
+        number of requests is waiting already"""
+        with self.condition:
+            if self.next_ticket - self.serving > limit:
+                return False
+            ticket = self.next_ticket
+            self.next_ticket += 1
+            while self.serving != ticket:
+                self.condition.wait()
+            return True
+
+    def release(self):
+        with self.condition:
+            self.serving += 1
+            self.condition.notify_all()
+
+
+nodenet_queues = {}
+nodenet_queues_lock = threading.Lock()
+
+
+def get_nodenet_queue(nodenet_uid):
+    with nodenet_queues_lock:
+        if nodenet_uid not in nodenet_queues:
+            nodenet_queues[nodenet_uid] = NodenetQueue()
+        return nodenet_queues[nodenet_uid]
+
+
+# responses of at least this many bytes are compressed, if the client accepts it
+COMPRESSION_MIN_SIZE = 1024
+
+# seconds the browser may use static files without asking the server again
+STATIC_MAX_AGE = 24 * 3600
+
+# commands that only read state. All other commands may change nodenets or worlds, and invalidate the ETags
+# of state queries by increasing state_revision, as do the other routes that change them, see changes_state
+READ_ONLY_COMMANDS = ('get_', 'export_', 'generate_', 'select_', 'load_')
+
+state_revision = 0
+state_revision_lock = threading.Lock()
+
+
+def increase_state_revision():
+    global state_revision
+    with state_revision_lock:
+        state_revision += 1
+
+
+def changes_state(func):
+    """Decorates the routes outside of rpc that change nodenets or worlds, so that they invalidate the ETags of
+    state queries as well"""
+    @functools.wraps(func)
+    def _wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            increase_state_revision()
+    return _wrapper
+
+
+def rpc(command, route_prefix="/rpc/", method="GET", permission_required=None, queued=True, etag=False):
     """Defines a decorator for accessing API calls. Use it by specifying the
     API method, followed by the permissions necessary to execute the method.
     Within the calling web page, use http://<url>/rpc/<method>(arg1="val1", arg2="val2", ...)
@@ -63,8 +139,18 @@ def rpc(command, route_prefix="/rpc/", method="GET", permission_required=None):
         method (optional): the request method
         permission_required (optional): the type of permission necessary to execute the method;
             if omitted, permissions won't be tested by the decorator
+        queued (optional): if the method takes a nodenet_uid, calls for the same nodenet are served one after
+            the other. Pass False for methods that don't take the nodenet's netlock, or a function to decide by the
+            arguments of the call whether it does
+        etag (optional): if True, the response for a nodenet_uid is tagged with the nodenet's step and the
+            arguments, and answered with 304 if the client has it already. Pass a function to decide by the
+            arguments of the call whether the response can be tagged
     """
     def _decorator(func):
+        # the signature of the function does not change, so look at it once instead of for every call
+        queued_by_nodenet = queued and 'nodenet_uid' in inspect.getfullargspec(func).args
+        read_only = command.startswith(READ_ONLY_COMMANDS)
+
         @micropsi_app.route(route_prefix + command, "POST")
         @micropsi_app.route(route_prefix + command + "()", method)
         @micropsi_app.route(route_prefix + command + "(:argument#.+#)", method)
@@ -97,25 +183,45 @@ def rpc(command, route_prefix="/rpc/", method="GET", permission_required=None):
                 return {'status': 'error', 'data': "Insufficient permissions for remote procedure call"}
             else:
                 #kwargs.update({"argument": argument, "permissions": permissions, "user_id": user_id, "token": token})
-                if kwargs is not None:
-                    arguments = dict((name, kwargs[name]) for name in inspect.getargspec(func).args if name in kwargs)
-                    arguments.update(kwargs)
-                else:
-                    arguments = {}
+                arguments = dict(kwargs) if kwargs is not None else {}
+                queue = None
+                called = False
                 try:
+                    if etag and (etag is True or etag(**arguments)):
+                        tag = get_state_etag(command, arguments)
+                        if tag is not None:
+                            response.set_header('ETag', tag)
+                            response.set_header('Vary', 'Accept-Encoding')
+                            if tag in request.headers.get('If-None-Match', ''):
+                                response.status = 304
+                                return ''
+                    if queued_by_nodenet and isinstance(arguments.get('nodenet_uid'), str) and \
+                            (queued is True or queued(**arguments)):
+                        nodenet_queue = get_nodenet_queue(arguments['nodenet_uid'])
+                        if not nodenet_queue.acquire(queued_requests):
+                            response.status = 503
+                            response.set_header('Retry-After', '1')
+                            return {'status': 'error', 'data': "Too many requests for nodenet %s, try again later" % arguments['nodenet_uid']}
+                        queue = nodenet_queue
+                    called = True
                     result = func(**arguments)
                     if isinstance(result, tuple):
                         state, data = result
                     else:
                         state, data = result, None
-                    return json.dumps({
+                    return compress_response(json.dumps({
                         'status': 'success' if state else 'error',
                         'data': data
-                    })
+                    }))
                 except Exception as err:
                     response.status = 500
                     import traceback
                     return {'status': 'error', 'data': str(err), 'traceback': traceback.format_exc()}
+                finally:
+                    if queue is not None:
+                        queue.release()
+                    if called and not read_only:
+                        increase_state_revision()
 
                 # except TypeError as err:
                 #     response.status = 400
@@ -124,6 +230,33 @@ def rpc(command, route_prefix="/rpc/", method="GET", permission_required=None):
     return _decorator
 
 
+def get_state_etag(command, arguments):
+    """Returns the ETag for the response of the given command, made from the arguments, the steps of the nodenet
+    and its world, and the state revision. Returns None if the nodenet is not loaded"""
+    nodenet = runtime.nodenets.get(arguments.get('nodenet_uid'))
+    if nodenet is None:
+        return None
+    # the world steps on its own, and responses can hold its state
+    world_step = nodenet.world.current_step if nodenet.world else None
+    key = (command, sorted(arguments.items()), nodenet.current_step, world_step, nodenet.is_active, state_revision)
+    return '"%s"' % hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+
+
+def compress_response(body):
+    """Compresses the given response body with gzip or deflate, if it is large enough and the client accepts it"""
+    if len(body) < COMPRESSION_MIN_SIZE:
+        return body
+    accepted = request.headers.get('Accept-Encoding', '')
+    response.set_header('Vary', 'Accept-Encoding')
+    if 'gzip' in accepted:
+        response.set_header('Content-Encoding', 'gzip')
+        return gzip.compress(body.encode('utf-8'), compresslevel=6)
+    if 'deflate' in accepted:
+        response.set_header('Content-Encoding', 'deflate')
+        return zlib.compress(body.encode('utf-8'), 6)
+    return body
+
+
 def get_request_data():
     """Helper function to determine the current user, permissions and token"""
     if request.get_cookie("token"):
@@ -157,7 +290,21 @@ def _add_world_list(template_name, **params):
 
 @micropsi_app.route('/static/<filepath:path>')
 def server_static(filepath):
-    return static_file(filepath, root=os.path.join(APP_PATH, 'static'))
+    result = static_file(filepath, root=os.path.join(APP_PATH, 'static'))
+    if result.status_code in (200, 304):
+        stats = os.stat(os.path.join(APP_PATH, 'static', filepath.strip('/\\')))
+        tag = '"%x-%x"' % (int(stats.st_mtime), stats.st_size)
+        result.set_header('ETag', tag)
+        result.set_header('Cache-Control', 'public, max-age=%d' % STATIC_MAX_AGE)
+        if tag in request.headers.get('If-None-Match', ''):
+            if hasattr(result.body, 'close'):
+                result.body.close()
+            result.status = 304
+            result.body = ''
+            for header in ('Content-Length', 'Content-Type', 'Accept-Ranges'):
+                if header in result.headers:
+                    del result.headers[header]
+    return result
 
 
 @micropsi_app.route("/")
@@ -191,6 +338,63 @@ def world():
     return _add_world_list("viewer", mode="world", version=VERSION, user_id=user_id, permissions=permissions)
 
 
+def get_push_streams(threads):
+    """Returns the semaphore for the open push streams, leaving at least one of the given number of request
+    threads for other requests"""
+    return threading.Semaphore(max(0, min(PUSH_STREAMS, threads - 1)))
+
+
+def get_queued_requests(threads):
+    """Returns the number of requests that may wait for the same nodenet, so that they, the request it serves and
+    the open push streams leave at least one of the given number of request threads for other requests"""
+    streams = max(0, min(PUSH_STREAMS, threads - 1))
+    return max(0, min(QUEUED_REQUESTS_PER_NODENET, threads - streams - 2))
+
+# every open push stream holds a request thread
+push_streams = get_push_streams(SERVER_THREADS)
+# and so does every request waiting for a nodenet
+queued_requests = get_queued_requests(SERVER_THREADS)
+
+
+@micropsi_app.route("/push/<nodenet_uid>")
+def push_nodenet_state(nodenet_uid):
+    """Streams the state of the nodenet as server-sent events, one event per step the client has not seen.
+    Query parameters: nodespace, include_links (true/false), monitors (true/false).
+    Each event holds the data get_current_state returns for the nodenet and monitors, and the number of steps
+    skipped since the last event, if the client fell behind.
+    Answers 503 if the configured number of push streams is open already."""
+    if runtime.get_nodenet(nodenet_uid) is None:
+        bottle.abort(404, "No such nodenet")
+    streams = push_streams
+    if not streams.acquire(blocking=False):
+        response.status = 503
+        response.set_header('Retry-After', '15')
+        return "Too many push streams, poll for the state of the nodenet instead"
+    subscription = runtime.subscribe(nodenet_uid,
+        nodespace=request.query.get('nodespace') or None,
+        include_links=request.query.get('include_links', 'true') != 'false',
+        monitors=request.query.get('monitors', 'false') == 'true')
+    response.content_type = 'text/event-stream'
+    response.set_header('Cache-Control', 'no-cache')
+
+    def stream():
+        try:
+            yield "retry: 2000\n\n"
+            while not subscription.closed:
+                data = runtime.get_update(subscription, timeout=15)
+                if data is None:
+                    # keeps the connection open, and notices clients that went away
+                    yield ": keepalive\n\n"
+                else:
+                    data = dict(data, skipped_steps=subscription.skipped)
+                    yield "id: %d\nevent: step\ndata: %s\n\n" % (data['current_nodenet_step'], json.dumps(data))
+        finally:
+            runtime.unsubscribe(subscription)
+            streams.release()
+
+    return stream()
+
+
 @micropsi_app.error(404)
 def error_page(error):
     if request.is_xhr:
@@ -477,6 +681,7 @@ def nodenet_mgt():
 
 
 @micropsi_app.route("/select_nodenet_from_console/<nodenet_uid>")
+@changes_state
 def select_nodenet_from_console(nodenet_uid):
     user_id, permissions, token = get_request_data()
     result, uid = runtime.load_nodenet(nodenet_uid)
@@ -487,6 +692,7 @@ def select_nodenet_from_console(nodenet_uid):
 
 
 @micropsi_app.route("/delete_nodenet_from_console/<nodenet_uid>")
+@changes_state
 def delete_nodenet_from_console(nodenet_uid):
     user_id, permissions, token = get_request_data()
     if "manage nodenets" in permissions:
@@ -517,6 +723,7 @@ def import_nodenet_form():
 
 
 @micropsi_app.route("/nodenet/import", method="POST")
+@changes_state
 def import_nodenet():
     user_id, p, t = get_request_data()
     data = request.files['file_upload'].file.read()
@@ -536,6 +743,7 @@ def merge_nodenet_form(nodenet_uid):
 
 
 @micropsi_app.route("/nodenet/merge/<nodenet_uid>", method="POST")
+@changes_state
 def merge_nodenet(nodenet_uid):
     data = request.files['file_upload'].file.read()
     data = data.decode('utf-8')
@@ -562,15 +770,24 @@ def edit_nodenet():
     except ImportError:
         theano_available = False
 
+    # the numpy engine needs scipy for its weight matrix
+    scipy_available = True
+    try:
+        import scipy
+    except ImportError:
+        scipy_available = False
+
     return template("nodenet_form.tpl", title=title,
         # nodenet_uid=nodenet_uid,
         nodenets=runtime.get_available_nodenets(),
         templates=runtime.get_available_nodenets(),
         worlds=runtime.get_available_worlds(),
-        version=VERSION, user_id=user_id, permissions=permissions, theano_available=theano_available)
+        version=VERSION, user_id=user_id, permissions=permissions, theano_available=theano_available,
+        scipy_available=scipy_available)
 
 
 @micropsi_app.route("/nodenet/edit", method="POST")
+@changes_state
 def write_nodenet():
     user_id, permissions, token = get_request_data()
     if "manage nodenets" in permissions:
@@ -593,6 +810,7 @@ def import_world_form():
 
 
 @micropsi_app.route("/world/import", method="POST")
+@changes_state
 def import_world():
     user_id, p, t = get_request_data()
     data = request.files['file_upload'].file.read()
@@ -620,6 +838,7 @@ def edit_world_form():
 
 
 @micropsi_app.route("/world/edit", method="POST")
+@changes_state
 def edit_world():
     user_id, permissions, token = get_request_data()
     if "manage worlds" in permissions:
@@ -731,7 +950,17 @@ def new_nodenet(name, owner=None, engine='dict_engine', template=None, worldadap
         uid=uid)
 
 
-@rpc("get_current_state")
+def current_state_etag(nodenet_uid, nodenet=None, world=None, monitors=None):
+    # log messages come in independently of the steps
+    return monitors is None
+
+
+def current_state_queued(nodenet_uid, nodenet=None, world=None, monitors=None):
+    # only the nodenet data takes the netlock
+    return nodenet is not None
+
+
+@rpc("get_current_state", etag=current_state_etag, queued=current_state_queued)
 def get_current_state(nodenet_uid, nodenet=None, world=None, monitors=None):
     data = {}
     nodenet_obj = runtime.get_nodenet(nodenet_uid)
@@ -799,7 +1028,7 @@ def get_runner_properties():
     return True, runtime.get_runner_properties()
 
 
-@rpc("get_is_simulation_running")
+@rpc("get_is_simulation_running", queued=False)
 def get_is_simulation_running(nodenet_uid):
     return True, runtime.get_is_nodenet_running(nodenet_uid)
 
@@ -824,7 +1053,7 @@ def save_nodenet(nodenet_uid):
     return runtime.save_nodenet(nodenet_uid)
 
 
-@rpc("export_nodenet")
+@rpc("export_nodenet", queued=False)
 def export_nodenet_rpc(nodenet_uid):
     return True, runtime.export_nodenet(nodenet_uid)
 
@@ -991,29 +1220,29 @@ def clear_monitor(nodenet_uid, monitor_uid):
         return dict(status='error', msg='unknown nodenet or monitor')
 
 
-@rpc("export_monitor_data")
+@rpc("export_monitor_data", queued=False)
 def export_monitor_data(nodenet_uid, monitor_uid=None):
     return True, runtime.export_monitor_data(nodenet_uid, monitor_uid)
 
 
-@rpc("get_monitor_data")
+@rpc("get_monitor_data", queued=False, etag=True)
 def get_monitor_data(nodenet_uid, step):
     return True, runtime.get_monitor_data(nodenet_uid, step)
 
 # Nodenet
 
-@rpc("get_nodespace_list")
+@rpc("get_nodespace_list", queued=False)
 def get_nodespace_list(nodenet_uid):
     """ returns a list of nodespaces in the given nodenet."""
     return True, runtime.get_nodespace_list(nodenet_uid)
 
 
-@rpc("get_nodespace")
+@rpc("get_nodespace", etag=True)
 def get_nodespace(nodenet_uid, nodespace, step, include_links=True):
     return True, runtime.get_nodenet_data(nodenet_uid, nodespace, step, include_links)
 
 
-@rpc("get_node")
+@rpc("get_node", queued=False)
 def get_node(nodenet_uid, node_uid):
     return True, runtime.get_node(nodenet_uid, node_uid)
 
@@ -1048,12 +1277,12 @@ def align_nodes(nodenet_uid, nodespace):
     return runtime.align_nodes(nodenet_uid, nodespace)
 
 
-@rpc("get_available_node_types")
+@rpc("get_available_node_types", queued=False)
 def get_available_node_types(nodenet_uid):
     return True, runtime.get_available_node_types(nodenet_uid)
 
 
-@rpc("get_available_native_module_types")
+@rpc("get_available_native_module_types", queued=False)
 def get_available_native_module_types(nodenet_uid):
     return True, runtime.get_available_native_module_types(nodenet_uid)
 
@@ -1063,7 +1292,7 @@ def set_node_parameters(nodenet_uid, node_uid, parameters):
     return runtime.set_node_parameters(nodenet_uid, node_uid, parameters)
 
 
-@rpc("get_gatefunction")
+@rpc("get_gatefunction", queued=False)
 def get_gatefunction(nodenet_uid, node_uid, gate_type):
     return True, runtime.get_gatefunction(nodenet_uid, node_uid, gate_type).__name__
 
@@ -1073,7 +1302,7 @@ def set_gatefunction(nodenet_uid, node_uid, gate_type, gatefunction=None):
     return runtime.set_gatefunction(nodenet_uid, node_uid, gate_type, gatefunction=gatefunction)
 
 
-@rpc("get_available_gatefunctions")
+@rpc("get_available_gatefunctions", queued=False)
 def get_available_gatefunctions(nodenet_uid):
     return True, runtime.get_available_gatefunctions(nodenet_uid)
 
@@ -1083,12 +1312,12 @@ def set_gate_parameters(nodenet_uid, node_uid, gate_type, parameters):
     return runtime.set_gate_parameters(nodenet_uid, node_uid, gate_type, parameters)
 
 
-@rpc("get_available_datasources")
+@rpc("get_available_datasources", queued=False)
 def get_available_datasources(nodenet_uid):
     return True, runtime.get_available_datasources(nodenet_uid)
 
 
-@rpc("get_available_datatargets")
+@rpc("get_available_datatargets", queued=False)
 def get_available_datatargets(nodenet_uid):
     return True, runtime.get_available_datatargets(nodenet_uid)
 
@@ -1113,7 +1342,7 @@ def set_link_weight(nodenet_uid, source_node_uid, gate_type, target_node_uid, sl
     return runtime.set_link_weight(nodenet_uid, source_node_uid, gate_type, target_node_uid, slot_type, weight, certainty)
 
 
-@rpc("get_link")
+@rpc("get_link", queued=False)
 def get_link(nodenet_uid, link_uid):
     return True, runtime.get_link(nodenet_uid, link_uid)
 
@@ -1135,7 +1364,7 @@ def user_prompt_response(nodenet_uid, node_uid, values, resume_nodenet):
 
 
 # Face
-@rpc("get_emoexpression_parameters")
+@rpc("get_emoexpression_parameters", queued=False)
 def get_emoexpression_parameters(nodenet_uid):
     nodenet = runtime.get_nodenet(nodenet_uid)
     return True, emoexpression.calc_emoexpression_parameters(nodenet)
@@ -1154,7 +1383,7 @@ def get_logger_messages(logger=[], after=0):
     return True, runtime.get_logger_messages(logger, after)
 
 
-@rpc("get_monitoring_info")
+@rpc("get_monitoring_info", queued=False)
 def get_monitoring_info(nodenet_uid, logger=[], after=0):
     data = runtime.get_monitoring_info(nodenet_uid, logger, after)
     return True, data
@@ -1174,12 +1403,16 @@ def get_available_recipes():
 
 # -----------------------------------------------------------------------------------------------
 
-def main(host=DEFAULT_HOST, port=DEFAULT_PORT):
-    run(micropsi_app, host=host, port=port, quiet=True, server='cherrypy')  # devV
+def main(host=DEFAULT_HOST, port=DEFAULT_PORT, threads=SERVER_THREADS):
+    global push_streams, queued_requests
+    push_streams = get_push_streams(threads)
+    queued_requests = get_queued_requests(threads)
+    run(micropsi_app, host=host, port=port, quiet=True, server='cherrypy', numthreads=threads)  # devV
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Start the %s server." % APPTITLE)
     parser.add_argument('-d', '--host', type=str, default=DEFAULT_HOST)
     parser.add_argument('-p', '--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('-t', '--threads', type=int, default=SERVER_THREADS)
     args = parser.parse_args()
-    main(host=args.host, port=args.port)
+    main(host=args.host, port=args.port, threads=args.threads)
@@ -281,6 +281,19 @@ def test_merge_nodenet(app, test_nodenet):
     response = app.get_json('/rpc/delete_nodenet(nodenet_uid="%s")' % uid)
 
 
+def test_merging_from_the_form_changes_state_tags(app, test_nodenet):
+    app.set_auth()
+    url = '/rpc/get_nodespace(nodenet_uid="%s",nodespace=null,step=0)' % test_nodenet
+    tag = app.get_json(url).headers['ETag']
+    data = app.get_json('/rpc/export_nodenet(nodenet_uid="%s")' % test_nodenet).json_body['data']
+    response = app.post('/nodenet/merge/%s' % test_nodenet,
+                        upload_files=[('file_upload', 'nodenet.json', data.encode('utf-8'))])
+    assert response.status_int == 200
+    response = app.get_json(url, headers={'If-None-Match': tag})
+    assert_success(response)
+    assert response.headers['ETag'] != tag
+
+
 ###################################################
 ##
 ##
@@ -1231,3 +1244,186 @@ def test_nodenet_data_structure(app, test_nodenet, nodetype_def, nodefunc_def):
     assert data['world'] == 'WorldOfPain'
     assert data['worldadapter'] == 'Default'
 
+
+
+def test_nodenet_requests_are_turned_away_when_queue_is_full(app, test_nodenet, monkeypatch):
+    from micropsi_server import micropsi_app
+    monkeypatch.setattr(micropsi_app, 'queued_requests', 0)
+    queue = micropsi_app.get_nodenet_queue(test_nodenet)
+    # a request for the nodenet is being served
+    assert queue.acquire(0)
+    try:
+        response = app.get_json('/rpc/load_nodenet(nodenet_uid="%s")' % test_nodenet, expect_errors=True)
+        assert response.status_int == 503
+        assert response.headers['Retry-After'] == '1'
+        assert_failure(response)
+        # monitoring and other reads that don't take the netlock do not wait for the nodenet
+        response = app.get_json('/rpc/get_monitoring_info(nodenet_uid="%s")' % test_nodenet)
+        assert_success(response)
+        response = app.get_json('/rpc/get_nodespace_list(nodenet_uid="%s")' % test_nodenet)
+        assert_success(response)
+        response = app.post_json('/rpc/get_current_state', params={'nodenet_uid': test_nodenet, 'world': {'step': 0}})
+        assert_success(response)
+        response = app.post_json('/rpc/get_current_state', params={'nodenet_uid': test_nodenet, 'nodenet': {
+            'nodespace': None, 'step': -1}}, expect_errors=True)
+        assert response.status_int == 503
+    finally:
+        queue.release()
+    response = app.get_json('/rpc/load_nodenet(nodenet_uid="%s")' % test_nodenet)
+    assert_success(response)
+
+
+def test_nodenet_queue_serves_in_order():
+    import threading
+    from micropsi_server.micropsi_app import NodenetQueue
+    queue = NodenetQueue()
+    served = []
+    assert queue.acquire(2)
+
+    # requests wait on the condition once they hold a ticket
+    waiting = threading.Event()
+    wait = queue.condition.wait
+
+    def wait_and_signal(*args):
+        waiting.set()
+        return wait(*args)
+    queue.condition.wait = wait_and_signal
+
+    def request(index):
+        if queue.acquire(2):
+            served.append(index)
+            queue.release()
+
+    threads = []
+    for index in range(2):
+        waiting.clear()
+        thread = threading.Thread(target=request, args=(index,))
+        thread.start()
+        threads.append(thread)
+        assert waiting.wait(5)
+    # two requests are waiting already
+    assert not queue.acquire(2)
+    assert served == []
+    queue.release()
+    for thread in threads:
+        thread.join()
+    assert served == [0, 1]
+
+
+def test_push_nodenet_state(app, test_nodenet):
+    from micropsi_server import micropsi_app
+    from micropsi_server.bottle import request
+    from micropsi_core import runtime
+    request.bind({'QUERY_STRING': 'include_links=false&monitors=true', 'REQUEST_METHOD': 'GET'})
+    stream = micropsi_app.push_nodenet_state(test_nodenet)
+    assert next(stream).startswith("retry:")
+    event = next(stream)
+    assert event.startswith("id: 0\nevent: step\ndata: ")
+    data = json.loads(event.split("data: ", 1)[1])
+    assert data['current_nodenet_step'] == 0
+    assert data['nodenet']['links'] == {}
+    assert 'monitors' in data
+    runtime.step_nodenet(test_nodenet)
+    runtime.step_nodenet(test_nodenet)
+    data = json.loads(next(stream).split("data: ", 1)[1])
+    assert data['current_nodenet_step'] == 2
+    assert data['skipped_steps'] == 1
+    stream.close()
+    assert runtime.push_channels[test_nodenet].subscriptions == set()
+
+
+def test_push_streams_are_limited(app, test_nodenet, monkeypatch):
+    from micropsi_server import micropsi_app
+    from micropsi_server.bottle import request
+    monkeypatch.setattr(micropsi_app, 'push_streams', micropsi_app.get_push_streams(2))
+    request.bind({'QUERY_STRING': '', 'REQUEST_METHOD': 'GET'})
+    stream = micropsi_app.push_nodenet_state(test_nodenet)
+    next(stream)
+    # one of the two threads stays free for other requests
+    response = app.get('/push/%s' % test_nodenet, expect_errors=True)
+    assert response.status_int == 503
+    assert response.headers['Retry-After'] == '15'
+    stream.close()
+    request.bind({'QUERY_STRING': '', 'REQUEST_METHOD': 'GET'})
+    stream = micropsi_app.push_nodenet_state(test_nodenet)
+    assert next(stream).startswith("retry:")
+    stream.close()
+
+
+def test_queued_requests_leave_threads_for_push_streams(monkeypatch):
+    from micropsi_server import micropsi_app
+    monkeypatch.setattr(micropsi_app, 'PUSH_STREAMS', 5)
+    monkeypatch.setattr(micropsi_app, 'QUEUED_REQUESTS_PER_NODENET', 8)
+    # five push streams, the request served and three waiting leave one of ten threads
+    assert micropsi_app.get_queued_requests(10) == 3
+    assert micropsi_app.get_queued_requests(100) == 8
+    assert micropsi_app.get_queued_requests(2) == 0
+
+
+def test_rpc_arguments_the_predicates_reject_are_errors(app, test_nodenet):
+    response = app.post_json('/rpc/get_current_state', params={'nodenet_uid': test_nodenet, 'unknown': 1},
+                             expect_errors=True)
+    assert response.status_int == 500
+    assert_failure(response)
+
+
+def test_push_unknown_nodenet(app):
+    response = app.get('/push/unknown_nodenet', expect_errors=True)
+    assert response.status_int == 404
+
+
+def test_state_queries_are_tagged(app, test_nodenet):
+    from micropsi_core import runtime
+    url = '/rpc/get_nodespace(nodenet_uid="%s",nodespace=null,step=0)' % test_nodenet
+    response = app.get_json(url)
+    assert_success(response)
+    tag = response.headers['ETag']
+    response = app.get(url, headers={'If-None-Match': tag})
+    assert response.status_int == 304
+    assert response.body == b''
+    runtime.step_nodenet(test_nodenet)
+    response = app.get_json(url, headers={'If-None-Match': tag})
+    assert_success(response)
+    tag = response.headers['ETag']
+    # changes through the api invalidate the tags as well
+    app.set_auth()
+    app.get_json('/rpc/set_node_activation(nodenet_uid="%s",node_uid="N1",activation=0.5)' % test_nodenet)
+    response = app.get_json(url, headers={'If-None-Match': tag})
+    assert_success(response)
+    assert response.headers['ETag'] != tag
+
+
+def test_state_tags_follow_the_world(app, test_nodenet, test_world):
+    from micropsi_core import runtime
+    runtime.set_nodenet_properties(test_nodenet, worldadapter="Braitenberg", world_uid=test_world)
+    params = {'nodenet_uid': test_nodenet, 'world': {'step': -1}}
+    response = app.post_json('/rpc/get_current_state', params=params)
+    assert_success(response)
+    tag = response.headers['ETag']
+    # the world steps while the nodenet does not
+    runtime.worlds[test_world].step()
+    response = app.post_json('/rpc/get_current_state', params=params, headers={'If-None-Match': tag})
+    assert_success(response)
+    assert response.headers['ETag'] != tag
+
+
+def test_large_responses_are_compressed(app, test_nodenet):
+    import gzip
+    from webob import Request
+    url = '/rpc/get_nodespace(nodenet_uid="%s",nodespace=null,step=0)' % test_nodenet
+    plain = Request.blank(url).get_response(app.app)
+    assert 'Content-Encoding' not in plain.headers
+    # webtest would decode the response, so ask the application directly
+    response = Request.blank(url, headers={'Accept-Encoding': 'gzip, deflate'}).get_response(app.app)
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.body) == plain.body
+    response = Request.blank('/rpc/generate_uid()', headers={'Accept-Encoding': 'gzip'}).get_response(app.app)
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_static_files_are_cached(app):
+    response = app.get('/static/js/paging.js')
+    assert response.status_int == 200
+    assert 'max-age' in response.headers['Cache-Control']
+    response = app.get('/static/js/paging.js', headers={'If-None-Match': response.headers['ETag']})
+    assert response.status_int == 304
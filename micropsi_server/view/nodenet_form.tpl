@@ -40,6 +40,9 @@
                     <div class="controls">
                         <select class="input-xlarge" id="nn_engine" name="nn_engine">
                             <option value="dict_engine">dict_engine</option>
+                            %if scipy_available:
+                            <option value="numpy_engine">numpy_engine (experimental)</option>
+                            %end
                             %if theano_available:
                             <option value="theano_engine">theano_engine (experimental)</option>
                             %end
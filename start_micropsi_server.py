@@ -8,17 +8,18 @@ Startup script for the MicroPsi service.
 __author__ = 'joscha'
 __date__ = '06.07.12'
 
-from configuration import DEFAULT_PORT, DEFAULT_HOST
+from configuration import DEFAULT_PORT, DEFAULT_HOST, SERVER_THREADS
 import micropsi_server.micropsi_app
 import argparse
 
 
-def main(host=DEFAULT_HOST, port=DEFAULT_PORT):
-    micropsi_server.micropsi_app.main(host, port)
+def main(host=DEFAULT_HOST, port=DEFAULT_PORT, threads=SERVER_THREADS):
+    micropsi_server.micropsi_app.main(host, port, threads)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Start the MicroPsi server.")
     parser.add_argument('-d', '--host', type=str, default=DEFAULT_HOST)
     parser.add_argument('-p', '--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('-t', '--threads', type=int, default=SERVER_THREADS)
     args = parser.parse_args()
-    main(host=args.host, port=args.port)
+    main(host=args.host, port=args.port, threads=args.threads)